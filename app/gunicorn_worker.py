@@ -0,0 +1,9 @@
+from __future__ import annotations
+from uvicorn.workers import UvicornWorker
+
+from core.settings import settings
+
+
+# uvicorn worker for gunicorn.conf.py with a per-process cap on requests in flight
+class Worker(UvicornWorker):
+    CONFIG_KWARGS = {**UvicornWorker.CONFIG_KWARGS, "limit_concurrency": settings.SERVER_LIMIT_CONCURRENCY or None}
@@ -1,20 +1,31 @@
 from __future__ import annotations
 
+import asyncio
+import os
 import time
 import json
+from functools import partial
 from typing import List
 from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Query
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
 from jinja2 import Environment, FileSystemLoader, select_autoescape
 
-from core.pipeline import parse_image_bytes
+from core.executor import (
+    run_parse, run_parse_many, start_executor, shutdown_executor, reload_models as reload_executor_models,
+    model_status, executor_status, worker_count,
+)
 from core.output_format import build_output
 from core.text_render import steps_to_text
 from core.render import text_to_mermaid
-from core.eval import parse_ground_truth_txt, evaluate_predictions
-from core.llm_client import llm_refine_steps, LLMError
+from core.eval import parse_ground_truth_txt, evaluate_predictions, MATCH_MODES
+from core.llm_client import allm_refine_steps, allm_refine_many, llm_client, LLMError
 from core.settings import settings
+from core.decode import ImageTooLarge, check_upload_size
+from core.result_cache import result_cache
+from core.pipeline import normalize_engine
+from core.jobs import JobRunner, QueueFull, JOB_KINDS
+from core import metrics, ocr_backend
 
 app = FastAPI(title="Diagram → Algorithm (macOS/CPU)", version="6.0.0")
 
@@ -24,9 +35,76 @@ TEMPLATES = Environment(
 )
 
 
+@app.on_event("startup")
+async def startup():
+    start_executor()
+    job_runner.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    # queued jobs wait in the store; the ones in flight still need the executor and the LLM client
+    await job_runner.stop()
+    await llm_client.aclose()
+    shutdown_executor()
+
+
+@app.exception_handler(ImageTooLarge)
+async def image_too_large(request: Request, exc: ImageTooLarge):
+    return JSONResponse({"detail": str(exc)}, status_code=413)
+
+
 @app.get("/health")
 def health():
-    return {"status": "ok"}
+    return {"status": "ok", "models": {"yolo": model_status()}, "executor": executor_status(),
+            "ocr": ocr_backend.status()}
+
+
+@app.post("/v1/models/reload")
+def reload_models(weights: str = Query("")):
+    path = model_status()["path"]
+    if weights:
+        model_dir = os.path.dirname(os.path.abspath(settings.YOLO_WEIGHTS))
+        path = os.path.abspath(os.path.join(model_dir, weights))
+        if os.path.dirname(path) != model_dir:
+            raise HTTPException(status_code=400, detail="weights must be a file inside the model directory")
+    try:
+        reload_executor_models(path)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Model reload failed: {e}")
+    return {"status": "ok", "models": {"yolo": model_status()}}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    st = result_cache.stats()
+    llm = llm_client.stats()
+    jobs = job_runner.store.counts() if job_runner.store else {}
+    return PlainTextResponse(metrics.render([
+        ("diagram_result_cache_hits_total", "counter", "Result cache hits (memory + disk).",
+         st["hits_memory"] + st["hits_disk"]),
+        ("diagram_result_cache_misses_total", "counter", "Result cache misses.", st["misses"]),
+        ("diagram_result_cache_evictions_total", "counter", "Result cache LRU evictions.", st["evictions"]),
+        ("diagram_result_cache_bytes", "gauge", "Bytes held by the in-memory result cache.", st["memory_bytes"]),
+        ("diagram_llm_cache_hits_total", "counter", "LLM refinements answered from the response cache.",
+         llm["cache_hits"]),
+        ("diagram_llm_retries_total", "counter", "LLM request retries.", llm["retries"]),
+        *[(f"diagram_jobs_{status}", "gauge", f"Background jobs {status} in the shared queue.", jobs.get(status, 0))
+          for status in ("queued", "running")],
+    ]), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/v1/cache")
+def cache_stats():
+    return result_cache.stats()
+
+
+@app.delete("/v1/cache")
+def cache_clear():
+    result_cache.clear()
+    return result_cache.stats()
 
 
 @app.get("/ui", response_class=HTMLResponse)
@@ -42,22 +120,15 @@ def ui(request: Request):
 async def ui_parse(file: UploadFile = File(...), use_llm: bool = Query(False), engine: str = Query("cv")):
     started = time.time()
     _validate_image(file.filename)
-    data = await file.read()
+    data = await _read_upload(file)
 
-    raw = parse_image_bytes(data, hard_timeout_s=20.0, engine=engine)
-    raw["output"] = build_output(raw["graph"], raw["algorithm"])
-    raw["algorithm_text"] = steps_to_text(raw["output"]["bpmn"]["steps"], with_role_header=True)
+    raw = await run_parse(data, hard_timeout_s=20.0, engine=engine)
+    _attach_output(raw)
     raw["meta"]["latency_ms"] = int((time.time() - started) * 1000)
     raw["meta"]["filename"] = file.filename
 
     if use_llm:
-        try:
-            llm = llm_refine_steps(raw)
-            if llm:
-                raw["llm"] = llm
-                raw["llm_text"] = steps_to_text(llm["steps"], with_role_header=True)
-        except LLMError as e:
-            raw["llm_error"] = str(e)
+        await _apply_llm(raw)
 
     tpl = TEMPLATES.get_template("result.html")
     return tpl.render({"raw_json": json.dumps(raw, ensure_ascii=False, indent=2), "raw": raw})
@@ -67,20 +138,13 @@ async def ui_parse(file: UploadFile = File(...), use_llm: bool = Query(False), e
 async def parse(file: UploadFile = File(...), use_llm: bool = Query(False), engine: str = Query("cv")):
     started = time.time()
     _validate_image(file.filename)
-    data = await file.read()
+    data = await _read_upload(file)
 
-    raw = parse_image_bytes(data, hard_timeout_s=20.0, engine=engine)
-    raw["output"] = build_output(raw["graph"], raw["algorithm"])
-    raw["algorithm_text"] = steps_to_text(raw["output"]["bpmn"]["steps"], with_role_header=True)
+    raw = await run_parse(data, hard_timeout_s=20.0, engine=engine)
+    _attach_output(raw)
 
     if use_llm:
-        try:
-            llm = llm_refine_steps(raw)
-            if llm:
-                raw["llm"] = llm
-                raw["llm_text"] = steps_to_text(llm["steps"], with_role_header=True)
-        except LLMError as e:
-            raw["llm_error"] = str(e)
+        await _apply_llm(raw)
 
     raw["meta"]["latency_ms"] = int((time.time() - started) * 1000)
     raw["meta"]["filename"] = file.filename
@@ -88,39 +152,99 @@ async def parse(file: UploadFile = File(...), use_llm: bool = Query(False), engi
 
 
 @app.post("/v1/parse_many")
-async def parse_many(files: List[UploadFile] = File(...), use_llm: bool = Query(False), engine: str = Query("cv")):
+async def parse_many(files: List[UploadFile] = File(...), use_llm: bool = Query(False), engine: str = Query("cv"),
+                     stream: bool = Query(False)):
     started = time.time()
-    results = []
+    uploads = []
     for f in files:
-        if not _is_supported_image(f.filename):
-            results.append({"file": f.filename, "error": "unsupported_type"})
-            continue
         try:
-            data = await f.read()
-            raw = parse_image_bytes(data, hard_timeout_s=20.0, engine=engine)
-            raw["output"] = build_output(raw["graph"], raw["algorithm"])
-            raw["algorithm_text"] = steps_to_text(raw["output"]["bpmn"]["steps"], with_role_header=True)
-            raw["meta"]["filename"] = f.filename
-
-            if use_llm:
-                try:
-                    llm = llm_refine_steps(raw)
-                    if llm:
-                        raw["llm"] = llm
-                        raw["llm_text"] = steps_to_text(llm["steps"], with_role_header=True)
-                except LLMError as e:
-                    raw["llm_error"] = str(e)
-
-            results.append(raw)
-        except Exception as e:
-            results.append({"file": f.filename, "error": str(e)})
+            data = await _read_upload(f) if _is_supported_image(f.filename) else "unsupported_type"
+        except ImageTooLarge as e:
+            data = str(e)
+        uploads.append((f.filename, data))
 
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def done(idx: int, raw: dict):
+        if use_llm and stream and "error" not in raw:
+            await _apply_llm(raw)
+        await queue.put((idx, raw))
+
+    count = len(uploads)
+    tasks = _start_uploads(uploads, engine, done)
+    del uploads
+
+    if stream:
+        return StreamingResponse(_stream_ndjson(tasks, count, queue, started), media_type="application/x-ndjson")
+
+    results = [None] * count
+    for _ in range(count):
+        idx, raw = await queue.get()
+        results[idx] = raw
+    if use_llm:
+        await _apply_llm_many([r for r in results if "error" not in r])
     return JSONResponse({
         "meta": {"count": len(results), "latency_ms": int((time.time() - started) * 1000)},
         "results": results
     })
 
 
+async def _stream_ndjson(tasks, count: int, queue: asyncio.Queue, started: float):
+    errors = 0
+    try:
+        for _ in range(count):
+            idx, raw = await queue.get()
+            errors += "error" in raw
+            yield json.dumps({"index": idx, **raw}, ensure_ascii=False) + "\n"
+    finally:
+        for t in tasks:
+            t.cancel()
+    yield json.dumps({"summary": {"count": count, "ok": count - errors, "errors": errors,
+                                  "latency_ms": int((time.time() - started) * 1000)}}) + "\n"
+
+
+# one task per batch of parsed uploads, at most PARSE_MANY_CONCURRENCY in flight; done(index, raw) gets
+# every upload, including rejected ones (uploads carry an error string instead of bytes)
+def _start_uploads(uploads: list, engine: str, done) -> list[asyncio.Task]:
+    sem = asyncio.Semaphore(settings.PARSE_MANY_CONCURRENCY or worker_count())
+
+    async def batch(items: list):
+        async with sem:
+            try:
+                parsed = await run_parse_many([data for _, _, data in items], hard_timeout_s=20.0, engine=engine)
+            except Exception as e:
+                parsed = [e] * len(items)
+        for (idx, name, _), raw in zip(items, parsed):
+            try:
+                if isinstance(raw, Exception):
+                    raise raw
+                _attach_output(raw)
+                raw["meta"]["filename"] = name
+            except Exception as e:
+                raw = {"file": name, "error": str(e)}
+            await done(idx, raw)
+
+    async def rejected(items: list):
+        for idx, name, error in items:
+            await done(idx, {"file": name, "error": error})
+
+    items = [(i, name, data) for i, (name, data) in enumerate(uploads)]
+    bad = [it for it in items if isinstance(it[2], str)]
+    tasks = [asyncio.ensure_future(rejected(bad))] if bad else []
+    tasks += [asyncio.ensure_future(batch(chunk))
+              for chunk in _batches([it for it in items if not isinstance(it[2], str)], engine)]
+    return tasks
+
+
+# yolo_bpmn uploads go to the workers YOLO_BATCH_SIZE at a time, one forward pass per group
+def _batches(items: list, engine: str) -> list[list]:
+    try:
+        size = max(1, settings.YOLO_BATCH_SIZE) if normalize_engine(engine) == "yolo_bpmn" else 1
+    except ValueError:
+        size = 1
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
 class RenderRequest(BaseModel):
     text: str
 
@@ -131,24 +255,187 @@ def render(req: RenderRequest):
 
 
 @app.post("/v1/evaluate")
-async def evaluate(files: List[UploadFile] = File(...), ground_truth: UploadFile = File(...), engine: str = "cv"):
+async def evaluate(files: List[UploadFile] = File(...), ground_truth: UploadFile = File(...), engine: str = "cv",
+                   match: str = Query("greedy")):
+    if match not in MATCH_MODES:
+        raise HTTPException(status_code=400, detail=f"match must be one of {', '.join(MATCH_MODES)}")
     if not (ground_truth.filename or "").lower().endswith(".txt"):
         raise HTTPException(status_code=400, detail="ground_truth must be .txt")
 
     gt_text = (await ground_truth.read()).decode("utf-8", errors="ignore")
-    gt_map = parse_ground_truth_txt(gt_text)
+    uploads = [(f.filename, await _read_upload(f)) for f in files if _is_supported_image(f.filename)]
+    return JSONResponse(await _evaluate_uploads(uploads, gt_text, engine, match))
 
+
+async def _evaluate_uploads(uploads: list, gt_text: str, engine: str, match: str, progress=None) -> dict:
+    gt_map = parse_ground_truth_txt(gt_text)
     preds_map = {}
-    for f in files:
-        if not _is_supported_image(f.filename):
-            continue
-        data = await f.read()
-        raw = parse_image_bytes(data, hard_timeout_s=20.0, engine=engine)
-        out = build_output(raw["graph"], raw["algorithm"])
-        preds_map[f.filename] = out["bpmn"]["steps"]
-
-    report = evaluate_predictions(preds_map, gt_map)
-    return JSONResponse(report)
+    for chunk in _batches(uploads, engine):
+        parsed = await run_parse_many([data for _, data in chunk], hard_timeout_s=20.0, engine=engine)
+        for (name, _), raw in zip(chunk, parsed):
+            if isinstance(raw, Exception):
+                raise raw
+            preds_map[name] = build_output(raw["graph"], raw["algorithm"])["bpmn"]["steps"]
+        if progress is not None:
+            progress(len(preds_map))
+
+    return await asyncio.get_running_loop().run_in_executor(
+        None, partial(evaluate_predictions, preds_map, gt_map, match=match))
+
+
+# Background jobs: the upload is stored with the job and the response is just its id; JobRunner
+# workers pick jobs up from the sqlite queue and run them through the same executor as the sync API.
+@app.post("/v1/jobs", status_code=202)
+async def submit_job(files: List[UploadFile] = File(...), kind: str = Query("parse"), engine: str = Query("cv"),
+                     use_llm: bool = Query(False), match: str = Query("greedy"),
+                     ground_truth: UploadFile | None = File(None)):
+    if settings.JOBS_WORKERS <= 0:
+        raise HTTPException(status_code=503, detail="Background jobs are disabled (JOBS_WORKERS=0).")
+    if kind not in JOB_KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {', '.join(JOB_KINDS)}")
+    try:
+        normalize_engine(engine)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    params = {"engine": engine, "use_llm": use_llm}
+
+    if kind == "evaluate":
+        if match not in MATCH_MODES:
+            raise HTTPException(status_code=400, detail=f"match must be one of {', '.join(MATCH_MODES)}")
+        if ground_truth is None or not (ground_truth.filename or "").lower().endswith(".txt"):
+            raise HTTPException(status_code=400, detail="ground_truth must be .txt")
+        params.update(match=match, ground_truth=(await ground_truth.read()).decode("utf-8", errors="ignore"))
+        uploads = [(f.filename, await _read_upload(f)) for f in files if _is_supported_image(f.filename)]
+    else:
+        uploads = []
+        for f in files:
+            try:
+                data = await _read_upload(f) if _is_supported_image(f.filename) else "unsupported_type"
+            except ImageTooLarge as e:
+                data = str(e)
+            uploads.append((f.filename, data))
+
+    try:
+        job = await job_runner.submit(kind, params, uploads)
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return _job_view(job)
+
+
+@app.get("/v1/jobs/{job_id}")
+def job_status(job_id: str):
+    job = job_runner.store.get(job_id) if job_runner.store else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired.")
+    return _job_view(job)
+
+
+@app.get("/v1/jobs/{job_id}/result")
+def job_result(job_id: str):
+    job = job_runner.store.get(job_id) if job_runner.store else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired.")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}.")
+    result = job_runner.store.result(job_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired.")
+    return JSONResponse(result)
+
+
+def _job_view(job: dict) -> dict:
+    return {
+        "id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "progress": {"done": job["done"], "total": job["total"]},
+        "created": job["created"],
+        "started": job["started"],
+        "finished": job["finished"],
+        "expires_at": job["expires"],
+        "error": job["error"],
+        "result_url": f"/v1/jobs/{job['id']}/result" if job["status"] == "done" else None,
+    }
+
+
+async def _job_parse(job: dict, uploads: list, progress) -> dict:
+    started = time.time()
+    params = job["params"]
+    results = [None] * len(uploads)
+
+    async def done(idx: int, raw: dict):
+        results[idx] = raw
+        progress(sum(r is not None for r in results))
+
+    tasks = _start_uploads(uploads, params["engine"], done)
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for t in tasks:
+            t.cancel()
+    if params["use_llm"]:
+        await _apply_llm_many([r for r in results if "error" not in r])
+    return {
+        "meta": {"count": len(results), "latency_ms": int((time.time() - started) * 1000)},
+        "results": results
+    }
+
+
+async def _job_evaluate(job: dict, uploads: list, progress) -> dict:
+    params = job["params"]
+    return await _evaluate_uploads(uploads, params["ground_truth"], params["engine"], params["match"], progress)
+
+
+job_runner = JobRunner({"parse": _job_parse, "evaluate": _job_evaluate})
+
+
+def _attach_output(raw: dict):
+    raw["output"] = build_output(raw["graph"], raw["algorithm"])
+    raw["algorithm_text"] = steps_to_text(raw["output"]["bpmn"]["steps"], with_role_header=True)
+
+
+async def _apply_llm(raw: dict):
+    t0 = time.perf_counter()
+    try:
+        llm = await allm_refine_steps(raw)
+    except LLMError as e:
+        llm = e
+    _store_llm(raw, llm, time.perf_counter() - t0)
+
+
+# concurrent or packed per LLM_BATCH_MODE; each file gets its own result or error
+async def _apply_llm_many(raws: list[dict]):
+    if not raws:
+        return
+    t0 = time.perf_counter()
+    results = await allm_refine_many(raws)
+    elapsed = time.perf_counter() - t0
+    for raw, llm in zip(raws, results):
+        _store_llm(raw, llm, elapsed)
+
+
+def _store_llm(raw: dict, llm, elapsed: float):
+    if isinstance(llm, BaseException):
+        raw["llm_error"] = str(llm)
+        outcome = "error"
+    else:
+        if llm:
+            raw["llm"] = llm
+            raw["llm_text"] = steps_to_text(llm["steps"], with_role_header=True)
+        outcome = "ok" if llm else "disabled"
+    metrics.llm_requests.inc(outcome=outcome)
+    if outcome != "disabled":
+        metrics.llm_duration.observe(elapsed)
+        raw["meta"].setdefault("timings", {})["llm"] = round(elapsed * 1000.0, 2)
+
+
+# the declared size is checked before anything is read; the bytes go to the decoder as-is
+async def _read_upload(file: UploadFile) -> bytes:
+    if file.size is not None:
+        check_upload_size(file.size)
+    data = await file.read()
+    check_upload_size(len(data))
+    return data
 
 
 def _is_supported_image(name: str) -> bool:
@@ -0,0 +1,136 @@
+from __future__ import annotations
+import argparse
+import datetime as dt
+import json
+import platform
+import shutil
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from bench.synth import make_diagram, encode_png
+from core.preprocess import preprocess
+from core.shapes import detect_shapes
+from core.arrows import detect_arrows
+from core.ocr import ocr_nodes
+from core.graph_build import build_graph
+from core.algorithm import graph_to_algorithm
+from core.text_utils import dedupe_steps
+from core.eval import evaluate_predictions
+from core.pipeline import parse_image_bytes
+
+def bench_case(n_nodes: int, size: tuple[int, int], label_words: int, swimlanes: int,
+               repeat: int, seed: int, with_ocr: bool) -> dict:
+    d = make_diagram(n_nodes, size[0], size[1], label_words, swimlanes, seed)
+    data = encode_png(d.image)
+    img_p, bin_img = preprocess(d.image)
+    nodes = detect_shapes(img_p, bin_img)
+    graph = d.graph()
+    algo = graph_to_algorithm(graph)
+    texts = [n.label for n in d.nodes] * 2
+    preds = {"synth.png": [{"action": g["description"], "role": g["role"]} for g in d.ground_truth()][::-1]}
+    gt = {"synth.png": d.ground_truth()}
+
+    stages = {
+        "decode": lambda: cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR),
+        "preprocess": lambda: preprocess(d.image),
+        "detect_shapes": lambda: detect_shapes(img_p, bin_img),
+        "detect_arrows": lambda: detect_arrows(img_p, bin_img, nodes),
+        "build_graph": lambda: build_graph(graph["nodes"], graph["edges"]),
+        "graph_to_algorithm": lambda: graph_to_algorithm(graph),
+        "dedupe_steps": lambda: dedupe_steps(texts),
+        "evaluate_predictions": lambda: evaluate_predictions(preds, gt),
+    }
+    if with_ocr:
+        stages["ocr_nodes"] = lambda: ocr_nodes(img_p, [dict(n) for n in nodes])
+        stages["end_to_end"] = lambda: parse_image_bytes(data, hard_timeout_s=600.0, engine="cv")
+
+    result = {
+        "case": f"n{n_nodes}_{size[0]}x{size[1]}_w{label_words}_lanes{swimlanes}",
+        "params": {"nodes": n_nodes, "width": size[0], "height": size[1], "label_words": label_words,
+                   "swimlanes": swimlanes, "seed": seed, "png_bytes": len(data)},
+        "detected": {"nodes": len(nodes), "steps": len(algo["steps"])},
+        "stages": {name: _time(fn, repeat) for name, fn in stages.items()},
+    }
+    if not with_ocr:
+        result["skipped"] = {"ocr_nodes": "tesseract not available", "end_to_end": "tesseract not available"}
+    return result
+
+def compare(base: dict, new: dict) -> list[dict]:
+    rows = []
+    base_cases = {c["case"]: c for c in base.get("cases", [])}
+    for c in new.get("cases", []):
+        b = base_cases.get(c["case"])
+        if b is None:
+            continue
+        for name, st in c["stages"].items():
+            old = b["stages"].get(name)
+            if not old or not old["median_ms"]:
+                continue
+            rows.append({"case": c["case"], "stage": name, "base_ms": old["median_ms"], "new_ms": st["median_ms"],
+                         "speedup": round(old["median_ms"] / max(st["median_ms"], 1e-6), 3)})
+    return rows
+
+def _time(fn, repeat: int) -> dict:
+    fn()  # warm-up: first call pays for lazy imports and allocator growth
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    samples.sort()
+    return {"median_ms": round(statistics.median(samples), 3), "min_ms": round(samples[0], 3),
+            "mean_ms": round(statistics.fmean(samples), 3),
+            "p95_ms": round(samples[min(len(samples) - 1, int(0.95 * len(samples)))], 3), "runs": repeat}
+
+def _ints(s: str) -> list[int]:
+    return [int(x) for x in s.split(",") if x.strip()]
+
+def _sizes(s: str) -> list[tuple[int, int]]:
+    return [tuple(int(v) for v in x.lower().split("x")) for x in s.split(",") if x.strip()]
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Offline micro-benchmarks for the diagram pipeline stages.")
+    ap.add_argument("--nodes", default="8,24,60")
+    ap.add_argument("--sizes", default="1200x900,2400x1800")
+    ap.add_argument("--label-words", default="2,5")
+    ap.add_argument("--swimlanes", default="0,3")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--no-ocr", action="store_true", help="skip stages that need the tesseract binary")
+    ap.add_argument("--out", default="", help="write JSON results here (default: stdout)")
+    ap.add_argument("--compare", default="", help="baseline JSON to compare the new run against")
+    args = ap.parse_args(argv)
+
+    with_ocr = not args.no_ocr and shutil.which("tesseract") is not None
+    cases = []
+    for n in _ints(args.nodes):
+        for size in _sizes(args.sizes):
+            for w in _ints(args.label_words):
+                for lanes in _ints(args.swimlanes):
+                    cases.append(bench_case(n, size, w, lanes, args.repeat, args.seed, with_ocr))
+                    print(f"done {cases[-1]['case']}", file=sys.stderr)
+
+    report = {
+        "meta": {"created": dt.datetime.now(dt.timezone.utc).isoformat(), "python": platform.python_version(),
+                 "platform": platform.platform(), "opencv": cv2.__version__, "numpy": np.__version__,
+                 "cpu_threads": cv2.getNumThreads(), "ocr": with_ocr, "argv": vars(args)},
+        "cases": cases,
+    }
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            report["compare"] = compare(json.load(f), report)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+from __future__ import annotations
+import random
+from dataclasses import dataclass, field
+
+import cv2
+import numpy as np
+
+_WORDS = [
+    "create", "request", "check", "approve", "send", "invoice", "review", "order", "update", "status",
+    "notify", "client", "manager", "validate", "data", "prepare", "report", "sign", "contract", "archive",
+    "payment", "confirm", "delivery", "register", "document", "assign", "task", "close", "ticket", "plan",
+]
+_ROLES = ["Client", "Manager", "Accountant", "Support", "Warehouse", "Director"]
+_FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+@dataclass
+class SynthNode:
+    id: str
+    kind: str
+    label: str
+    bbox: tuple[int, int, int, int]
+    role: str = ""
+
+@dataclass
+class SynthDiagram:
+    image: np.ndarray
+    nodes: list[SynthNode]
+    edges: list[tuple[str, str]]
+    lanes: list[tuple[str, int, int]] = field(default_factory=list)  # name, y_top, y_bottom
+
+    def ground_truth(self) -> list[dict]:
+        return [{"description": n.label, "role": n.role} for n in self.nodes if n.kind == "rectangle"]
+
+    def graph(self) -> dict:
+        nodes = [{"id": n.id, "kind": n.kind, "semantic": _semantic(n), "label": n.label, "bbox": list(n.bbox),
+                  "center": [(n.bbox[0] + n.bbox[2]) / 2.0, (n.bbox[1] + n.bbox[3]) / 2.0]} for n in self.nodes]
+        edges = [{"source": a, "target": b, "kind": "sequence"} for a, b in self.edges]
+        return {"nodes": nodes, "edges": edges}
+
+def make_diagram(n_nodes: int = 12, width: int = 1600, height: int = 1200, label_words: int = 3,
+                 swimlanes: int = 0, seed: int = 0) -> SynthDiagram:
+    # deterministic flowchart: start ellipse, task rectangles with every 4th step a decision diamond,
+    # end ellipse; laid out left-to-right in rows, optionally split into horizontal swimlanes
+    rng = random.Random(seed)
+    img = np.full((height, width, 3), 255, dtype=np.uint8)
+
+    lane_x = 140 if swimlanes else 0
+    lanes = []
+    if swimlanes:
+        lane_h = height // swimlanes
+        for i in range(swimlanes):
+            y_top, y_bottom = i * lane_h, (i + 1) * lane_h - 1
+            name = _ROLES[i % len(_ROLES)]
+            cv2.rectangle(img, (0, y_top), (width - 1, y_bottom), (0, 0, 0), 2)
+            cv2.line(img, (lane_x, y_top), (lane_x, y_bottom), (0, 0, 0), 2)
+            _vertical_text(img, name, lane_x, y_top, y_bottom)
+            lanes.append((name, y_top, y_bottom))
+
+    n_nodes = max(2, n_nodes)
+    cols = max(2, int(np.ceil(np.sqrt(n_nodes * (width - lane_x) / height))))
+    rows = int(np.ceil(n_nodes / cols))
+    cell_w = (width - lane_x) / cols
+    cell_h = height / rows
+    box_w = int(min(260, cell_w * 0.7))
+    box_h = int(min(110, cell_h * 0.55))
+
+    nodes: list[SynthNode] = []
+    for i in range(n_nodes):
+        r, c = divmod(i, cols)
+        if r % 2 == 1:
+            c = cols - 1 - c  # snake layout keeps consecutive nodes adjacent
+        cx = int(lane_x + (c + 0.5) * cell_w)
+        cy = int((r + 0.5) * cell_h)
+        if i == 0 or i == n_nodes - 1:
+            kind, label = "ellipse", "Start" if i == 0 else "End"
+        elif i % 4 == 3:
+            kind, label = "diamond", rng.choice(_WORDS).capitalize() + "?"
+        else:
+            kind = "rectangle"
+            label = " ".join(rng.choice(_WORDS) for _ in range(label_words)).capitalize()
+        bbox = (cx - box_w // 2, cy - box_h // 2, cx + box_w // 2, cy + box_h // 2)
+        role = next((name for name, t, b in lanes if t <= cy <= b), "")
+        nodes.append(SynthNode(f"n{i}", kind, label, bbox, role))
+        _draw_node(img, kind, bbox, label)
+
+    edges = []
+    for a, b in zip(nodes, nodes[1:]):
+        _draw_arrow(img, a.bbox, b.bbox)
+        edges.append((a.id, b.id))
+    return SynthDiagram(img, nodes, edges, lanes)
+
+def encode_png(img: np.ndarray) -> bytes:
+    ok, buf = cv2.imencode(".png", img)
+    if not ok:
+        raise RuntimeError("Could not encode image.")
+    return buf.tobytes()
+
+def _semantic(n: SynthNode) -> str:
+    if n.kind != "ellipse":
+        return ""
+    return "start" if n.label == "Start" else "end"
+
+def _draw_node(img, kind, bbox, label):
+    x1, y1, x2, y2 = bbox
+    cx, cy = (x1 + x2) // 2, (y1 + y2) // 2
+    if kind == "ellipse":
+        cv2.ellipse(img, (cx, cy), ((x2 - x1) // 2, (y2 - y1) // 2), 0, 0, 360, (0, 0, 0), 2)
+    elif kind == "diamond":
+        pts = np.array([[cx, y1], [x2, cy], [cx, y2], [x1, cy]], dtype=np.int32)
+        cv2.polylines(img, [pts], True, (0, 0, 0), 2)
+    else:
+        cv2.rectangle(img, (x1, y1), (x2, y2), (0, 0, 0), 2)
+    _centered_text(img, label, bbox)
+
+def _centered_text(img, text, bbox):
+    x1, y1, x2, y2 = bbox
+    words = text.split()
+    lines, cur = [], ""
+    scale = 0.6
+    for w in words:
+        cand = (cur + " " + w).strip()
+        if cv2.getTextSize(cand, _FONT, scale, 1)[0][0] > (x2 - x1) * 0.8 and cur:
+            lines.append(cur)
+            cur = w
+        else:
+            cur = cand
+    lines.append(cur)
+    line_h = cv2.getTextSize("Ag", _FONT, scale, 1)[0][1] + 8
+    y = (y1 + y2) // 2 - (len(lines) - 1) * line_h // 2
+    for ln in lines:
+        tw, th = cv2.getTextSize(ln, _FONT, scale, 1)[0]
+        cv2.putText(img, ln, ((x1 + x2 - tw) // 2, y + th // 2), _FONT, scale, (0, 0, 0), 1, cv2.LINE_AA)
+        y += line_h
+
+def _vertical_text(img, text, strip_w, y_top, y_bottom):
+    tw, th = cv2.getTextSize(text, _FONT, 0.8, 2)[0]
+    tile = np.full((th + 16, tw + 16, 3), 255, dtype=np.uint8)
+    cv2.putText(tile, text, (8, th + 8), _FONT, 0.8, (0, 0, 0), 2, cv2.LINE_AA)
+    tile = cv2.rotate(tile, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    h, w = tile.shape[:2]
+    y = max(y_top + 2, (y_top + y_bottom - h) // 2)
+    x = max(2, (strip_w - w) // 2)
+    h = min(h, y_bottom - 2 - y)
+    w = min(w, strip_w - 2 - x)
+    if h > 0 and w > 0:
+        img[y:y + h, x:x + w] = tile[:h, :w]
+
+def _draw_arrow(img, a, b):
+    ax, ay = (a[0] + a[2]) // 2, (a[1] + a[3]) // 2
+    bx, by = (b[0] + b[2]) // 2, (b[1] + b[3]) // 2
+    if abs(ay - by) < abs(ax - bx):
+        start = (a[2] + 10, ay) if bx > ax else (a[0] - 10, ay)
+        end = (b[0] - 10, by) if bx > ax else (b[2] + 10, by)
+    else:
+        start = (ax, a[3] + 10) if by > ay else (ax, a[1] - 10)
+        end = (bx, b[1] - 10) if by > ay else (bx, b[3] + 10)
+    cv2.arrowedLine(img, start, end, (0, 0, 0), 2, cv2.LINE_AA, tipLength=0.08)
@@ -1,55 +1,58 @@
 from __future__ import annotations
-import networkx as nx
+from core.graph import CompactGraph
 
 def graph_to_algorithm(graph_json: dict) -> dict:
-    G = nx.DiGraph()
-    for n in graph_json["nodes"]:
-        G.add_node(n["id"], **n)
-    for e in graph_json["edges"]:
-        G.add_edge(e["source"], e["target"], **e)
+    G = CompactGraph.from_json(graph_json["nodes"], graph_json["edges"], implicit=True)
+    ids, attrs = G.ids, G.attrs
 
-    starts = [n for n, d in G.nodes(data=True) if d.get("semantic") == "start"]
+    starts = [i for i, d in enumerate(attrs) if d.get("semantic") == "start"]
     if not starts:
-        starts = [n for n in G.nodes() if G.in_degree(n) == 0]
-    if not starts and G.nodes:
-        starts = [next(iter(G.nodes()))]
+        starts = [int(i) for i in (G.in_degree == 0).nonzero()[0]]
+    if not starts and len(G):
+        starts = [0]
 
-    visited, steps, lines = set(), [], []
     if not starts:
         return {"steps": [], "pseudocode": "", "start": None, "unvisited": []}
 
-    def label(nid):
-        d = G.nodes[nid]
+    def label(i):
+        d = attrs[i]
         t = (d.get("label") or "").strip()
         return t if t else d.get("kind","node")
 
-    def dfs(nid, indent=0):
-        if nid in visited:
-            return
-        visited.add(nid)
-        kind = G.nodes[nid].get("kind","rectangle")
-        text = label(nid)
+    # depth-first walk with an explicit stack: ("visit", node, indent) or ("line", text)
+    visited = [False] * len(G)
+    steps, lines = [], []
+    stack = [("visit", starts[0], 0)]
+    while stack:
+        op, arg, indent = stack.pop()
+        if op == "line":
+            lines.append(arg)
+            continue
+        if visited[arg]:
+            continue
+        visited[arg] = True
+        kind = attrs[arg].get("kind","rectangle")
+        text = label(arg)
+        outs = G.successors(arg)
+        pad = " " * indent
 
         if kind == "diamond":
-            outs = list(G.successors(nid))
-            steps.append({"type":"decision","id":nid,"text":text,"next":outs})
-            lines.append(" " * indent + f"IF {text}:")
+            steps.append({"type":"decision","id":ids[arg],"text":text,"next":[ids[o] for o in outs]})
+            lines.append(pad + f"IF {text}:")
+            stack.append(("line", pad + "END_IF", 0))
+            if len(outs) > 1:
+                stack.append(("visit", outs[1], indent+2))
+                stack.append(("line", pad + "ELSE:", 0))
             if outs:
-                dfs(outs[0], indent+2)
-                if len(outs) > 1:
-                    lines.append(" " * indent + "ELSE:")
-                    dfs(outs[1], indent+2)
-            lines.append(" " * indent + "END_IF")
+                stack.append(("visit", outs[0], indent+2))
         else:
-            steps.append({"type":"step","id":nid,"text":text})
-            lines.append(" " * indent + f"- {text}")
-            for nxt in list(G.successors(nid)):
-                dfs(nxt, indent)
+            steps.append({"type":"step","id":ids[arg],"text":text})
+            lines.append(pad + f"- {text}")
+            stack.extend(("visit", o, indent) for o in reversed(outs))
 
-    dfs(starts[0], 0)
     return {
         "steps": steps,
         "pseudocode": "\n".join(lines),
-        "start": starts[0],
-        "unvisited": [n for n in G.nodes() if n not in visited]
+        "start": ids[starts[0]],
+        "unvisited": [nid for nid, seen in zip(ids, visited) if not seen]
     }
@@ -2,31 +2,34 @@ from __future__ import annotations
 import cv2
 import numpy as np
 
-def detect_arrows(img_bgr, bin_img, nodes):
-    mask = bin_img.copy()
-    for n in nodes:
-        x1, y1, x2, y2 = n["bbox"]
-        pad = 8
-        x1 = max(0, x1 - pad); y1 = max(0, y1 - pad)
-        x2 = min(mask.shape[1]-1, x2 + pad); y2 = min(mask.shape[0]-1, y2 + pad)
-        cv2.rectangle(mask, (x1, y1), (x2, y2), 0, thickness=-1)
+from core.settings import settings
+from core.spatial_index import BoxIndex, match_segments
+from core.image_context import ImageContext
 
-    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
-    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel, iterations=2)
+def detect_arrows(img_bgr, bin_img, nodes, ctx: ImageContext | None = None, scale: float = 1.0):
+    ctx = ctx or ImageContext(img_bgr, binary=bin_img)
+    mask = ctx.masked("binary", [n["bbox"] for n in nodes], pad=round(8 * scale))
+    return segments_to_edges(nodes, hough_segments(mask, scale), scale)
 
-    lines = cv2.HoughLinesP(mask, 1, np.pi/180, threshold=60, minLineLength=25, maxLineGap=12)
+# `scale` stretches the pixel thresholds tuned for the ~1800 px working image
+def hough_segments(mask, scale: float = 1.0) -> list[tuple[int, int, int, int]]:
+    lines = cv2.HoughLinesP(mask, 1, np.pi/180, threshold=round(60 * scale), minLineLength=25 * scale,
+                            maxLineGap=12 * scale)
     if lines is None:
         return []
+    return [(int(x1), int(y1), int(x2), int(y2)) for x1, y1, x2, y2 in lines[:, 0]]
 
-    node_boxes = [(n["id"], n["bbox"], n["center"]) for n in nodes]
-    segs = [(int(x1), int(y1), int(x2), int(y2)) for x1, y1, x2, y2 in lines[:, 0]]
+def segments_to_edges(nodes, segs, scale: float = 1.0):
+    if not segs or not nodes:
+        return []
+    index = BoxIndex([n["bbox"] for n in nodes], [n["center"] for n in nodes])
+    near_a, near_b = match_segments(index, segs, max_dist=80 * scale, metric=settings.ARROW_MATCH_METRIC)
 
     edges = []
-    for (x1, y1, x2, y2) in segs:
-        a = _nearest_node((x1, y1), node_boxes)
-        b = _nearest_node((x2, y2), node_boxes)
-        if a is None or b is None or a == b:
+    for (x1, y1, x2, y2), ia, ib in zip(segs, near_a.tolist(), near_b.tolist()):
+        if ia < 0 or ib < 0 or ia == ib:
             continue
+        a, b = nodes[ia]["id"], nodes[ib]["id"]
         src, dst = (a, b) if (y1, x1) <= (y2, x2) else (b, a)
         edges.append({"source": src, "target": dst, "kind": "sequence"})
 
@@ -34,19 +37,3 @@ def detect_arrows(img_bgr, bin_img, nodes):
     for e in edges:
         uniq[(e["source"], e["target"])] = e
     return list(uniq.values())
-
-def _nearest_node(pt, node_boxes, max_dist=80):
-    x, y = pt
-    best = None
-    best_d = 1e18
-    for nid, bbox, center in node_boxes:
-        cx, cy = center
-        d = (cx - x) ** 2 + (cy - y) ** 2
-        if d < best_d:
-            best_d = d
-            best = nid
-    if best is None:
-        return None
-    if (best_d ** 0.5) > max_dist:
-        return None
-    return best
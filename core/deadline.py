@@ -0,0 +1,28 @@
+from __future__ import annotations
+import time
+
+class DeadlineExceeded(TimeoutError):
+    def __init__(self, stage: str):
+        super().__init__(f"Hard timeout exceeded in {stage}.")
+        self.stage = stage
+
+class Deadline:
+    def __init__(self, budget_s: float):
+        self.budget_s = budget_s
+        self.t0 = time.monotonic()
+
+    def remaining(self) -> float:
+        return max(0.0, self.budget_s - (time.monotonic() - self.t0))
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+    def check(self, stage: str):
+        if self.expired():
+            raise DeadlineExceeded(stage)
+
+def call_timeout(deadline: Deadline | None) -> float:
+    # timeout to hand to a blocking call; 0 means "no limit"
+    if deadline is None:
+        return 0.0
+    return max(deadline.remaining(), 1e-3)
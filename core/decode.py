@@ -0,0 +1,106 @@
+from __future__ import annotations
+import struct
+
+import cv2
+import numpy as np
+
+from core.settings import settings
+from core.preprocess import MAX_SIDE
+
+class ImageTooLarge(ValueError):
+    pass
+
+_REDUCED = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+_REDUCED_GRAY = ((8, cv2.IMREAD_REDUCED_GRAYSCALE_8), (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+                 (2, cv2.IMREAD_REDUCED_GRAYSCALE_2))
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+def check_upload_size(size: int):
+    if settings.MAX_UPLOAD_BYTES and size > settings.MAX_UPLOAD_BYTES:
+        raise ImageTooLarge(f"Upload is {size} bytes, limit is {settings.MAX_UPLOAD_BYTES}.")
+
+# bytes (or a memoryview) -> BGR image no larger than needed for a `max_side` working copy;
+# limits are enforced from the header, before anything is decompressed. full=True decodes at
+# full resolution, gray=True to a single channel
+def decode_image(data, full: bool = False, gray: bool = False, max_side: int = MAX_SIDE) -> np.ndarray:
+    check_upload_size(len(data))
+    probe = probe_image(data)
+    flags = cv2.IMREAD_GRAYSCALE if gray else cv2.IMREAD_COLOR
+    if probe is not None:
+        fmt, w, h = probe
+        _check_pixels(w, h)
+        # libjpeg scales in the DCT, so a reduced JPEG decode never materialises full resolution;
+        # other formats would be decoded in full and decimated, which is no cheaper and looks worse
+        if fmt == "jpeg" and settings.DECODE_REDUCED and not full:
+            reduced = _REDUCED_GRAY if gray else _REDUCED
+            flags = next((f for k, f in reduced if max(w, h) // k >= max_side), flags)
+
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+    if img is None:
+        raise RuntimeError("Could not decode image.")
+    if probe is None:
+        _check_pixels(img.shape[1], img.shape[0])
+    return img
+
+# working copy for detection at DETECT_MAX_SIDE plus what preprocess_context needs to read OCR crops
+# at the original resolution: a loader that decodes it on first use (None when the copy is already
+# full size) and its (w, h)
+def decode_for_detection(data):
+    max_side = detect_max_side()
+    img = decode_image(data, max_side=max_side)
+    h, w = img.shape[:2]
+    probe = probe_image(data)
+    if probe is None or max(probe[1], probe[2]) == max(h, w):
+        return img, None, None
+    return img, (lambda: decode_image(data, full=True, gray=True)), (probe[1], probe[2])
+
+def detect_max_side() -> int:
+    return min(settings.DETECT_MAX_SIDE, MAX_SIDE) if settings.DETECT_MAX_SIDE > 0 else MAX_SIDE
+
+def probe_image(data) -> tuple[str, int, int] | None:
+    head = bytes(data[:32])
+    try:
+        if head.startswith(b"\x89PNG\r\n\x1a\n") and head[12:16] == b"IHDR":
+            w, h = struct.unpack(">II", head[16:24])
+            return _probe("png", w, h)
+        if head.startswith(b"\xff\xd8"):
+            return _probe_jpeg(data)
+        if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+            chunk = head[12:16]
+            if chunk == b"VP8 ":
+                w, h = struct.unpack("<HH", head[26:30])
+                return _probe("webp", w & 0x3FFF, h & 0x3FFF)
+            if chunk == b"VP8L":
+                bits = struct.unpack("<I", head[21:25])[0]
+                return _probe("webp", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1)
+            if chunk == b"VP8X":
+                return _probe("webp", 1 + int.from_bytes(head[24:27], "little"),
+                              1 + int.from_bytes(head[27:30], "little"))
+    except struct.error:
+        return None
+    return None
+
+def _probe_jpeg(data) -> tuple[str, int, int] | None:
+    i, n = 2, len(data)
+    while i + 9 < n:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        if marker in _JPEG_SOF:
+            h, w = struct.unpack(">HH", bytes(data[i + 5:i + 9]))
+            return _probe("jpeg", w, h)
+        if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+            i += 2
+            continue
+        i += 2 + struct.unpack(">H", bytes(data[i + 2:i + 4]))[0]
+    return None
+
+def _probe(fmt: str, w: int, h: int) -> tuple[str, int, int] | None:
+    return (fmt, w, h) if w > 0 and h > 0 else None
+
+def _check_pixels(w: int, h: int):
+    if settings.MAX_IMAGE_PIXELS and w * h > settings.MAX_IMAGE_PIXELS:
+        raise ImageTooLarge(f"Image is {w}x{h} = {w * h} px, limit is {settings.MAX_IMAGE_PIXELS}.")
@@ -1,36 +1,81 @@
 from __future__ import annotations
-import time
-import cv2
-import numpy as np
 
-from core.preprocess import preprocess
+from core.settings import settings
+from core.decode import decode_image, decode_for_detection, detect_max_side
+from core.preprocess import preprocess_context
+from core.image_context import ImageContext
+from core.tiling import use_tiles, detect_tiled
 from core.shapes import detect_shapes
 from core.arrows import detect_arrows
 from core.ocr import ocr_nodes
 from core.graph_build import build_graph
 from core.algorithm import graph_to_algorithm
+from core.deadline import Deadline, DeadlineExceeded
+from core.timings import stage
 
 def parse_with_cv(image_bytes: bytes, hard_timeout_s: float) -> dict:
-    t0 = time.time()
-    arr = np.frombuffer(image_bytes, dtype=np.uint8)
-    img = cv2.imdecode(arr, cv2.IMREAD_COLOR)
-    if img is None:
-        raise RuntimeError("Could not decode image.")
-
-    img_p, bin_img = preprocess(img); _check(t0, hard_timeout_s)
-    nodes = detect_shapes(img_p, bin_img); _check(t0, hard_timeout_s)
-    edges = detect_arrows(img_p, bin_img, nodes); _check(t0, hard_timeout_s)
-    nodes = ocr_nodes(img_p, nodes); _check(t0, hard_timeout_s)
-    graph = build_graph(nodes, edges); _check(t0, hard_timeout_s)
-    algo = graph_to_algorithm(graph); _check(t0, hard_timeout_s)
+    deadline = Deadline(hard_timeout_s)
+    if use_tiles(image_bytes):
+        return _parse_tiled(image_bytes, deadline)
+    with stage("decode"):
+        img, source, source_size = decode_for_detection(image_bytes)
 
+    nodes, edges, truncated = [], [], ""
+    with stage("preprocess"):
+        ctx = preprocess_context(img, detect_max_side(), source, source_size)
+        img_p, bin_img, k = ctx.bgr, ctx.binary, ctx.scale
+    try:
+        deadline.check("preprocess")
+        with stage("detect_shapes"):
+            nodes = detect_shapes(img_p, bin_img, min_area=700 * k * k)
+        deadline.check("detect_shapes")
+        with stage("detect_arrows"):
+            edges = detect_arrows(img_p, bin_img, nodes, ctx=ctx, scale=k)
+        deadline.check("detect_arrows")
+        with stage("ocr_nodes"):
+            nodes = ocr_nodes(img_p, nodes, deadline=deadline, ctx=ctx)
+    except DeadlineExceeded as e:
+        truncated = e.stage
+
+    return _finish(nodes, edges, truncated, deadline, ctx)
+
+# wall-sized pages: detection runs over overlapping full-resolution tiles and OCR reads the same
+# full-resolution image, so the detection space is the original one (meta.coords.scale = 1).
+# PNG/JPEG/WebP cannot be decoded by region with OpenCV or Pillow, so the grayscale page is decoded
+# whole and held for the request: w*h bytes, capped by MAX_IMAGE_PIXELS.
+def _parse_tiled(image_bytes: bytes, deadline: Deadline) -> dict:
+    with stage("decode"):
+        gray = decode_image(image_bytes, full=True, gray=True)
+
+    ctx = ImageContext(gray)
+    nodes, edges, truncated, tiles = [], [], "", 0
+    try:
+        with stage("detect_tiles"):
+            nodes, edges, tiles = detect_tiled(gray, deadline)
+        deadline.check("detect_tiles")
+        with stage("ocr_nodes"):
+            nodes = ocr_nodes(gray, nodes, deadline=deadline, ctx=ctx)
+    except DeadlineExceeded as e:
+        truncated = e.stage
+
+    raw = _finish(nodes, edges, truncated, deadline, ctx)
+    raw["meta"]["tiled"] = {"tiles": tiles, "tile": settings.TILE_SIZE, "overlap": settings.TILE_OVERLAP}
+    return raw
+
+def _finish(nodes, edges, truncated: str, deadline: Deadline, ctx: ImageContext) -> dict:
+    # graph building is cheap, so a partial result is always returned
+    with stage("build_graph"):
+        graph = build_graph(nodes, edges)
+    with stage("graph_to_algorithm"):
+        algo = graph_to_algorithm(graph)
+
+    meta = {"engine": "opencv+contours + tesseract-ocr + rules", "hard_timeout_s": deadline.budget_s,
+            "truncated": bool(truncated), "coords": ctx.coords()}
+    if truncated:
+        meta["truncated_stage"] = truncated
     return {
-        "meta": {"engine": "opencv+contours + tesseract-ocr + rules", "hard_timeout_s": hard_timeout_s},
+        "meta": meta,
         "graph": graph,
         "algorithm": algo,
         "extras": {}
     }
-
-def _check(t0: float, hard_timeout_s: float):
-    if time.time() - t0 > hard_timeout_s:
-        raise TimeoutError(f"Hard timeout exceeded ({hard_timeout_s}s).")
@@ -1,21 +1,19 @@
 from __future__ import annotations
-import time
 from typing import List
 
-import cv2
-import numpy as np
-
-from core.preprocess import preprocess
+from core.decode import decode_for_detection, detect_max_side
+from core.preprocess import preprocess_context
+from core.image_context import ImageContext
 from core.ocr import ocr_nodes
 from core.graph_build import build_graph
 from core.algorithm import graph_to_algorithm
 
 from core.yolo_blocks import DiagramBlock
 from core.yolo_arrow_parser import parse_arrows
-from core.swimlane_tools import process_swimlanes
-
-class YOLOUnavailable(RuntimeError):
-    pass
+from core.swimlane_tools import process_swimlanes, LANE_TYPES
+from core.model_registry import yolo_registry, YOLOUnavailable
+from core.deadline import Deadline, DeadlineExceeded
+from core.timings import stage
 
 _KIND_MAP = {
     "Task": "rectangle",
@@ -32,33 +30,45 @@ _KIND_MAP = {
 }
 
 def parse_with_yolo_bpmn(image_bytes: bytes, hard_timeout_s: float) -> dict:
-    t0 = time.time()
+    deadline = Deadline(hard_timeout_s)
+    ctx = prepare_yolo(image_bytes)
+    res, truncated = None, ""
     try:
-        from ultralytics import YOLO
-    except Exception as e:
-        raise YOLOUnavailable("ultralytics is not installed. Install: pip install -r requirements-yolo.txt") from e
-
-    arr = np.frombuffer(image_bytes, dtype=np.uint8)
-    img = cv2.imdecode(arr, cv2.IMREAD_COLOR)
-    if img is None:
-        raise RuntimeError("Could not decode image.")
-
-    img_p, _bin = preprocess(img); _check(t0, hard_timeout_s)
-
-    model = YOLO("model/best.pt")
-    res = model.predict(source=img_p)
-    _check(t0, hard_timeout_s)
-
-    blocks = _to_blocks(res, img_p.shape[:2])
-    _check(t0, hard_timeout_s)
-
-    swimlanes = process_swimlanes(img_p, blocks)
-    _check(t0, hard_timeout_s)
-
-    arrows = parse_arrows(img_p, blocks, proximity_threshold=30)
-    _check(t0, hard_timeout_s)
-
-    nodes=[]
+        deadline.check("preprocess")
+        with stage("yolo_predict"):
+            res = yolo_registry.predict(ctx.bgr, deadline=deadline)
+        deadline.check("yolo_predict")
+    except DeadlineExceeded as e:
+        truncated = e.stage
+    return finish_yolo(ctx, res, deadline, hard_timeout_s, truncated)
+
+# decode + working copy; the YOLO path never needs the adaptive binary, so the context never builds it
+def prepare_yolo(image_bytes: bytes) -> ImageContext:
+    with stage("decode"):
+        img, source, source_size = decode_for_detection(image_bytes)
+    with stage("preprocess"):
+        return preprocess_context(img, detect_max_side(), source, source_size)
+
+# everything after the forward pass; `truncated` names the stage if the deadline hit before it ended
+def finish_yolo(ctx: ImageContext, res, deadline: Deadline, hard_timeout_s: float, truncated: str = "") -> dict:
+    img_p, k = ctx.bgr, ctx.scale
+    blocks, swimlanes, arrows = [], [], []
+    if not truncated:
+        blocks = _to_blocks(res, img_p.shape[:2])
+        try:
+            with stage("swimlanes"):
+                swimlanes = process_swimlanes(img_p, blocks, vertical_threshold=round(30 * k),
+                                              text_search_width=round(220 * k), deadline=deadline, ctx=ctx)
+            deadline.check("swimlanes")
+
+            with stage("arrows"):
+                arrows = parse_arrows(img_p, blocks, proximity_threshold=30 * k, ctx=ctx)
+            deadline.check("arrows")
+        except DeadlineExceeded as e:
+            truncated = e.stage
+
+    lane_names = {s.id: s.name for s in swimlanes}
+    nodes, ocr_targets = [], []
     for i,b in enumerate(blocks):
         x1,y1,x2,y2=b.bbox
         cx=(x1+x2)/2.0; cy=(y1+y2)/2.0
@@ -77,23 +87,39 @@ def parse_with_yolo_bpmn(image_bytes: bytes, hard_timeout_s: float) -> dict:
             "center": [float(cx), float(cy)],
             "role": str(b.swimlane) if b.swimlane >= 0 else "",
         })
-
-    nodes = ocr_nodes(img_p, nodes); _check(t0, hard_timeout_s)
+        # lane blocks were already read by process_swimlanes; reuse that name instead of a second OCR
+        if b.type.lower() in LANE_TYPES and b.swimlane in lane_names:
+            nodes[-1]["label"] = lane_names[b.swimlane]
+        else:
+            ocr_targets.append(nodes[-1])
+
+    if not truncated:
+        try:
+            with stage("ocr_nodes"):
+                ocr_nodes(img_p, ocr_targets, deadline=deadline, ctx=ctx)
+        except DeadlineExceeded as e:
+            truncated = e.stage
 
     edges=[]
     for a in arrows:
         if a.from_box < len(nodes) and a.to_box < len(nodes):
             edges.append({"source": nodes[a.from_box]["id"], "target": nodes[a.to_box]["id"], "kind": "sequence"})
 
-    graph = build_graph(nodes, edges); _check(t0, hard_timeout_s)
-    algo = graph_to_algorithm(graph); _check(t0, hard_timeout_s)
+    with stage("build_graph"):
+        graph = build_graph(nodes, edges)
+    with stage("graph_to_algorithm"):
+        algo = graph_to_algorithm(graph)
 
     extras = {
         "swimlanes": [{"id": s.id, "name": s.name, "y_top": s.y_top, "y_bottom": s.y_bottom} for s in swimlanes],
         "engine_notes": "yolo_bpmn: blocks via model/best.pt; arrows via hough; swimlanes via yolo+ocr(left strip)"
     }
+    meta = {"engine": "yolo_bpmn + swimlane + arrow_parser", "hard_timeout_s": hard_timeout_s,
+            "truncated": bool(truncated), "coords": ctx.coords()}
+    if truncated:
+        meta["truncated_stage"] = truncated
     return {
-        "meta": {"engine": "yolo_bpmn + swimlane + arrow_parser", "hard_timeout_s": hard_timeout_s},
+        "meta": meta,
         "graph": graph,
         "algorithm": algo,
         "extras": extras
@@ -123,7 +149,3 @@ def _to_blocks(res, shape_hw) -> List[DiagramBlock]:
         blocks.append(DiagramBlock(type=label, bbox=(x1,y1,x2,y2)))
     blocks.sort(key=lambda b: (b.bbox[1], b.bbox[0]))
     return blocks
-
-def _check(t0: float, hard_timeout_s: float):
-    if time.time() - t0 > hard_timeout_s:
-        raise TimeoutError(f"Hard timeout exceeded ({hard_timeout_s}s).")
@@ -1,8 +1,25 @@
 from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from typing import Dict, List, Tuple
-from rapidfuzz import fuzz
+import multiprocessing as mp
+import os
+import numpy as np
+from rapidfuzz import fuzz, process
 import re
 
+from core.settings import settings
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # optional; a numpy Hungarian below is used instead
+    linear_sum_assignment = None
+
+MATCH_MODES = ("greedy", "optimal")
+_THRESHOLD = 70
+# below this many (prediction, ground truth) pairs starting worker processes costs more than it saves
+_PARALLEL_MIN_PAIRS = 50_000
+
 def parse_ground_truth_txt(text: str) -> Dict[str, List[dict]]:
     lines = [l.rstrip("\n") for l in text.splitlines()]
     blocks: Dict[str, List[dict]] = {"__global__": []}
@@ -26,18 +43,33 @@ def parse_ground_truth_txt(text: str) -> Dict[str, List[dict]]:
         blocks.pop("__global__", None)
     return blocks
 
-def evaluate_predictions(preds_map: Dict[str, List[dict]], gt_map: Dict[str, List[dict]]) -> dict:
-    per_file = []
+def evaluate_predictions(preds_map: Dict[str, List[dict]], gt_map: Dict[str, List[dict]],
+                         match: str = "greedy", workers: int = 0) -> dict:
+    if match not in MATCH_MODES:
+        raise ValueError(f"Unknown match mode: {match}")
+    jobs = [(pred_steps, gt_map.get(fname) or gt_map.get("__global__") or [])
+            for fname, pred_steps in preds_map.items()]
+    workers = min(workers or min(8, os.cpu_count() or 1), len(jobs))
+    # the greedy walk and the numpy Hungarian fallback are Python loops holding the GIL: files are
+    # scored in worker processes, as eval_cli parses them
+    if workers > 1 and sum(len(p) * len(g) for p, g in jobs) >= _PARALLEL_MIN_PAIRS:
+        ctx = mp.get_context(settings.PARSE_MP_CONTEXT)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            metrics = list(pool.map(partial(_eval_one, match=match), *zip(*jobs),
+                                    chunksize=max(1, len(jobs) // (workers * 4))))
+    else:
+        metrics = [_eval_one(*j, match=match) for j in jobs]
+    per_file = [{"file": fname, **m} for fname, m in zip(preds_map, metrics)]
+    return {"meta": {"threshold": _THRESHOLD, "match": match},
+            "summary": summarize(per_file),
+            "per_file": per_file}
+
+def summarize(per_file: List[dict]) -> dict:
     agg = {"tp":0,"fp":0,"fn":0,
            "sum_score":0.0,"sum_matched":0,
            "sum_order_ok":0,"sum_order_total":0,
            "sum_role_ok":0,"sum_role_total":0}
-
-    for fname, pred_steps in preds_map.items():
-        gt_steps = gt_map.get(fname) or gt_map.get("__global__") or []
-        m = _eval_one(pred_steps, gt_steps)
-        per_file.append({"file": fname, **m})
-
+    for m in per_file:
         agg["tp"] += m["tp"]; agg["fp"] += m["fp"]; agg["fn"] += m["fn"]
         agg["sum_score"] += m["avg_match_score"] * m["matched"]
         agg["sum_matched"] += m["matched"]
@@ -51,33 +83,21 @@ def evaluate_predictions(preds_map: Dict[str, List[dict]], gt_map: Dict[str, Lis
     order_acc = (agg["sum_order_ok"]/agg["sum_order_total"]) if agg["sum_order_total"] else 0.0
     role_acc = (agg["sum_role_ok"]/agg["sum_role_total"]) if agg["sum_role_total"] else 0.0
 
-    return {"meta":{"threshold":70},
-            "summary":{"step_precision":round(precision,4),
-                       "step_recall":round(recall,4),
-                       "step_f1@70":round(f1,4),
-                       "avg_match_score":round(avg_score,2),
-                       "order_accuracy":round(order_acc,4),
-                       "role_accuracy@70":round(role_acc,4)},
-            "per_file": per_file}
+    return {"step_precision":round(precision,4),
+            "step_recall":round(recall,4),
+            "step_f1@70":round(f1,4),
+            "avg_match_score":round(avg_score,2),
+            "order_accuracy":round(order_acc,4),
+            "role_accuracy@70":round(role_acc,4)}
 
-def _eval_one(pred: List[dict], gt: List[dict]) -> dict:
+def _eval_one(pred: List[dict], gt: List[dict], match: str = "greedy") -> dict:
     pred_desc = [_norm(p.get("action") or p.get("description") or "") for p in pred]
     gt_desc = [_norm(g.get("description") or "") for g in gt]
 
-    used_gt = set()
     matches: List[Tuple[int,int,int]] = []
-
-    for pi, p in enumerate(pred_desc):
-        best_gi, best_score = -1, -1
-        for gi, g in enumerate(gt_desc):
-            if gi in used_gt:
-                continue
-            score = fuzz.token_sort_ratio(p, g)
-            if score > best_score:
-                best_score, best_gi = score, gi
-        if best_score >= 70 and best_gi != -1:
-            used_gt.add(best_gi)
-            matches.append((pi, best_gi, int(best_score)))
+    if pred_desc and gt_desc:
+        scores = process.cdist(pred_desc, gt_desc, scorer=fuzz.token_sort_ratio, dtype=np.float64)
+        matches = _match_optimal(scores) if match == "optimal" else _match_greedy(scores)
 
     tp = len(matches)
     fp = max(0, len(pred_desc) - tp)
@@ -95,7 +115,7 @@ def _eval_one(pred: List[dict], gt: List[dict]) -> dict:
             continue
         role_total += 1
         pred_role = (pred[pi].get("role") or "").strip()
-        if fuzz.token_sort_ratio(_norm(pred_role), _norm(gt_role)) >= 70:
+        if fuzz.token_sort_ratio(_norm(pred_role), _norm(gt_role)) >= _THRESHOLD:
             role_ok += 1
 
     return {"tp":tp,"fp":fp,"fn":fn,
@@ -104,6 +124,75 @@ def _eval_one(pred: List[dict], gt: List[dict]) -> dict:
             "role_ok":role_ok,"role_total":role_total,
             "pred_len":len(pred_desc),"gt_len":len(gt_desc)}
 
+# each prediction in order takes the best still-unused ground-truth step (first one on ties)
+def _match_greedy(scores: np.ndarray) -> List[Tuple[int,int,int]]:
+    free = np.ones(scores.shape[1], dtype=bool)
+    matches = []
+    for pi in range(scores.shape[0]):
+        if not free.any():
+            break
+        row = np.where(free, scores[pi], -1.0)
+        gi = int(np.argmax(row))
+        if row[gi] >= _THRESHOLD:
+            free[gi] = False
+            matches.append((pi, gi, int(row[gi])))
+    return matches
+
+# order-independent: maximise the number of pairs above the threshold, then their total score
+def _match_optimal(scores: np.ndarray) -> List[Tuple[int,int,int]]:
+    ok = scores >= _THRESHOLD
+    if not ok.any():
+        return []
+    weight = np.where(ok, scores + 1000.0, 0.0)
+    solve = linear_sum_assignment or _hungarian
+    rows, cols = solve(-weight)
+    return [(int(r), int(c), int(scores[r, c])) for r, c in zip(rows, cols) if ok[r, c]]
+
+# min-cost rectangular assignment (shortest augmenting path with potentials, O(n^2 m));
+# returns (rows, cols) sorted by row like scipy.optimize.linear_sum_assignment
+def _hungarian(cost: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=np.int64)  # p[j]: 1-based row assigned to column j, 0 = free
+    way = np.zeros(m + 1, dtype=np.int64)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used
+            free[0] = False
+            cur = cost[i0 - 1] - u[i0] - v[1:]
+            better = free[1:] & (cur < minv[1:])
+            minv[1:][better] = cur[better]
+            way[1:][better] = j0
+            cand = np.where(free, minv, np.inf)
+            j1 = int(np.argmin(cand))
+            delta = cand[j1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    cols = np.flatnonzero(p[1:])
+    rows = p[1:][cols] - 1
+    if transposed:
+        rows, cols = cols, rows
+    order = np.argsort(rows)
+    return rows[order], cols[order]
+
 def _split_desc_role(s: str) -> tuple[str,str]:
     if "|" in s:
         parts = [p.strip() for p in s.split("|") if p.strip()]
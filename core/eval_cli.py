@@ -0,0 +1,223 @@
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from core.settings import settings
+from core.eval import parse_ground_truth_txt, evaluate_predictions, summarize, MATCH_MODES, _THRESHOLD
+from core.result_cache import image_digest, engine_version
+
+_EXTS = (".png", ".jpg", ".jpeg", ".webp")
+
+# predictions keyed by (image hash, engine version, timeout) and per-file scores keyed additionally
+# by the file's ground truth, so reruns only parse new images and only rescore what changed
+class PredictionStore:
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS predictions ("
+                         "digest TEXT NOT NULL, version TEXT NOT NULL, steps TEXT NOT NULL, "
+                         "elapsed_ms REAL NOT NULL, created REAL NOT NULL, PRIMARY KEY (digest, version))")
+        self._db.execute("CREATE TABLE IF NOT EXISTS scores ("
+                         "file TEXT NOT NULL, digest TEXT NOT NULL, version TEXT NOT NULL, gt TEXT NOT NULL, "
+                         "match TEXT NOT NULL, metrics TEXT NOT NULL, PRIMARY KEY (file, digest, version, gt, match))")
+
+    def get_steps(self, digest: str, version: str) -> list[dict] | None:
+        row = self._db.execute("SELECT steps FROM predictions WHERE digest=? AND version=?",
+                               (digest, version)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_steps(self, digest: str, version: str, steps: list[dict], elapsed_ms: float):
+        self._db.execute("INSERT OR REPLACE INTO predictions VALUES (?,?,?,?,?)",
+                         (digest, version, json.dumps(steps, ensure_ascii=False), elapsed_ms, time.time()))
+
+    def get_score(self, key: tuple) -> dict | None:
+        row = self._db.execute("SELECT metrics FROM scores WHERE file=? AND digest=? AND version=? AND gt=? "
+                               "AND match=?", key).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_score(self, key: tuple, metrics: dict):
+        self._db.execute("INSERT OR REPLACE INTO scores VALUES (?,?,?,?,?,?)", (*key, json.dumps(metrics)))
+
+    def close(self):
+        self._db.close()
+
+def run(images_dir: str, gt_path: str, engine: str = "cv", store_path: str = ".eval/predictions.sqlite",
+        workers: int = 0, match: str = "greedy", hard_timeout_s: float = 20.0, reparse: bool = False) -> dict:
+    from core.pipeline import normalize_engine
+
+    started = time.time()
+    engine = normalize_engine(engine)
+    with open(gt_path, "r", encoding="utf-8", errors="ignore") as f:
+        gt_map = parse_ground_truth_txt(f.read())
+
+    files = _list_images(images_dir)
+    version = f"{engine_version(engine)}:{hard_timeout_s}"
+    store = PredictionStore(store_path)
+    try:
+        digests, preds, todo = {}, {}, []
+        for name, path in files:
+            with open(path, "rb") as f:
+                digests[name] = image_digest(f.read())
+            steps = None if reparse else store.get_steps(digests[name], version)
+            if steps is None:
+                todo.append((name, path))
+            else:
+                preds[name] = steps
+
+        failed, partial = {}, set()
+        for name, steps, elapsed_ms, truncated, error in _predict_all(todo, engine, hard_timeout_s, workers):
+            if error:
+                failed[name] = error
+                continue
+            preds[name] = steps
+            # committed per file, so an interrupted run resumes where it stopped; truncated parses
+            # are scored but not kept, like in the result cache
+            if truncated:
+                partial.add(name)
+            else:
+                store.put_steps(digests[name], version, steps, elapsed_ms)
+
+        per_file, changed, keys = {}, {}, {}
+        for name in (n for n, _ in files if n in preds):
+            gt = gt_map.get(name) or gt_map.get("__global__") or []
+            gt_hash = hashlib.sha256(json.dumps(gt, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+            keys[name] = (name, digests[name], version, gt_hash, match)
+            cached = None if name in partial else store.get_score(keys[name])
+            if cached is not None:
+                per_file[name] = cached
+            else:
+                changed[name] = preds[name]
+        if changed:
+            for row in evaluate_predictions(changed, gt_map, match=match, workers=max(1, workers))["per_file"]:
+                per_file[row["file"]] = row
+                if row["file"] not in partial:
+                    store.put_score(keys[row["file"]], row)
+    finally:
+        store.close()
+
+    rows = [per_file[n] for n, _ in files if n in per_file]
+    return {"meta": {"threshold": _THRESHOLD, "match": match, "engine": engine, "files": len(files),
+                     "parsed": len(todo) - len(failed), "reused": len(files) - len(todo), "rescored": len(changed),
+                     "failed": failed, "elapsed_s": round(time.time() - started, 2)},
+            "summary": summarize(rows),
+            "per_file": rows}
+
+def _list_images(images_dir: str) -> list[tuple[str, str]]:
+    out = []
+    for root, _dirs, names in os.walk(images_dir):
+        for n in names:
+            if n.lower().endswith(_EXTS):
+                path = os.path.join(root, n)
+                out.append((os.path.relpath(path, images_dir).replace(os.sep, "/"), path))
+    return sorted(out)
+
+# yields (name, steps, elapsed_ms, truncated, error) as files finish; workers <= 1 parses in this process.
+# yolo_bpmn files go YOLO_BATCH_SIZE per job so each job is one forward pass
+def _predict_all(todo, engine: str, hard_timeout_s: float, workers: int):
+    if not todo:
+        return
+    size = max(1, settings.YOLO_BATCH_SIZE) if engine == "yolo_bpmn" else 1
+    chunks = [todo[i:i + size] for i in range(0, len(todo), size)]
+
+    def finished():
+        if workers <= 1:
+            for chunk in chunks:
+                yield chunk, _predict_safe([p for _, p in chunk], engine, hard_timeout_s)
+            return
+        ctx = mp.get_context(settings.PARSE_MP_CONTEXT)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            futs = {pool.submit(_predict_safe, [p for _, p in chunk], engine, hard_timeout_s): chunk
+                    for chunk in chunks}
+            for fut in as_completed(futs):
+                yield futs[fut], fut.result()
+
+    done = 0
+    for chunk, rows in finished():
+        for (name, _), row in zip(chunk, rows):
+            done += 1
+            print(f"[{done}/{len(todo)}] {name}", file=sys.stderr)
+            yield (name, *row)
+
+def _predict_safe(paths: list[str], engine: str, hard_timeout_s: float) -> list[tuple]:
+    if len(paths) > 1:
+        return _predict_batch(paths, engine, hard_timeout_s)
+    try:
+        return [(*_predict(paths[0], engine, hard_timeout_s), "")]
+    except Exception as e:
+        return [_failed(e)]
+
+def _failed(e: Exception) -> tuple:
+    return None, 0.0, False, f"{type(e).__name__}: {e}"
+
+def _predict(path: str, engine: str, hard_timeout_s: float) -> tuple[list[dict], float, bool]:
+    from core.pipeline import parse_image_bytes
+    from core.output_format import build_output
+
+    with open(path, "rb") as f:
+        data = f.read()
+    t0 = time.perf_counter()
+    raw = parse_image_bytes(data, hard_timeout_s=hard_timeout_s, engine=engine)
+    steps = build_output(raw["graph"], raw["algorithm"])["bpmn"]["steps"]
+    elapsed_ms = round((time.perf_counter() - t0) * 1000.0, 2)
+    return steps, elapsed_ms, bool(raw["meta"].get("truncated"))
+
+def _predict_batch(paths: list[str], engine: str, hard_timeout_s: float) -> list[tuple]:
+    from core.pipeline import parse_image_batch
+    from core.output_format import build_output
+
+    # failures stay per file, as in _predict_safe: an unreadable file or a bad result fails only its row
+    rows, datas, idx = [None] * len(paths), [], []
+    for i, path in enumerate(paths):
+        try:
+            with open(path, "rb") as f:
+                datas.append(f.read())
+            idx.append(i)
+        except Exception as e:
+            rows[i] = _failed(e)
+    try:
+        parsed = parse_image_batch(datas, hard_timeout_s=hard_timeout_s, engine=engine) if datas else []
+    except Exception as e:
+        parsed = [e] * len(datas)
+    for i, raw in zip(idx, parsed):
+        try:
+            if isinstance(raw, Exception):
+                raise raw
+            steps = build_output(raw["graph"], raw["algorithm"])["bpmn"]["steps"]
+            rows[i] = (steps, raw["meta"]["timings"].get("total", 0.0), bool(raw["meta"].get("truncated")), "")
+        except Exception as e:
+            rows[i] = _failed(e)
+    return rows
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Evaluate a directory of diagrams against ground_truth.txt.")
+    ap.add_argument("images_dir")
+    ap.add_argument("ground_truth")
+    ap.add_argument("--engine", default="cv")
+    ap.add_argument("--store", default=".eval/predictions.sqlite", help="sqlite file with stored predictions")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="parse processes; 1 = in-process")
+    ap.add_argument("--match", default="greedy", choices=MATCH_MODES)
+    ap.add_argument("--timeout", type=float, default=20.0, help="hard timeout per image, seconds")
+    ap.add_argument("--reparse", action="store_true", help="ignore stored predictions")
+    ap.add_argument("--out", default="", help="write the JSON report here (default: stdout)")
+    args = ap.parse_args(argv)
+
+    report = run(args.images_dir, args.ground_truth, engine=args.engine, store_path=args.store,
+                 workers=args.workers, match=args.match, hard_timeout_s=args.timeout, reparse=args.reparse)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
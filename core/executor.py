@@ -0,0 +1,257 @@
+from __future__ import annotations
+import asyncio
+import multiprocessing as mp
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from multiprocessing import shared_memory
+
+from core.settings import settings
+from core.pipeline import parse_image_bytes, parse_image_batch, normalize_engine
+from core.result_cache import result_cache, cache_key
+from core import metrics
+from core.model_registry import yolo_registry
+
+_lock = threading.Lock()
+_state: dict = {"pool": None, "warm": False, "model_status": None}
+
+def executor_mode() -> str:
+    mode = (settings.PARSE_EXECUTOR or "process").lower().strip()
+    if mode not in ("process", "thread", "inline"):
+        raise ValueError(f"Unknown PARSE_EXECUTOR: {mode}")
+    return mode
+
+def worker_count() -> int:
+    return settings.PARSE_WORKERS if settings.PARSE_WORKERS > 0 else (os.cpu_count() or 1)
+
+def start_executor(weights: str | None = None):
+    if weights:
+        yolo_registry.set_active(weights)
+    mode = executor_mode()
+    if mode != "process":
+        yolo_registry.try_warmup()
+        if mode == "thread":
+            _get_pool()
+        _state["warm"] = True
+        return
+
+    pool = _get_pool()
+    futs = [pool.submit(_ping) for _ in range(worker_count())]
+    statuses = [f.result() for f in futs]
+    _state["model_status"] = statuses[0] if statuses else None
+    _state["warm"] = True
+
+def shutdown_executor(wait: bool = True):
+    with _lock:
+        pool, _state["pool"] = _state["pool"], None
+        _state["warm"] = False
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=not wait)
+
+def reload_models(path: str):
+    if executor_mode() != "process":
+        yolo_registry.reload(path)
+        return
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Weights not found: {path}")
+    # the new pool has to load the weights in every worker before it replaces the old one; until then, and
+    # if it fails, requests keep going to the old pool
+    pool = _new_pool(path)
+    try:
+        statuses = [f.result() for f in [pool.submit(_load, path) for _ in range(worker_count())]]
+    except BaseException:
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    with _lock:
+        old, _state["pool"] = _state["pool"], pool
+        _state["model_status"] = statuses[0]
+        _state["warm"] = True
+    yolo_registry.set_active(path)
+    if old is not None:
+        # parses already queued on the old pool finish there
+        threading.Thread(target=old.shutdown, kwargs={"wait": True}, daemon=True).start()
+
+def model_status() -> dict:
+    if executor_mode() == "process":
+        st = dict(_state["model_status"] or yolo_registry.status())
+        st["path"] = yolo_registry.active_path
+        return st
+    return yolo_registry.status()
+
+def executor_status() -> dict:
+    return {"mode": executor_mode(), "workers": worker_count() if executor_mode() != "inline" else 0,
+            "warm": _state["warm"]}
+
+async def run_parse(image_bytes, hard_timeout_s: float = 20.0, engine: str = "cv") -> dict:
+    engine = normalize_engine(engine)
+    key, raw, tier = None, None, "miss"
+    if settings.RESULT_CACHE_ENABLED:
+        key, raw, tier = (await asyncio.to_thread(_cache_get, [image_bytes], engine, hard_timeout_s))[0]
+    if raw is None:
+        try:
+            raw = await _dispatch(image_bytes, hard_timeout_s, engine)
+        except Exception:
+            metrics.observe_parse(engine, None, error=True)
+            raise
+        if key is not None and not raw["meta"].get("truncated"):
+            await asyncio.to_thread(result_cache.put, key, raw)
+    metrics.observe_parse(engine, raw, cache=tier)
+    raw["meta"]["cache"] = tier
+    return raw
+
+# several uploads in one job, so yolo_bpmn can batch them into one forward pass; cache hits are
+# answered directly, each entry is the result or the exception raised for that image
+async def run_parse_many(datas: list, hard_timeout_s: float = 20.0, engine: str = "cv") -> list:
+    engine = normalize_engine(engine)
+    if len(datas) == 1:
+        try:
+            return [await run_parse(datas[0], hard_timeout_s=hard_timeout_s, engine=engine)]
+        except Exception as e:
+            return [e]
+
+    out: list = [None] * len(datas)
+    keys, tiers = [None] * len(datas), ["miss"] * len(datas)
+    if settings.RESULT_CACHE_ENABLED and datas:
+        hits = await asyncio.to_thread(_cache_get, datas, engine, hard_timeout_s)
+        keys, out, tiers = (list(col) for col in zip(*hits))
+    todo = [i for i in range(len(datas)) if out[i] is None]
+
+    if todo:
+        try:
+            parsed = await _dispatch_batch([datas[i] for i in todo], hard_timeout_s, engine)
+        except Exception as e:
+            parsed = [e] * len(todo)
+        store = []
+        for i, raw in zip(todo, parsed):
+            out[i] = raw
+            if isinstance(raw, Exception):
+                metrics.observe_parse(engine, None, error=True)
+            elif keys[i] is not None and not raw["meta"].get("truncated"):
+                store.append((keys[i], raw))
+        if store:
+            await asyncio.to_thread(_cache_put, store)
+
+    for i, raw in enumerate(out):
+        if not isinstance(raw, Exception):
+            metrics.observe_parse(engine, raw, cache=tiers[i])
+            raw["meta"]["cache"] = tiers[i]
+    return out
+
+# hashing an upload of up to MAX_UPLOAD_BYTES, json and sqlite all block: run off the event loop
+def _cache_get(datas: list, engine: str, hard_timeout_s: float) -> list:
+    out = []
+    for data in datas:
+        key = cache_key(data, engine, hard_timeout_s)
+        out.append((key, *result_cache.get(key)))
+    return out
+
+def _cache_put(items: list):
+    for key, raw in items:
+        result_cache.put(key, raw)
+
+async def _dispatch_batch(datas: list, hard_timeout_s: float, engine: str) -> list:
+    mode = executor_mode()
+    if mode == "inline":
+        return parse_image_batch(datas, hard_timeout_s=hard_timeout_s, engine=engine)
+
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    if mode == "thread":
+        return await loop.run_in_executor(
+            pool, partial(parse_image_batch, datas, hard_timeout_s=hard_timeout_s, engine=engine))
+
+    sizes = [len(d) for d in datas]
+    shm = shared_memory.SharedMemory(create=True, size=max(1, sum(sizes)))
+    try:
+        pos = 0
+        for d, n in zip(datas, sizes):
+            shm.buf[pos:pos + n] = d
+            pos += n
+        return await loop.run_in_executor(pool, _parse_batch_shm, shm.name, sizes, hard_timeout_s, engine)
+    except BrokenProcessPool as e:
+        shutdown_executor(wait=False)
+        raise RuntimeError("Parse worker crashed.") from e
+    finally:
+        shm.close()
+        shm.unlink()
+
+async def _dispatch(image_bytes, hard_timeout_s: float, engine: str) -> dict:
+    mode = executor_mode()
+    if mode == "inline":
+        return parse_image_bytes(image_bytes, hard_timeout_s=hard_timeout_s, engine=engine)
+
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    if mode == "thread":
+        return await loop.run_in_executor(
+            pool, partial(parse_image_bytes, image_bytes, hard_timeout_s=hard_timeout_s, engine=engine))
+
+    size = len(image_bytes)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, size))
+    try:
+        shm.buf[:size] = image_bytes
+        return await loop.run_in_executor(pool, _parse_shm, shm.name, size, hard_timeout_s, engine)
+    except BrokenProcessPool as e:
+        shutdown_executor(wait=False)
+        raise RuntimeError("Parse worker crashed.") from e
+    finally:
+        shm.close()
+        shm.unlink()
+
+def _get_pool() -> Executor:
+    with _lock:
+        if _state["pool"] is None:
+            _state["pool"] = _new_pool(yolo_registry.active_path)
+        return _state["pool"]
+
+def _new_pool(weights: str) -> Executor:
+    if executor_mode() == "thread":
+        return ThreadPoolExecutor(max_workers=worker_count(), thread_name_prefix="parse")
+    return ProcessPoolExecutor(
+        max_workers=worker_count(),
+        mp_context=mp.get_context(settings.PARSE_MP_CONTEXT),
+        initializer=_init_worker,
+        initargs=(weights,),
+    )
+
+def _init_worker(weights: str):
+    import cv2  # noqa: F401
+    import pytesseract  # noqa: F401
+    import core.engines  # noqa: F401
+    from core import ocr_backend
+
+    ocr_backend.warmup()
+    yolo_registry.set_active(weights)
+    yolo_registry.try_warmup()
+
+def _ping() -> dict:
+    return yolo_registry.status()
+
+# unlike the warmup in _init_worker, load errors are raised
+def _load(weights: str) -> dict:
+    yolo_registry.warmup(weights)
+    return yolo_registry.status()
+
+def _parse_shm(name: str, size: int, hard_timeout_s: float, engine: str) -> dict:
+    shm = shared_memory.SharedMemory(name=name)
+    view = shm.buf[:size]
+    try:
+        return parse_image_bytes(view, hard_timeout_s=hard_timeout_s, engine=engine)
+    finally:
+        try:
+            view.release()
+            shm.close()
+        except BufferError:
+            pass  # a traceback still references the buffer; the mapping is freed with it
+
+def _parse_batch_shm(name: str, sizes: list[int], hard_timeout_s: float, engine: str) -> list:
+    shm = shared_memory.SharedMemory(name=name)
+    # copied out, so no view outlives the mapping; a batch is bounded by YOLO_BATCH_SIZE uploads
+    datas, pos = [], 0
+    for n in sizes:
+        datas.append(bytes(shm.buf[pos:pos + n]))
+        pos += n
+    shm.close()
+    return parse_image_batch(datas, hard_timeout_s=hard_timeout_s, engine=engine)
@@ -0,0 +1,73 @@
+from __future__ import annotations
+import numpy as np
+
+# directed graph over integer node indices with CSR adjacency; duplicate nodes/edges merge their
+# attributes and successors keep first-insertion order (same semantics as the networkx DiGraph
+# it replaces)
+class CompactGraph:
+    __slots__ = ("ids", "index", "attrs", "edge_attrs", "indptr", "indices", "in_degree", "_ptr", "_succ")
+
+    def __init__(self, ids: list[str], attrs: list[dict], edges: dict[tuple[int, int], dict]):
+        n = len(ids)
+        self.ids = ids
+        self.index = {nid: i for i, nid in enumerate(ids)}
+        self.attrs = attrs
+        pairs = np.array(list(edges), dtype=np.int32).reshape(-1, 2)
+        order = np.argsort(pairs[:, 0], kind="stable")
+        self.indices = pairs[order, 1]
+        self.indptr = np.zeros(n + 1, dtype=np.int32)
+        np.cumsum(np.bincount(pairs[:, 0], minlength=n), out=self.indptr[1:])
+        self.in_degree = np.bincount(pairs[:, 1], minlength=n)
+        edge_list = list(edges.values())
+        self.edge_attrs = [edge_list[k] for k in order.tolist()]
+        self._ptr = self.indptr.tolist()
+        self._succ = self.indices.tolist()
+
+    # implicit=True adds edge endpoints missing from `nodes` (as DiGraph.add_edge does);
+    # otherwise such edges are dropped
+    @classmethod
+    def from_json(cls, nodes, edges, implicit: bool = False) -> "CompactGraph":
+        ids: list[str] = []
+        index: dict[str, int] = {}
+        attrs: list[dict] = []
+        for n in nodes:
+            i = index.get(n["id"])
+            if i is None:
+                index[n["id"]] = len(ids)
+                ids.append(n["id"])
+                attrs.append(dict(n))
+            else:
+                attrs[i].update(n)
+
+        merged: dict[tuple[int, int], dict] = {}
+        for e in edges:
+            u, v = index.get(e["source"]), index.get(e["target"])
+            if u is None or v is None:
+                if not implicit:
+                    continue
+                for end in (e["source"], e["target"]):
+                    if end not in index:
+                        index[end] = len(ids)
+                        ids.append(end)
+                        attrs.append({})
+                u, v = index[e["source"]], index[e["target"]]
+            d = merged.get((u, v))
+            if d is None:
+                merged[(u, v)] = dict(e)
+            else:
+                d.update(e)
+        return cls(ids, attrs, merged)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def successors(self, i: int) -> list[int]:
+        return self._succ[self._ptr[i]:self._ptr[i + 1]]
+
+    # (source, target, attrs) grouped by source in node order
+    def edges(self):
+        k = 0
+        for u in range(len(self.ids)):
+            for v in self.successors(u):
+                yield u, v, self.edge_attrs[k]
+                k += 1
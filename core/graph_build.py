@@ -1,16 +1,11 @@
 from __future__ import annotations
-import networkx as nx
+from core.graph import CompactGraph
 
 def build_graph(nodes, edges):
-    G = nx.DiGraph()
-    for n in nodes:
-        G.add_node(n["id"], **n)
-    for e in edges:
-        if e["source"] in G and e["target"] in G:
-            G.add_edge(e["source"], e["target"], **e)
+    G = CompactGraph.from_json(nodes, edges)
 
     out_nodes = []
-    for nid, data in G.nodes(data=True):
+    for nid, data in zip(G.ids, G.attrs):
         out_nodes.append({
             "id": nid,
             "kind": data.get("kind","rectangle"),
@@ -21,7 +16,7 @@ def build_graph(nodes, edges):
         })
 
     out_edges = []
-    for u, v, data in G.edges(data=True):
-        out_edges.append({"source": u, "target": v, "kind": data.get("kind","sequence")})
+    for u, v, data in G.edges():
+        out_edges.append({"source": G.ids[u], "target": G.ids[v], "kind": data.get("kind","sequence")})
 
     return {"nodes": out_nodes, "edges": out_edges}
@@ -0,0 +1,120 @@
+from __future__ import annotations
+import math
+
+import cv2
+import numpy as np
+
+_KERNEL3 = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+
+# per-request holder for the working image and everything derived from it; each raster is
+# computed on first use and kept, mask buffers are reused between calls of the same size.
+# Geometry is detected on `bgr`; `source` is the original-resolution image (an array, or a loader
+# called on the first text crop) that OCR reads from, `source_size` its (w, h). Without a source
+# the working image is the original.
+class ImageContext:
+    # scale relates pixel thresholds to the MAX_SIDE working size they were tuned for
+    def __init__(self, bgr: np.ndarray, binary: np.ndarray | None = None, scale: float = 1.0,
+                 source=None, source_size: tuple[int, int] | None = None):
+        self.bgr = bgr
+        self.scale = scale
+        self._source = source
+        self._source_size = source_size
+        self._memo: dict[str, np.ndarray] = {}
+        self._scratch: dict[str, np.ndarray] = {}
+        if binary is not None:
+            self._memo["binary"] = binary
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.bgr.shape[:2]
+
+    @property
+    def gray(self) -> np.ndarray:
+        g = self._memo.get("gray")
+        if g is None:
+            g = self.bgr if self.bgr.ndim == 2 else cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY)
+            self._memo["gray"] = g
+        return g
+
+    @property
+    def gray_blur(self) -> np.ndarray:
+        g = self._memo.get("gray_blur")
+        if g is None:
+            g = self._memo["gray_blur"] = cv2.GaussianBlur(self.gray, (3, 3), 0)
+        return g
+
+    # adaptive inverse threshold + opening; the contour engine's working binary
+    @property
+    def binary(self) -> np.ndarray:
+        b = self._memo.get("binary")
+        if b is None:
+            block = int(round(41 * self.scale)) | 1
+            b = cv2.adaptiveThreshold(self.gray_blur, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                      cv2.THRESH_BINARY_INV, block, 7)
+            b = self._memo["binary"] = cv2.morphologyEx(b, cv2.MORPH_OPEN, _KERNEL3, dst=b, iterations=1)
+        return b
+
+    # global Otsu inverse threshold; used by the YOLO arrow parser
+    @property
+    def otsu_inv(self) -> np.ndarray:
+        b = self._memo.get("otsu_inv")
+        if b is None:
+            _, b = cv2.threshold(self.gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+            self._memo["otsu_inv"] = b
+        return b
+
+    def gray_crop(self, x1: int, y1: int, x2: int, y2: int) -> np.ndarray:
+        return self.gray[y1:y2, x1:x2]  # view, no copy
+
+    @property
+    def source_gray(self) -> np.ndarray:
+        g = self._memo.get("source_gray")
+        if g is None:
+            src = self._source() if callable(self._source) else self._source
+            if src is None:
+                g = self.gray
+            else:
+                g = src if src.ndim == 2 else cv2.cvtColor(src, cv2.COLOR_BGR2GRAY)
+            self._memo["source_gray"] = g
+        return g
+
+    # working-image box -> the same region in source pixels, rounded outwards
+    def to_source(self, x1, y1, x2, y2) -> tuple[int, int, int, int]:
+        if self._source is None:
+            return int(x1), int(y1), int(x2), int(y2)
+        (h, w), (sh, sw) = self.shape, self.source_gray.shape[:2]
+        fx, fy = sw / w, sh / h
+        return (max(0, int(x1 * fx)), max(0, int(y1 * fy)),
+                min(sw, math.ceil(x2 * fx)), min(sh, math.ceil(y2 * fy)))
+
+    # text crop for OCR, read from the source image
+    def source_crop(self, x1: int, y1: int, x2: int, y2: int) -> np.ndarray:
+        x1, y1, x2, y2 = self.to_source(x1, y1, x2, y2)
+        return self.source_gray[y1:y2, x1:x2]
+
+    # the coordinate space of everything detected on this context, for response meta
+    def coords(self) -> dict:
+        h, w = self.shape
+        sw, sh = self._source_size or (w, h)
+        return {"space": "detection", "scale": round(max(h, w) / max(sh, sw), 6), "width": w, "height": h}
+
+    def scratch(self, name: str, like: np.ndarray) -> np.ndarray:
+        buf = self._scratch.get(name)
+        if buf is None or buf.shape != like.shape or buf.dtype != like.dtype:
+            buf = self._scratch[name] = np.empty_like(like)
+        return buf
+
+    # `source` raster with every bbox (grown by pad) blanked and then closed; written into a reused
+    # buffer, so the result is only valid until the next call with the same source
+    def masked(self, source: str, bboxes, pad: int, close_iter: int = 2) -> np.ndarray:
+        src = getattr(self, source)
+        mask = self.scratch("masked:" + source, src)
+        np.copyto(mask, src)
+        h, w = mask.shape[:2]
+        for x1, y1, x2, y2 in bboxes:
+            x1 = max(0, int(x1) - pad); y1 = max(0, int(y1) - pad)
+            x2 = min(w - 1, int(x2) + pad); y2 = min(h - 1, int(y2) + pad)
+            mask[y1:y2 + 1, x1:x2 + 1] = 0
+        if close_iter:
+            cv2.morphologyEx(mask, cv2.MORPH_CLOSE, _KERNEL3, dst=mask, iterations=close_iter)
+        return mask
@@ -0,0 +1,240 @@
+from __future__ import annotations
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from core.settings import settings
+
+JOB_KINDS = ("parse", "evaluate")
+_MAX_ATTEMPTS = 3
+_JOB_FIELDS = ("id", "kind", "status", "params", "total", "done", "attempts", "error", "created", "started",
+               "finished", "expires")
+
+class QueueFull(RuntimeError):
+    pass
+
+# sqlite-backed job queue shared by every process pointing at the same file; uploads are stored
+# with the job so queued work survives restarts, results are kept until `expires`
+class JobStore:
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.execute("CREATE TABLE IF NOT EXISTS jobs ("
+                         "id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, params TEXT NOT NULL, "
+                         "total INTEGER NOT NULL, done INTEGER NOT NULL DEFAULT 0, attempts INTEGER NOT NULL DEFAULT 0, "
+                         "worker TEXT, error TEXT, result BLOB, created REAL NOT NULL, started REAL, "
+                         "updated REAL NOT NULL, finished REAL, expires REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs(status, created)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS job_files ("
+                         "job_id TEXT NOT NULL, idx INTEGER NOT NULL, name TEXT NOT NULL, data BLOB, "
+                         "error TEXT, PRIMARY KEY (job_id, idx))")
+
+    # files: (name, bytes) or (name, error string) for uploads rejected up front
+    def submit(self, kind: str, params: dict, files: list[tuple[str, bytes | str]]) -> dict:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._begin()
+            try:
+                queued = self._db.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+                if settings.JOBS_MAX_QUEUED and queued >= settings.JOBS_MAX_QUEUED:
+                    raise QueueFull(f"{queued} jobs pending, limit is {settings.JOBS_MAX_QUEUED}.")
+                self._db.execute("INSERT INTO jobs(id, kind, status, params, total, created, updated) "
+                                 "VALUES (?,?,?,?,?,?,?)", (job_id, kind, "queued", json.dumps(params), len(files), now, now))
+                self._db.executemany(
+                    "INSERT INTO job_files VALUES (?,?,?,?,?)",
+                    [(job_id, i, name, None if isinstance(d, str) else d, d if isinstance(d, str) else None)
+                     for i, (name, d) in enumerate(files)])
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return self.get(job_id)
+
+    # oldest queued job -> running, in one write transaction, so concurrent processes never share a job
+    def claim(self, worker: str) -> dict | None:
+        now = time.time()
+        with self._lock:
+            self._begin()
+            try:
+                row = self._db.execute("SELECT id FROM jobs WHERE status='queued' ORDER BY created LIMIT 1").fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE jobs SET status='running', worker=?, attempts=attempts+1, started=?, "
+                                     "updated=? WHERE id=?", (worker, now, now, row[0]))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return self.get(row[0]) if row else None
+
+    def files(self, job_id: str) -> list[tuple[str, bytes | str]]:
+        with self._lock:
+            rows = self._db.execute("SELECT name, data, error FROM job_files WHERE job_id=? ORDER BY idx",
+                                    (job_id,)).fetchall()
+        return [(name, error if error is not None else bytes(data)) for name, data, error in rows]
+
+    def progress(self, job_id: str, done: int):
+        with self._lock:
+            self._db.execute("UPDATE jobs SET done=?, updated=? WHERE id=? AND status='running'",
+                             (done, time.time(), job_id))
+
+    def finish(self, job_id: str, result: dict | None = None, error: str = ""):
+        now = time.time()
+        blob = None if result is None else json.dumps(result, ensure_ascii=False).encode("utf-8")
+        with self._lock:
+            self._db.execute("UPDATE jobs SET status=?, result=?, error=?, done=CASE WHEN ? THEN done ELSE total END, "
+                             "finished=?, updated=?, expires=? WHERE id=?",
+                             ("failed" if error else "done", blob, error or None, bool(error), now, now,
+                              now + settings.JOBS_TTL_S, job_id))
+            self._db.execute("DELETE FROM job_files WHERE job_id=?", (job_id,))
+
+    # back to the queue (shutdown before it finished); given up after _MAX_ATTEMPTS claims
+    def release(self, job_id: str):
+        with self._lock:
+            self._db.execute("UPDATE jobs SET status='queued', worker=NULL, done=0, updated=? "
+                             "WHERE id=? AND status='running'", (time.time(), job_id))
+        self._give_up()
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._db.execute("SELECT " + ", ".join(_JOB_FIELDS) + " FROM jobs WHERE id=?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(_JOB_FIELDS, row))
+        if job["expires"] is not None and job["expires"] <= time.time():
+            return None
+        job["params"] = json.loads(job["params"])
+        return job
+
+    def result(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._db.execute("SELECT result FROM jobs WHERE id=? AND status='done' AND expires > ?",
+                                   (job_id, time.time())).fetchone()
+        return json.loads(row[0]) if row and row[0] is not None else None
+
+    # expired results are deleted; running jobs without a heartbeat (a killed process) are requeued
+    def sweep(self):
+        now = time.time()
+        with self._lock:
+            self._db.execute("DELETE FROM jobs WHERE expires IS NOT NULL AND expires <= ?", (now,))
+            self._db.execute("UPDATE jobs SET status='queued', worker=NULL, done=0, updated=? "
+                             "WHERE status='running' AND updated < ?", (now, now - settings.JOBS_STALE_S))
+        self._give_up()
+
+    def counts(self) -> dict[str, int]:
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _give_up(self):
+        now = time.time()
+        with self._lock:
+            self._db.execute("UPDATE jobs SET status='failed', error=?, finished=?, updated=?, expires=? "
+                             "WHERE status='queued' AND attempts >= ?",
+                             (f"Gave up after {_MAX_ATTEMPTS} attempts.", now, now, now + settings.JOBS_TTL_S,
+                              _MAX_ATTEMPTS))
+            self._db.execute("DELETE FROM job_files WHERE job_id IN (SELECT id FROM jobs WHERE status='failed')")
+
+    def _begin(self):
+        self._db.execute("BEGIN IMMEDIATE")
+
+# JOBS_WORKERS asyncio tasks draining the store; the CPU work itself goes through the parse executor.
+# Store calls move upload blobs and wait on other processes' write locks, so they run in threads.
+# handlers[kind](job, files, progress) -> result dict
+class JobRunner:
+    def __init__(self, handlers: dict):
+        self.handlers = handlers
+        self.store: JobStore | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._wake: asyncio.Event | None = None
+        self._stopping = False
+
+    def start(self):
+        if self._tasks or settings.JOBS_WORKERS <= 0:
+            return
+        self.store = self.store or JobStore(settings.JOBS_PATH)
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self.store.sweep()
+        self._tasks = [asyncio.ensure_future(self._work(i)) for i in range(settings.JOBS_WORKERS)]
+
+    async def submit(self, kind: str, params: dict, files) -> dict:
+        if self.store is None:
+            self.store = JobStore(settings.JOBS_PATH)
+        job = await asyncio.to_thread(self.store.submit, kind, params, files)
+        if self._wake is not None:
+            self._wake.set()
+        return job
+
+    # no new claims; jobs in flight get JOBS_DRAIN_TIMEOUT_S to finish, then go back to the queue
+    async def stop(self):
+        if not self._tasks:
+            return
+        self._stopping = True
+        self._wake.set()
+        _, pending = await asyncio.wait(self._tasks, timeout=settings.JOBS_DRAIN_TIMEOUT_S)
+        for t in pending:
+            t.cancel()
+        if pending:
+            await asyncio.wait(pending)
+        self._tasks = []
+        self.store.close()
+        self.store = None
+
+    async def _work(self, n: int):
+        worker = f"pid{os.getpid()}/{n}"
+        last_sweep = time.monotonic()
+        while not self._stopping:
+            if time.monotonic() - last_sweep > settings.JOBS_POLL_S * 30:
+                await asyncio.to_thread(self.store.sweep)
+                last_sweep = time.monotonic()
+            job = await asyncio.to_thread(self.store.claim, worker)
+            if job is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=settings.JOBS_POLL_S)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job: dict):
+        job_id = job["id"]
+        done = 0
+
+        def progress(n: int):
+            nonlocal done
+            done = n
+
+        # writes progress and keeps `updated` fresh while the job runs, so sweep() in any process only
+        # requeues jobs whose runner is gone
+        async def heartbeat():
+            while True:
+                await asyncio.sleep(settings.JOBS_POLL_S)
+                await asyncio.to_thread(self.store.progress, job_id, done)
+
+        beat = asyncio.ensure_future(heartbeat())
+        try:
+            try:
+                files = await asyncio.to_thread(self.store.files, job_id)
+                result = await self.handlers[job["kind"]](job, files, progress)
+            finally:
+                beat.cancel()
+        except asyncio.CancelledError:
+            self.store.release(job_id)
+            raise
+        except Exception as e:
+            await asyncio.to_thread(self.store.finish, job_id, error=f"{type(e).__name__}: {e}")
+        else:
+            await asyncio.to_thread(self.store.finish, job_id, result)
@@ -1,74 +1,312 @@
 from __future__ import annotations
+import asyncio
+import copy
+import hashlib
 import json
-import requests
+import random
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+import httpx
+
 from core.settings import settings
 
 class LLMError(RuntimeError):
     pass
 
-def llm_refine_steps(raw: dict) -> dict | None:
-    if not settings.LLM_ENABLED:
-        return None
-    if not settings.LLM_API_KEY:
-        raise LLMError("LLM_ENABLED=true but LLM_API_KEY is empty.")
+_SYSTEM_PROMPT = (
+    "Ты помощник, который превращает распознанную диаграмму процесса в аккуратный список шагов.\n"
+    "Очисти OCR-мусор, нормализуй формулировки, убери дубликаты.\n"
+    "Верни JSON строго в формате:\n"
+    "{\n"
+    '  \"steps\": [{\"action\": \"...\", \"role\": \"\"}],\n'
+    '  \"notes\": \"кратко: что было исправлено\"\n'
+    "}\n"
+    "Роль оставляй пустой строкой, если её нельзя уверенно определить.\n"
+)
 
-    url = settings.LLM_BASE_URL.rstrip("/") + "/chat/completions"
-    headers = {"Authorization": f"Bearer {settings.LLM_API_KEY}", "Content-Type": "application/json"}
+_RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
 
+_BATCH_PROMPT = (
+    "Ты помощник, который превращает распознанные диаграммы процессов в аккуратные списки шагов.\n"
+    "На входе JSON-объект {\"<id>\": диаграмма}. Для каждой диаграммы очисти OCR-мусор, "
+    "нормализуй формулировки, убери дубликаты.\n"
+    "Верни JSON строго в формате:\n"
+    "{\"results\": {\"<id>\": {\"steps\": [{\"action\": \"...\", \"role\": \"\"}], \"notes\": \"...\"}}}\n"
+    "Сохрани все id из входа. Роль оставляй пустой строкой, если её нельзя уверенно определить.\n"
+)
+
+_DIAGRAM_LEGEND = (
+    "Формат диаграммы: nodes = [id, kind, label, role], edges = [source, target], "
+    "order = id узлов в порядке обхода, draft = текущие шаги [action, role].\n"
+)
+
+# only what the model needs: labels, traversal order and roles; bbox/center/pseudocode are dropped
+def compact_diagram(raw: dict) -> dict:
     graph = raw.get("graph", {})
-    algo = raw.get("algorithm", {})
-    output = raw.get("output", {})
+    lanes = (raw.get("extras") or {}).get("swimlanes") or []
+    nodes = []
+    for n in graph.get("nodes", [])[:60]:
+        cy = (n.get("center") or [0, 0])[1]
+        role = next((l.get("name") or "" for l in lanes if l["y_top"] <= cy <= l["y_bottom"]), "")
+        nodes.append([n["id"], n.get("kind", ""), n.get("label", ""), role])
+    return {
+        "nodes": nodes,
+        "edges": [[e["source"], e["target"]] for e in graph.get("edges", [])[:120]],
+        "order": [s["id"] for s in (raw.get("algorithm") or {}).get("steps", []) if "id" in s],
+        "draft": [[s.get("action", ""), s.get("role", "")]
+                  for s in ((raw.get("output") or {}).get("bpmn") or {}).get("steps", [])],
+    }
 
-    payload = {
+def _compact_json(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+def build_payload(raw: dict) -> dict:
+    return {
         "model": settings.LLM_MODEL,
         "temperature": 0.2,
         "response_format": {"type": "json_object"},
         "messages": [
-            {
-                "role": "system",
-                "content": (
-                    "Ты помощник, который превращает распознанную диаграмму процесса в аккуратный список шагов.\n"
-                    "Очисти OCR-мусор, нормализуй формулировки, убери дубликаты.\n"
-                    "Верни JSON строго в формате:\n"
-                    "{\n"
-                    '  \"steps\": [{\"action\": \"...\", \"role\": \"\"}],\n'
-                    '  \"notes\": \"кратко: что было исправлено\"\n'
-                    "}\n"
-                    "Роль оставляй пустой строкой, если её нельзя уверенно определить.\n"
-                ),
-            },
+            {"role": "system", "content": _SYSTEM_PROMPT},
             {
                 "role": "user",
                 "content": (
-                    "Вот результат CV/OCR распознавания. На его основе верни очищенный список шагов.\n\n"
-                    f"graph.nodes (первые 60): {json.dumps(graph.get('nodes', [])[:60], ensure_ascii=False)}\n"
-                    f"graph.edges (первые 120): {json.dumps(graph.get('edges', [])[:120], ensure_ascii=False)}\n"
-                    f"algorithm: {json.dumps(algo, ensure_ascii=False)}\n"
-                    f"normalized_output_now: {json.dumps(output, ensure_ascii=False)}\n"
+                    "Вот результат CV/OCR распознавания. На его основе верни очищенный список шагов.\n"
+                    + _DIAGRAM_LEGEND + _compact_json(compact_diagram(raw))
                 ),
             },
         ],
     }
 
-    try:
-        r = requests.post(url, headers=headers, json=payload, timeout=settings.LLM_TIMEOUT_S)
-    except requests.RequestException as e:
-        raise LLMError(f"LLM request failed: {e}") from e
+def build_batch_payload(diagrams: dict[str, dict]) -> dict:
+    return {
+        "model": settings.LLM_MODEL,
+        "temperature": 0.2,
+        "response_format": {"type": "json_object"},
+        "messages": [
+            {"role": "system", "content": _BATCH_PROMPT},
+            {"role": "user", "content": _DIAGRAM_LEGEND + _compact_json(diagrams)},
+        ],
+    }
 
-    if r.status_code >= 400:
-        raise LLMError(f"LLM HTTP {r.status_code}: {r.text[:500]}")
+def payload_key(payload: dict) -> str:
+    blob = json.dumps([settings.LLM_BASE_URL, payload], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
 
-    data = r.json()
+def parse_response(data: dict) -> dict:
     try:
-        content = data["choices"][0]["message"]["content"]
-        obj = json.loads(content)
-        if "steps" not in obj or not isinstance(obj["steps"], list):
-            raise ValueError("bad schema")
-        for s in obj["steps"]:
-            if not isinstance(s, dict) or "action" not in s:
-                raise ValueError("bad step schema")
-            s.setdefault("role", "")
-        obj.setdefault("notes", "")
-        return obj
+        return _check_steps(json.loads(data["choices"][0]["message"]["content"]))
     except Exception as e:
         raise LLMError(f"Could not parse LLM response as JSON object: {e}. Raw: {data}") from e
+
+def parse_batch_response(data: dict, ids: list[str]) -> dict[str, dict | LLMError]:
+    try:
+        results = json.loads(data["choices"][0]["message"]["content"])["results"]
+        if not isinstance(results, dict):
+            raise ValueError("bad schema")
+    except Exception as e:
+        raise LLMError(f"Could not parse LLM batch response: {e}. Raw: {data}") from e
+    out = {}
+    for i in ids:
+        try:
+            out[i] = _check_steps(results[i])
+        except Exception as e:
+            out[i] = LLMError(f"LLM batch response has no valid entry for this file: {e!r}")
+    return out
+
+def _check_steps(obj) -> dict:
+    if not isinstance(obj, dict) or "steps" not in obj or not isinstance(obj["steps"], list):
+        raise ValueError("bad schema")
+    for s in obj["steps"]:
+        if not isinstance(s, dict) or "action" not in s:
+            raise ValueError("bad step schema")
+        s.setdefault("role", "")
+    obj.setdefault("notes", "")
+    return obj
+
+# one pooled keep-alive httpx client and concurrency gate per event loop; parsed responses
+# are cached process-wide by payload hash
+class LLMClient:
+    def __init__(self, transport: httpx.AsyncBaseTransport | None = None):
+        self.transport = transport  # tests plug in httpx.ASGITransport(app=fake_server)
+        self._loops: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._cache: OrderedDict[str, dict] = OrderedDict()
+        self._stats = {"calls": 0, "cache_hits": 0, "retries": 0, "errors": 0}
+
+    def _state(self) -> tuple[httpx.AsyncClient, asyncio.Semaphore, dict]:
+        loop = asyncio.get_running_loop()
+        st = self._loops.get(loop)
+        if st is None or st[0].is_closed:
+            n = max(1, settings.LLM_MAX_CONCURRENCY)
+            client = httpx.AsyncClient(
+                transport=self.transport,
+                limits=httpx.Limits(max_connections=n, max_keepalive_connections=n, keepalive_expiry=60.0),
+                timeout=httpx.Timeout(settings.LLM_TIMEOUT_S, connect=min(5.0, settings.LLM_TIMEOUT_S)),
+            )
+            st = (client, asyncio.Semaphore(n), {})  # last: in-flight requests by payload key
+            self._loops[loop] = st
+        return st
+
+    async def refine_steps(self, raw: dict) -> dict | None:
+        if not settings.LLM_ENABLED:
+            return None
+        if not settings.LLM_API_KEY:
+            raise LLMError("LLM_ENABLED=true but LLM_API_KEY is empty.")
+        payload = build_payload(raw)
+        key = payload_key(payload)
+        hit = self._cache_get(key)
+        if hit is not None:
+            return hit
+        # identical concurrent prompts share one round-trip
+        pending = self._state()[2]
+        fut = pending.get(key)
+        if fut is None:
+            fut = pending[key] = asyncio.ensure_future(self._fetch(key, payload))
+            fut.add_done_callback(lambda _f: pending.pop(key, None))
+        return copy.deepcopy(await asyncio.shield(fut))
+
+    # one result per raw, in order: refined dict, None (LLM disabled) or the LLMError for that file
+    async def refine_many(self, raws: list[dict]) -> list[dict | LLMError | None]:
+        if not raws:
+            return []
+        if settings.LLM_BATCH_MODE != "packed" or not settings.LLM_ENABLED or not settings.LLM_API_KEY:
+            return list(await asyncio.gather(*[self.refine_steps(r) for r in raws], return_exceptions=True))
+
+        out: list = [None] * len(raws)
+        todo = []
+        for i, r in enumerate(raws):
+            key = payload_key(build_payload(r))
+            hit = self._cache_get(key)
+            if hit is not None:
+                out[i] = hit
+            else:
+                todo.append((i, key, compact_diagram(r)))
+        size = max(1, settings.LLM_BATCH_SIZE)
+        chunks = [todo[k:k + size] for k in range(0, len(todo), size)]
+        for chunk, res in zip(chunks, await asyncio.gather(*[self._refine_packed(c) for c in chunks])):
+            for (i, _key, _d), obj in zip(chunk, res):
+                out[i] = obj
+        # entries the packed answer dropped or mangled get one individual retry
+        retry = [i for i, obj in enumerate(out) if isinstance(obj, LLMError) and getattr(obj, "partial", False)]
+        for i, obj in zip(retry, await asyncio.gather(*[self.refine_steps(raws[i]) for i in retry],
+                                                      return_exceptions=True)):
+            out[i] = obj
+        return out
+
+    async def _refine_packed(self, chunk: list[tuple[int, str, dict]]) -> list[dict | LLMError]:
+        ids = [f"d{n}" for n in range(len(chunk))]
+        try:
+            data = await self._post(build_batch_payload({i: d for i, (_, _, d) in zip(ids, chunk)}))
+            parsed = parse_batch_response(data, ids)
+        except LLMError as e:
+            return [e] * len(chunk)
+        res = []
+        for i, (_, key, _) in zip(ids, chunk):
+            obj = parsed[i]
+            if isinstance(obj, LLMError):
+                obj.partial = True
+            else:
+                self._cache_put(key, obj)
+                obj = copy.deepcopy(obj)
+            res.append(obj)
+        return res
+
+    async def _fetch(self, key: str, payload: dict) -> dict:
+        obj = parse_response(await self._post(payload))
+        self._cache_put(key, obj)
+        return obj
+
+    async def _post(self, payload: dict) -> dict:
+        url = settings.LLM_BASE_URL.rstrip("/") + "/chat/completions"
+        headers = {"Authorization": f"Bearer {settings.LLM_API_KEY}", "Content-Type": "application/json"}
+        client, sem, _ = self._state()
+        stop_at = time.monotonic() + settings.LLM_RETRY_BUDGET_S
+        attempt = 0
+        with self._lock:
+            self._stats["calls"] += 1
+        while True:
+            remaining = stop_at - time.monotonic()
+            try:
+                async with sem:
+                    r = await client.post(url, headers=headers, json=payload,
+                                          timeout=max(0.1, min(settings.LLM_TIMEOUT_S, remaining)))
+                if r.status_code < 400:
+                    return r.json()
+                err = LLMError(f"LLM HTTP {r.status_code}: {r.text[:500]}")
+                retryable = r.status_code in _RETRY_STATUS
+                retry_after = _retry_after(r)
+            except httpx.HTTPError as e:
+                err = LLMError(f"LLM request failed: {e!r}")
+                retryable, retry_after = True, None
+            except ValueError as e:
+                err = LLMError(f"LLM returned invalid JSON: {e}")
+                retryable, retry_after = False, None
+
+            delay = retry_after if retry_after is not None else \
+                settings.LLM_RETRY_BACKOFF_S * (2 ** attempt) * (0.5 + random.random())
+            if not retryable or attempt >= settings.LLM_RETRIES or time.monotonic() + delay >= stop_at:
+                with self._lock:
+                    self._stats["errors"] += 1
+                raise err
+            attempt += 1
+            with self._lock:
+                self._stats["retries"] += 1
+            await asyncio.sleep(delay)
+
+    def _cache_get(self, key: str) -> dict | None:
+        with self._lock:
+            obj = self._cache.get(key)
+            if obj is None:
+                return None
+            self._cache.move_to_end(key)
+            self._stats["cache_hits"] += 1
+            return copy.deepcopy(obj)
+
+    def _cache_put(self, key: str, obj: dict):
+        if settings.LLM_CACHE_SIZE <= 0:
+            return
+        with self._lock:
+            self._cache[key] = copy.deepcopy(obj)
+            self._cache.move_to_end(key)
+            while len(self._cache) > settings.LLM_CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "cached": len(self._cache)}
+
+    async def aclose(self):
+        loop = asyncio.get_running_loop()
+        st = self._loops.pop(loop, None)
+        if st is not None:
+            await st[0].aclose()
+
+def _retry_after(r: httpx.Response) -> float | None:
+    try:
+        return max(0.0, float(r.headers["retry-after"]))
+    except (KeyError, ValueError):
+        return None
+
+llm_client = LLMClient()
+
+async def allm_refine_steps(raw: dict) -> dict | None:
+    return await llm_client.refine_steps(raw)
+
+async def allm_refine_many(raws: list[dict]) -> list[dict | LLMError | None]:
+    return await llm_client.refine_many(raws)
+
+# blocking entry point for scripts; handlers must use allm_refine_steps
+def llm_refine_steps(raw: dict) -> dict | None:
+    async def _run():
+        try:
+            return await llm_client.refine_steps(raw)
+        finally:
+            await llm_client.aclose()
+    return asyncio.run(_run())
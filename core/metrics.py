@@ -0,0 +1,111 @@
+from __future__ import annotations
+import bisect
+import threading
+
+_TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0)
+_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 40, 60, 100, 200, 500)
+
+class _Metric:
+    def __init__(self, name: str, help: str, kind: str):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self._lock = threading.Lock()
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help, "counter")
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, n: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + n
+
+    def render(self) -> list[str]:
+        with self._lock:
+            return self.header() + [f"{self.name}{_labels(k)} {_num(v)}" for k, v in self._values.items()]
+
+class Histogram(_Metric):
+    def __init__(self, name: str, help: str, buckets=_TIME_BUCKETS):
+        super().__init__(name, help, "histogram")
+        self.buckets = tuple(buckets)
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            st = self._values.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0])
+            st[0][bisect.bisect_left(self.buckets, value)] += 1
+            st[1] += value
+
+    def render(self) -> list[str]:
+        out = self.header()
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                acc = 0
+                for b, c in zip(self.buckets, counts):
+                    acc += c
+                    out.append(f"{self.name}_bucket{_labels(key + (('le', _num(b)),))} {acc}")
+                acc += counts[-1]
+                out.append(f"{self.name}_bucket{_labels(key + (('le', '+Inf'),))} {acc}")
+                out.append(f"{self.name}_sum{_labels(key)} {_num(total)}")
+                out.append(f"{self.name}_count{_labels(key)} {acc}")
+        return out
+
+def _labels(key: tuple) -> str:
+    if not key:
+        return ""
+    parts = []
+    for k, v in key:
+        v = str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{k}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+def _num(v: float) -> str:
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+parse_requests = Counter("diagram_parse_requests_total", "Parse requests by engine and outcome.")
+parse_duration = Histogram("diagram_parse_duration_seconds", "End-to-end engine time per parsed image.")
+stage_duration = Histogram("diagram_stage_duration_seconds", "Duration of individual pipeline stages.")
+stage_events = Counter("diagram_stage_events_total", "Per-stage event counters reported by the pipeline.")
+graph_nodes = Histogram("diagram_graph_nodes", "Nodes per parsed diagram.", _COUNT_BUCKETS)
+graph_edges = Histogram("diagram_graph_edges", "Edges per parsed diagram.", _COUNT_BUCKETS)
+llm_duration = Histogram("diagram_llm_duration_seconds", "LLM refinement round-trip time.")
+llm_requests = Counter("diagram_llm_requests_total", "LLM refinement calls by outcome.")
+
+_ALL = [parse_requests, parse_duration, stage_duration, stage_events, graph_nodes, graph_edges,
+        llm_duration, llm_requests]
+
+def observe_parse(engine: str, raw: dict | None, cache: str = "miss", error: bool = False):
+    if error or raw is None:
+        parse_requests.inc(engine=engine, outcome="error")
+        return
+    meta = raw.get("meta", {})
+    if cache != "miss":
+        parse_requests.inc(engine=engine, outcome="cached")
+        return
+    parse_requests.inc(engine=engine, outcome="truncated" if meta.get("truncated") else "ok")
+    timings = meta.get("timings") or {}
+    for name, ms in timings.items():
+        if name == "total":
+            parse_duration.observe(ms / 1000.0, engine=engine)
+        else:
+            stage_duration.observe(ms / 1000.0, engine=engine, stage=name)
+    for name, n in (meta.get("counters") or {}).items():
+        stage_events.inc(n, engine=engine, event=name)
+    graph = raw.get("graph") or {}
+    graph_nodes.observe(len(graph.get("nodes") or []), engine=engine)
+    graph_edges.observe(len(graph.get("edges") or []), engine=engine)
+
+# extra: (name, kind, help, value) samples read from other components at scrape time
+def render(extra: list[tuple[str, str, str, float]] | None = None) -> str:
+    lines = []
+    for m in _ALL:
+        lines.extend(m.render())
+    for name, kind, help, value in extra or []:
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {_num(value)}"]
+    return "\n".join(lines) + "\n"
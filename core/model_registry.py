@@ -0,0 +1,154 @@
+from __future__ import annotations
+import os
+import threading
+import time
+
+import numpy as np
+
+from core.settings import settings
+from core.deadline import Deadline, DeadlineExceeded, call_timeout
+
+class YOLOUnavailable(RuntimeError):
+    pass
+
+class _Entry:
+    def __init__(self, path: str, mtime: float, model):
+        self.path = path
+        self.mtime = mtime
+        self.model = model
+        self.loaded_at = time.time()
+        self.warm = False
+        self.lock = threading.Lock()
+        self.deadline: Deadline | None = None
+        if hasattr(model, "add_callback"):
+            model.add_callback("on_predict_batch_start", self._check_deadline)
+            model.add_callback("on_predict_postprocess_end", self._check_deadline)
+
+    def _check_deadline(self, _predictor):
+        if self.deadline is not None:
+            self.deadline.check("yolo_predict")
+
+class ModelRegistry:
+    """Process-wide cache of YOLO models keyed by weights path and mtime."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: dict[str, _Entry] = {}
+        self._active = settings.YOLO_WEIGHTS
+        self._error = ""
+
+    @property
+    def active_path(self) -> str:
+        return os.path.abspath(self._active)
+
+    def set_active(self, path: str):
+        with self._lock:
+            self._active = os.path.abspath(path)
+
+    def get(self, path: str | None = None) -> _Entry:
+        path = os.path.abspath(path or self._active)
+        mtime = _mtime(path)
+        with self._lock:
+            ent = self._entries.get(path)
+            if ent is not None and ent.mtime == mtime:
+                return ent
+            try:
+                ent = _Entry(path, mtime, _load_yolo(path))
+            except Exception as e:
+                self._error = str(e)
+                raise
+            self._entries[path] = ent
+            self._error = ""
+            return ent
+
+    # one image -> its results list; a list of images -> one batched forward pass, one result each
+    def predict(self, img, path: str | None = None, deadline: Deadline | None = None):
+        ent = self.get(path)
+        # waiting for a model busy with another request counts against the deadline too
+        if not ent.lock.acquire(timeout=call_timeout(deadline) or -1):
+            raise DeadlineExceeded("yolo_predict")
+        try:
+            ent.deadline = deadline
+            res = ent.model.predict(source=img, verbose=False)
+            ent.warm = True
+        finally:
+            ent.deadline = None
+            ent.lock.release()
+        return res
+
+    def warmup(self, path: str | None = None) -> _Entry:
+        ent = self.get(path)
+        if not ent.warm:
+            size = settings.YOLO_WARMUP_SIZE
+            self.predict(np.zeros((size, size, 3), dtype=np.uint8), path=ent.path)
+        return ent
+
+    def try_warmup(self) -> bool:
+        if not settings.YOLO_WARMUP or not os.path.isfile(self.active_path):
+            return False
+        try:
+            self.warmup()
+        except Exception:
+            return False  # error is reported by status()
+        return True
+
+    def reload(self, path: str | None = None) -> _Entry:
+        path = os.path.abspath(path or self._active)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Weights not found: {path}")
+        with self._lock:
+            self._entries.pop(path, None)
+        ent = self.warmup(path)
+        with self._lock:
+            self._active = path
+            for p in [p for p in self._entries if p != path]:
+                self._entries.pop(p)
+        return ent
+
+    def status(self) -> dict:
+        path = self.active_path
+        ent = self._entries.get(path)
+        return {
+            "path": path,
+            "exists": os.path.isfile(path),
+            "loaded": ent is not None,
+            "warm": bool(ent and ent.warm),
+            "ready": bool(ent and ent.warm and ent.mtime == _mtime(path)),
+            "mtime": ent.mtime if ent else None,
+            "loaded_at": ent.loaded_at if ent else None,
+            "backend": backend(),
+            "error": self._error,
+        }
+
+def _mtime(path: str) -> float:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return 0.0
+
+def backend() -> str:
+    name = (settings.YOLO_BACKEND or "torch").lower().strip()
+    if name not in ("torch", "onnx"):
+        raise ValueError(f"Unknown YOLO_BACKEND: {name}")
+    return name
+
+def _load_yolo(path: str):
+    if not os.path.isfile(path):
+        raise YOLOUnavailable(f"YOLO weights not found: {path}")
+    if backend() == "onnx":
+        return _load_onnx(path)
+    try:
+        from ultralytics import YOLO
+    except Exception as e:
+        raise YOLOUnavailable("ultralytics is not installed. Install: pip install -r requirements-yolo.txt") from e
+    return YOLO(path)
+
+# exporting .pt weights needs ultralytics once; a cached or given .onnx file only needs onnxruntime
+def _load_onnx(path: str):
+    from core.yolo_onnx import OnnxYOLO, OnnxUnavailable, onnx_weights
+    try:
+        return OnnxYOLO(onnx_weights(path))
+    except (OnnxUnavailable, ImportError) as e:
+        raise YOLOUnavailable(str(e)) from e
+
+yolo_registry = ModelRegistry()
@@ -1,48 +1,210 @@
 from __future__ import annotations
-import os
 import cv2
-from PIL import Image
-import pytesseract
+import numpy as np
 from rapidfuzz import fuzz
 
-def ocr_nodes(img_bgr, nodes):
-    lang = os.environ.get("TESS_LANG", "eng+rus")
-
-    for n in nodes:
-        x1, y1, x2, y2 = n["bbox"]
-        pad = 6
-        x1 = max(0, x1 + pad); y1 = max(0, y1 + pad)
-        x2 = min(img_bgr.shape[1], x2 - pad); y2 = min(img_bgr.shape[0], y2 - pad)
-
-        crop = img_bgr[y1:y2, x1:x2]
-        if crop.size == 0:
-            n["label"] = ""
-            continue
-
-        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
-        gray = cv2.resize(gray, None, fx=2.2, fy=2.2, interpolation=cv2.INTER_CUBIC)
-        gray = cv2.GaussianBlur(gray, (3, 3), 0)
-        thr = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                                    cv2.THRESH_BINARY, 31, 3)
-
-        pil = Image.fromarray(thr)
-        try:
-            txt = pytesseract.image_to_string(pil, lang=lang, config="--psm 6")
-        except pytesseract.TesseractNotFoundError as e:
-            raise RuntimeError("Tesseract not found. Install via: brew install tesseract tesseract-lang") from e
-
-        txt = _clean(txt)
-        n["label"] = txt
-
-        if n["kind"] == "ellipse":
-            low = txt.lower()
-            if fuzz.partial_ratio(low, "start") > 80 or fuzz.partial_ratio(low, "нач") > 80:
-                n["semantic"] = "start"
-            elif fuzz.partial_ratio(low, "end") > 80 or fuzz.partial_ratio(low, "кон") > 80:
-                n["semantic"] = "end"
+from core.settings import settings
+from core.ocr_backend import default_lang, image_to_words
+from core.ocr_cache import ocr_cache, crop_key, cached_image_to_string
+from core.deadline import Deadline, DeadlineExceeded, call_timeout
+from core.image_context import ImageContext
 
+_UPSCALE = 2.2  # page mode fallback when no glyphs can be measured
+_GLYPH_TARGET_H = 20.0  # px, median component height (~x-height); Tesseract reads best at ~20-30 px
+_MIN_SCALE, _MAX_SCALE = 0.5, 4.0
+_MIN_CONTRAST = 40
+_PAD = 6
+_MOSAIC_GAP = 40
+_MOSAIC_MAX_H = 8000
+_PAGE_MAX_PIXELS = 36_000_000  # page mode: rescaled page limit, larger pages are read as a mosaic
+
+def ocr_nodes(img_bgr, nodes, deadline: Deadline | None = None, ctx: ImageContext | None = None):
+    ctx = ctx or ImageContext(img_bgr)
+    lang = default_lang()
+    mode = (settings.OCR_MODE or "node").lower().strip()
+    if mode not in ("node", "api", "page", "mosaic"):
+        raise ValueError(f"Unknown OCR_MODE: {mode}")
+
+    # labels recognised before the deadline are kept, the rest stay empty
+    texts = [""] * len(nodes)
+    try:
+        if mode == "page":
+            _ocr_page(ctx, nodes, lang, texts, deadline)
+        elif mode == "mosaic":
+            _ocr_mosaic(ctx, nodes, lang, texts, deadline)
+        else:
+            backend = "tesserocr" if mode == "api" else None
+            for i, n in enumerate(nodes):
+                if deadline is not None:
+                    deadline.check("ocr_nodes")
+                thr = _prep_crop(ctx, n["bbox"])
+                if thr is not None:
+                    texts[i] = cached_image_to_string(thr, lang, psm=6, backend=backend,
+                                                      timeout=call_timeout(deadline))
+    except DeadlineExceeded:
+        raise
+    except TimeoutError as e:
+        raise DeadlineExceeded("ocr_nodes") from e
+    finally:
+        for n, txt in zip(nodes, texts):
+            _apply_label(n, txt)
     return nodes
 
+def _apply_label(n: dict, txt: str):
+    txt = _clean(txt)
+    n["label"] = txt
+
+    if n["kind"] == "ellipse":
+        low = txt.lower()
+        if fuzz.partial_ratio(low, "start") > 80 or fuzz.partial_ratio(low, "нач") > 80:
+            n["semantic"] = "start"
+        elif fuzz.partial_ratio(low, "end") > 80 or fuzz.partial_ratio(low, "кон") > 80:
+            n["semantic"] = "end"
+
+def _crop_box(shape_hw, bbox):
+    x1, y1, x2, y2 = bbox
+    h, w = shape_hw
+    return max(0, x1 + _PAD), max(0, y1 + _PAD), min(w, x2 - _PAD), min(h, y2 - _PAD)
+
+# median height of glyph-sized connected components in an ink mask (nonzero = ink); 0 if none
+def glyph_height(ink) -> float:
+    n, _, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    if n <= 1:
+        return 0.0
+    st = stats[1:]
+    h, w = ink.shape[:2]
+    keep = ((st[:, cv2.CC_STAT_AREA] >= 4) & (st[:, cv2.CC_STAT_HEIGHT] >= 3)
+            & (st[:, cv2.CC_STAT_HEIGHT] < 0.8 * h) & (st[:, cv2.CC_STAT_WIDTH] < 0.8 * w))
+    return float(np.median(st[keep, cv2.CC_STAT_HEIGHT])) if keep.any() else 0.0
+
+# resize factor that brings the measured glyphs to the height Tesseract prefers; 0 = nothing to read
+def text_scale(ink) -> float:
+    gh = glyph_height(ink)
+    if gh <= 0:
+        return 0.0
+    scale = float(np.clip(_GLYPH_TARGET_H / gh, _MIN_SCALE, _MAX_SCALE))
+    return 1.0 if abs(scale - 1.0) < 0.05 else scale
+
+def rescale(img, scale: float):
+    if scale == 1.0:
+        return img
+    interp = cv2.INTER_CUBIC if scale > 1.0 else cv2.INTER_AREA
+    return cv2.resize(img, None, fx=scale, fy=scale, interpolation=interp)
+
+def _prep_crop(ctx: ImageContext, bbox):
+    gray = ctx.source_crop(*_crop_box(ctx.shape, bbox))
+    if gray.size == 0 or int(gray.max()) - int(gray.min()) < _MIN_CONTRAST:
+        return None  # blank crop: skip OCR
+    _, ink = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    scale = text_scale(ink)
+    if not scale:
+        return None
+
+    gray = cv2.GaussianBlur(rescale(gray, scale), (3, 3), 0)
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                 cv2.THRESH_BINARY, 31, 3)
+
+# one image_to_data call over the whole page; each word goes to the smallest node containing its center.
+# The page is rescaled as a whole (up to _MAX_SCALE), so when that copy would exceed _PAGE_MAX_PIXELS
+# the nodes are read from bounded per-node crops in mosaic mode instead
+def _ocr_page(ctx: ImageContext, nodes, lang, texts, deadline):
+    if not nodes:
+        return
+    page = ctx.source_gray
+    if page.size > _PAGE_MAX_PIXELS:
+        return _ocr_mosaic(ctx, nodes, lang, texts, deadline)
+    if page is ctx.gray:
+        ink = ctx.otsu_inv
+    else:
+        _, ink = cv2.threshold(page, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    scale = text_scale(ink) or _UPSCALE
+    if page.size * scale * scale > _PAGE_MAX_PIXELS:
+        return _ocr_mosaic(ctx, nodes, lang, texts, deadline)
+    gray = cv2.GaussianBlur(rescale(page, scale), (3, 3), 0)
+    thr = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 3)
+
+    boxes = np.array([ctx.to_source(*_crop_box(ctx.shape, n["bbox"])) for n in nodes], dtype=np.float64) * scale
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    per_node: list[list] = [[] for _ in nodes]
+    for word in image_to_words(thr, lang, psm=11, timeout=call_timeout(deadline)):
+        cx = word[0] + word[2] / 2.0
+        cy = word[1] + word[3] / 2.0
+        inside = (boxes[:, 0] <= cx) & (cx < boxes[:, 2]) & (boxes[:, 1] <= cy) & (cy < boxes[:, 3])
+        if inside.any():
+            idx = np.flatnonzero(inside)
+            per_node[int(idx[np.argmin(areas[idx])])].append(word)
+    texts[:] = [_words_to_text(ws) for ws in per_node]
+
+# node crops stacked into white-separated strips, one image_to_data call per strip
+def _ocr_mosaic(ctx: ImageContext, nodes, lang, texts, deadline):
+    crops = [(i, _prep_crop(ctx, n["bbox"])) for i, n in enumerate(nodes)]
+    crops = [(i, c) for i, c in crops if c is not None]
+
+    # cached labels stay out of the strips; the rest are stored per crop once recognised
+    keys = {}
+    if ocr_cache.max_entries > 0:
+        misses = []
+        for i, c in crops:
+            key = keys[i] = crop_key(c, lang, 6)
+            hit = ocr_cache.get(key)
+            if hit is None:
+                misses.append((i, c))
+            else:
+                texts[i] = hit
+        crops = misses
+
+    strip, strip_h = [], 0
+    for i, c in crops:
+        if strip and strip_h + c.shape[0] > _MOSAIC_MAX_H:
+            _ocr_strip(strip, texts, lang, deadline, keys)
+            strip, strip_h = [], 0
+        strip.append((i, c))
+        strip_h += c.shape[0] + _MOSAIC_GAP
+    if strip:
+        _ocr_strip(strip, texts, lang, deadline, keys)
+
+def _ocr_strip(strip, texts, lang, deadline, keys):
+    if deadline is not None:
+        deadline.check("ocr_nodes")
+    width = max(c.shape[1] for _, c in strip) + 2 * _MOSAIC_GAP
+    height = sum(c.shape[0] for _, c in strip) + _MOSAIC_GAP * (len(strip) + 1)
+    canvas = np.full((height, width), 255, dtype=np.uint8)
+
+    slots = []
+    y = _MOSAIC_GAP
+    for i, c in strip:
+        canvas[y:y + c.shape[0], _MOSAIC_GAP:_MOSAIC_GAP + c.shape[1]] = c
+        slots.append((i, y, y + c.shape[0]))
+        y += c.shape[0] + _MOSAIC_GAP
+
+    per_slot: dict[int, list] = {i: [] for i, _, _ in slots}
+    for word in image_to_words(canvas, lang, psm=6, timeout=call_timeout(deadline)):
+        cy = word[1] + word[3] / 2.0
+        for i, top, bottom in slots:
+            if top - _MOSAIC_GAP / 2 <= cy < bottom + _MOSAIC_GAP / 2:
+                per_slot[i].append(word)
+                break
+    for i, ws in per_slot.items():
+        texts[i] = _words_to_text(ws)
+        if i in keys:
+            ocr_cache.put(keys[i], texts[i])
+
+def _words_to_text(words) -> str:
+    if not words:
+        return ""
+    words = sorted(words, key=lambda w: w[1] + w[3] / 2.0)
+    line_h = float(np.median([w[3] for w in words]))
+    lines, cur, cur_y = [], [words[0]], words[0][1] + words[0][3] / 2.0
+    for w in words[1:]:
+        cy = w[1] + w[3] / 2.0
+        if abs(cy - cur_y) <= 0.5 * line_h:
+            cur.append(w)
+        else:
+            lines.append(cur)
+            cur, cur_y = [w], cy
+    lines.append(cur)
+    return "\n".join(" ".join(w[4] for w in sorted(line, key=lambda w: w[0])) for line in lines)
+
 def _clean(s: str) -> str:
     s = s.replace("\n", " ").replace("\r", " ").strip()
     s = " ".join(s.split())
@@ -0,0 +1,192 @@
+from __future__ import annotations
+import os
+import threading
+from contextlib import contextmanager
+
+from PIL import Image
+import pytesseract
+
+from core.settings import settings
+
+_NOT_FOUND = "Tesseract not found. Install via: brew install tesseract tesseract-lang"
+
+def default_lang() -> str:
+    return os.environ.get("TESS_LANG", "eng+rus")
+
+class PytesseractEngine:
+    name = "pytesseract"
+
+    def __init__(self, lang: str, psm: int):
+        self.lang = lang
+        self.config = f"--psm {psm}"
+
+    def image_to_string(self, img, timeout: float = 0) -> str:
+        return self._run(pytesseract.image_to_string, img, timeout)
+
+    def image_to_words(self, img, timeout: float = 0) -> list[tuple]:
+        d = self._run(pytesseract.image_to_data, img, timeout, output_type=pytesseract.Output.DICT)
+
+        words = []
+        for left, top, w, h, conf, text in zip(d["left"], d["top"], d["width"], d["height"], d["conf"], d["text"]):
+            text = (text or "").strip()
+            if text and float(conf) >= 0:
+                words.append((left, top, w, h, text))
+        return words
+
+    def _run(self, fn, img, timeout, **kwargs):
+        try:
+            # pytesseract kills the tesseract subprocess once the timeout elapses
+            return fn(_pil(img), lang=self.lang, config=self.config, timeout=timeout, **kwargs)
+        except pytesseract.TesseractNotFoundError as e:
+            raise RuntimeError(_NOT_FOUND) from e
+        except RuntimeError as e:
+            if "timeout" in str(e).lower():
+                raise TimeoutError("Tesseract process timeout") from e
+            raise
+
+    def close(self):
+        pass
+
+class TesserocrEngine:
+    name = "tesserocr"
+
+    def __init__(self, lang: str, psm: int):
+        import tesserocr
+        self._tesserocr = tesserocr
+        self.lang = lang
+        self.api = tesserocr.PyTessBaseAPI(lang=lang, psm=psm)
+
+    def image_to_string(self, img, timeout: float = 0) -> str:
+        self._recognize(img, timeout)
+        return self.api.GetUTF8Text()
+
+    def image_to_words(self, img, timeout: float = 0) -> list[tuple]:
+        tr = self._tesserocr
+        self._recognize(img, timeout)
+        words = []
+        level = tr.RIL.WORD
+        for r in tr.iterate_level(self.api.GetIterator(), level):
+            text = (r.GetUTF8Text(level) or "").strip()
+            box = r.BoundingBox(level)
+            if text and box and r.Confidence(level) >= 0:
+                x1, y1, x2, y2 = box
+                words.append((x1, y1, x2 - x1, y2 - y1, text))
+        return words
+
+    def _recognize(self, img, timeout):
+        self.api.SetImage(_pil(img))
+        if not self.api.Recognize(int(timeout * 1000)) and timeout:
+            raise TimeoutError("Tesseract recognition timeout")
+
+    def close(self):
+        self.api.End()
+
+# long-lived engine handles per (backend, lang, psm); a handle is used by one thread at a time
+class EnginePool:
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self._lock = threading.Lock()
+        self._idle: dict[tuple, list] = {}
+        self._created = 0
+        self._fallbacks = 0
+
+    @contextmanager
+    def checkout(self, lang: str, psm: int, backend: str | None = None):
+        key = (resolve_backend(backend), lang, int(psm))
+        strict = _requested(backend) != "auto"
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            engine = idle.pop() if idle else None
+        if engine is not None and strict and engine.name != key[0]:
+            engine.close()  # a pytesseract fallback left by an auto checkout
+            engine = None
+        if engine is None:
+            engine = self._create(*key, strict=strict)
+        try:
+            yield engine
+        finally:
+            with self._lock:
+                idle = self._idle.setdefault(key, [])
+                if len(idle) < self.size:
+                    idle.append(engine)
+                    engine = None
+            if engine is not None:
+                engine.close()
+
+    # auto falls back to pytesseract when tesserocr cannot start; an explicit tesserocr request fails
+    def _create(self, backend: str, lang: str, psm: int, strict: bool = False):
+        if backend == "tesserocr":
+            try:
+                engine = TesserocrEngine(lang, psm)
+            except Exception as e:
+                if strict:
+                    raise RuntimeError(f"tesserocr backend unavailable: {type(e).__name__}: {e}") from e
+                with self._lock:
+                    self._fallbacks += 1  # traineddata not found or libtesseract mismatch
+                engine = PytesseractEngine(lang, psm)
+        else:
+            engine = PytesseractEngine(lang, psm)
+        with self._lock:
+            self._created += 1
+        return engine
+
+    def status(self) -> dict:
+        with self._lock:
+            return {"size": self.size, "created": self._created, "fallbacks": self._fallbacks,
+                    "idle": {f"{b}:{l}:psm{p}": len(v) for (b, l, p), v in self._idle.items()}}
+
+    def close(self):
+        with self._lock:
+            engines = [e for v in self._idle.values() for e in v]
+            self._idle.clear()
+        for e in engines:
+            e.close()
+
+def image_to_string(img, lang: str | None = None, psm: int = 6, backend: str | None = None,
+                    timeout: float = 0) -> str:
+    with engine_pool.checkout(lang or default_lang(), psm, backend) as eng:
+        return eng.image_to_string(img, timeout=timeout)
+
+def image_to_words(img, lang: str | None = None, psm: int = 6, backend: str | None = None,
+                   timeout: float = 0) -> list[tuple]:
+    with engine_pool.checkout(lang or default_lang(), psm, backend) as eng:
+        return eng.image_to_words(img, timeout=timeout)
+
+def warmup(lang: str | None = None, psm: int = 6):
+    with engine_pool.checkout(lang or default_lang(), psm):
+        pass
+
+# for /health: not ready when OCR_MODE=api or OCR_BACKEND=tesserocr asks for tesserocr and it cannot be imported
+def status() -> dict:
+    mode = (settings.OCR_MODE or "node").lower().strip()
+    needs_api = mode == "api" or _requested(None) == "tesserocr"
+    return {"mode": mode, "backend": "tesserocr" if mode == "api" else resolve_backend(None),
+            "tesserocr": _has_tesserocr(), "ready": _has_tesserocr() or not needs_api}
+
+def _requested(backend: str | None) -> str:
+    return (backend or settings.OCR_BACKEND or "auto").lower().strip()
+
+def resolve_backend(backend: str | None) -> str:
+    backend = _requested(backend)
+    if backend == "auto":
+        return "tesserocr" if _has_tesserocr() else "pytesseract"
+    if backend not in ("tesserocr", "pytesseract"):
+        raise ValueError(f"Unknown OCR_BACKEND: {backend}")
+    return backend
+
+_tesserocr_ok: bool | None = None
+
+def _has_tesserocr() -> bool:
+    global _tesserocr_ok
+    if _tesserocr_ok is None:
+        try:
+            import tesserocr  # noqa: F401
+            _tesserocr_ok = True
+        except Exception:
+            _tesserocr_ok = False
+    return _tesserocr_ok
+
+def _pil(img):
+    return img if isinstance(img, Image.Image) else Image.fromarray(img)
+
+engine_pool = EnginePool(settings.OCR_POOL_SIZE)
@@ -0,0 +1,73 @@
+from __future__ import annotations
+import hashlib
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from core.settings import settings
+from core.ocr_backend import image_to_string, default_lang, resolve_backend
+from core.timings import incr
+
+# per-process LRU of OCR results for binarized crops; diagrams repeat the same small labels
+# (yes/no gateways, start/end, role names), which then skip Tesseract entirely
+class OcrCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._items: OrderedDict[str, str] = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            text = self._items.get(key)
+            if text is None:
+                self._stats["misses"] += 1
+            else:
+                self._items.move_to_end(key)
+                self._stats["hits"] += 1
+        incr("ocr_cache_miss" if text is None else "ocr_cache_hit")
+        return text
+
+    def put(self, key: str, text: str):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._items[key] = text
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "entries": len(self._items), "max_entries": self.max_entries}
+
+# exact hash of the crop trimmed to its ink, so the same label cut with different margins matches
+def crop_key(img: np.ndarray, lang: str, psm: int, backend: str | None = None) -> str:
+    pts = cv2.findNonZero((img < 128).view(np.uint8))
+    if pts is not None:
+        x, y, w, h = cv2.boundingRect(pts)
+        img = img[y:y + h, x:x + w]
+    h = hashlib.blake2b(np.ascontiguousarray(img).tobytes(), digest_size=16)
+    h.update(f"{img.shape}|{resolve_backend(backend)}|{lang}|{psm}".encode("utf-8"))
+    return h.hexdigest()
+
+def cached_image_to_string(img: np.ndarray, lang: str | None = None, psm: int = 6, backend: str | None = None,
+                           timeout: float = 0) -> str:
+    lang = lang or default_lang()
+    if ocr_cache.max_entries <= 0:
+        return image_to_string(img, lang, psm=psm, backend=backend, timeout=timeout)
+    key = crop_key(img, lang, psm, backend)
+    text = ocr_cache.get(key)
+    if text is None:
+        text = image_to_string(img, lang, psm=psm, backend=backend, timeout=timeout)
+        ocr_cache.put(key, text)
+    return text
+
+ocr_cache = OcrCache(settings.OCR_CACHE_SIZE)
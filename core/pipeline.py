@@ -1,11 +1,93 @@
 from __future__ import annotations
+import time
+
+from core.settings import settings
 from core.engines.cv_engine import parse_with_cv
-from core.engines.yolo_engine import parse_with_yolo_bpmn, YOLOUnavailable
+from core.engines.yolo_engine import parse_with_yolo_bpmn, prepare_yolo, finish_yolo, YOLOUnavailable
+from core.model_registry import yolo_registry
+from core.deadline import Deadline, DeadlineExceeded
+from core.timings import Recorder, recording, stage
 
-def parse_image_bytes(image_bytes: bytes, hard_timeout_s: float = 20.0, engine: str = "cv") -> dict:
+def normalize_engine(engine: str) -> str:
     engine = (engine or "cv").lower().strip()
     if engine in ("cv","opencv","contours"):
-        return parse_with_cv(image_bytes, hard_timeout_s)
+        return "cv"
     if engine in ("yolo","yolo_bpmn","bpmn"):
-        return parse_with_yolo_bpmn(image_bytes, hard_timeout_s)
+        return "yolo_bpmn"
     raise ValueError(f"Unknown engine: {engine}")
+
+def parse_image_bytes(image_bytes: bytes, hard_timeout_s: float = 20.0, engine: str = "cv") -> dict:
+    parse = parse_with_cv if normalize_engine(engine) == "cv" else parse_with_yolo_bpmn
+    with recording() as rec:
+        with stage("total"):
+            raw = parse(image_bytes, hard_timeout_s)
+    return _attach_timings(raw, rec)
+
+# several images in one call, each entry the result or the exception that image raised; yolo_bpmn
+# sends up to YOLO_BATCH_SIZE images through one forward pass, other engines parse one by one
+def parse_image_batch(datas, hard_timeout_s: float = 20.0, engine: str = "cv") -> list:
+    if normalize_engine(engine) != "yolo_bpmn" or len(datas) == 1:
+        return [_parse_or_error(d, hard_timeout_s, engine) for d in datas]
+    size = max(1, settings.YOLO_BATCH_SIZE)
+    out = []
+    for i in range(0, len(datas), size):
+        out.extend(_parse_yolo_batch(datas[i:i + size], hard_timeout_s))
+    return out
+
+def _parse_or_error(data, hard_timeout_s: float, engine: str):
+    try:
+        return parse_image_bytes(data, hard_timeout_s=hard_timeout_s, engine=engine)
+    except Exception as e:
+        return e
+
+# each image keeps its own timings and budget: the shared forward pass is charged to all of them,
+# the rest of the deadline is what a single parse would have left after it
+def _parse_yolo_batch(datas, hard_timeout_s: float) -> list:
+    recs = [Recorder() for _ in datas]
+    out: list = [None] * len(datas)
+    ctxs, spent = {}, {}
+    for i, data in enumerate(datas):
+        t0 = time.perf_counter()
+        try:
+            with recording(recs[i]), stage("total"):
+                ctxs[i] = prepare_yolo(data)
+        except Exception as e:
+            out[i] = e
+        spent[i] = time.perf_counter() - t0
+    if not ctxs:
+        return out
+
+    res, truncated = {}, ""
+    deadline = Deadline(max(0.0, hard_timeout_s - max(spent[i] for i in ctxs)))
+    t0 = time.perf_counter()
+    try:
+        deadline.check("preprocess")
+        res = dict(zip(ctxs, yolo_registry.predict([c.bgr for c in ctxs.values()], deadline=deadline)))
+        deadline.check("yolo_predict")
+    except DeadlineExceeded as e:
+        truncated = e.stage
+    except Exception as e:
+        for i in ctxs:
+            out[i] = e
+        return out
+    predict_s = time.perf_counter() - t0
+
+    for i, ctx in ctxs.items():
+        recs[i].add("yolo_predict", predict_s)
+        recs[i].add("total", predict_s)
+        try:
+            with recording(recs[i]), stage("total"):
+                deadline = Deadline(max(0.0, hard_timeout_s - spent[i] - predict_s))
+                raw = finish_yolo(ctx, [res[i]] if i in res else None, deadline, hard_timeout_s, truncated)
+        except Exception as e:
+            out[i] = e
+            continue
+        raw["meta"]["yolo_batch"] = len(ctxs)
+        out[i] = _attach_timings(raw, recs[i])
+    return out
+
+def _attach_timings(raw: dict, rec: Recorder) -> dict:
+    raw["meta"]["timings"] = rec.timings_ms()
+    if rec.counters:
+        raw["meta"]["counters"] = dict(rec.counters)
+    return raw
@@ -0,0 +1,75 @@
+from __future__ import annotations
+import gc
+import os
+import sys
+
+from core.settings import settings
+
+# read by OpenMP (torch, tesseract), OpenBLAS and MKL when they load
+_THREAD_VARS = ("OMP_NUM_THREADS", "OMP_THREAD_LIMIT", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+def server_workers() -> int:
+    return settings.SERVER_WORKERS if settings.SERVER_WORKERS > 0 else (os.cpu_count() or 1)
+
+def thread_budget() -> int:
+    if settings.SERVER_THREADS > 0:
+        return settings.SERVER_THREADS
+    return max(1, (os.cpu_count() or 1) // server_workers())
+
+# native threads for each parse thread of a worker, so workers * parse threads * this stays within the cores
+def intra_threads() -> int:
+    return max(1, thread_budget() // max(1, settings.PARSE_WORKERS))
+
+# master, before the app (and numpy, cv2, torch with it) is imported. Parsing runs in threads of each
+# worker next to the models it inherited: a spawned process pool would load its own copies.
+# Explicitly set values win.
+def configure():
+    if "PARSE_EXECUTOR" not in settings.model_fields_set:
+        settings.PARSE_EXECUTOR = "thread"
+    if settings.PARSE_WORKERS <= 0:
+        settings.PARSE_WORKERS = thread_budget()
+    n = intra_threads()
+    for var in _THREAD_VARS:
+        os.environ.setdefault(var, str(n))
+    if settings.YOLO_ONNX_THREADS <= 0:
+        settings.YOLO_ONNX_THREADS = n
+    if settings.TILE_WORKERS <= 0:
+        settings.TILE_WORKERS = n
+
+# master, after the app import and before the fork: everything loaded here is shared copy-on-write.
+# Nothing runs inference: OpenMP and onnxruntime thread pools do not survive a fork, so the torch model
+# is only loaded (warmed up in each worker) and onnx weights are only exported.
+def preload(templates=None):
+    import core.engines  # noqa: F401  engines, OCR helpers and their compiled patterns
+    from core import ocr_backend
+    from core.model_registry import yolo_registry, backend
+
+    if templates is not None:
+        for name in templates.list_templates():
+            templates.get_template(name)
+    try:
+        ocr_backend.warmup()
+    except Exception:
+        pass  # tesseract missing: OCR fails per request as without preloading
+    try:
+        if os.path.isfile(yolo_registry.active_path):
+            if backend() == "onnx":
+                from core.yolo_onnx import onnx_weights
+                onnx_weights(yolo_registry.active_path)
+            else:
+                yolo_registry.get()
+    except Exception:
+        pass  # each worker loads it again and reports the error in /health
+    # the collector is off in the master (gunicorn.conf.py); frozen objects are never scanned, so the
+    # workers do not write to their headers and the pages stay shared
+    gc.freeze()
+
+# each worker, right after the fork
+def worker_init():
+    gc.enable()
+    n = intra_threads()
+    import cv2
+    cv2.setNumThreads(n)
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(n)
@@ -1,18 +1,28 @@
 from __future__ import annotations
 import cv2
 
+from core.image_context import ImageContext
+
+MAX_SIDE = 1800
+
 def preprocess(img_bgr):
+    ctx = preprocess_context(img_bgr)
+    return ctx.bgr, ctx.binary
+
+# downscaled working image; gray/binary rasters are derived lazily by the context. `max_side`
+# (<= MAX_SIDE) is the detection size; OCR crops come from `source` (default: img_bgr itself when
+# it had to be shrunk) of `source_size` (w, h), for images that were already decoded reduced
+def preprocess_context(img_bgr, max_side: int = MAX_SIDE, source=None,
+                       source_size: tuple[int, int] | None = None) -> ImageContext:
     h, w = img_bgr.shape[:2]
-    max_side = max(h, w)
-    if max_side > 1800:
-        scale = 1800.0 / max_side
+    sw, sh = source_size or (w, h)
+    if max(h, w) > max_side:
+        if source is None:
+            source = img_bgr
+        scale = max_side / max(h, w)
         img_bgr = cv2.resize(img_bgr, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
-
-    gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
-    gray = cv2.GaussianBlur(gray, (3, 3), 0)
-    bin_img = cv2.adaptiveThreshold(
-        gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 41, 7
-    )
-    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
-    bin_img = cv2.morphologyEx(bin_img, cv2.MORPH_OPEN, kernel, iterations=1)
-    return img_bgr, bin_img
+        h, w = img_bgr.shape[:2]
+    # thresholds are relative to what the single-resolution pipeline would have worked on
+    k = max(h, w) / min(max(sw, sh), MAX_SIDE)
+    return ImageContext(img_bgr, scale=1.0 if abs(k - 1.0) < 1e-3 else k, source=source,
+                        source_size=(sw, sh) if source is not None else None)
@@ -0,0 +1,164 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import cv2
+
+from core.settings import settings
+from core.model_registry import yolo_registry
+
+_SCHEMA = 1
+
+# the parsing code itself: any edit to core/ invalidates stored results without bumping _SCHEMA
+def _code_version() -> str:
+    h = hashlib.sha256()
+    root = Path(__file__).resolve().parent
+    for path in sorted(root.rglob("*.py")):
+        h.update(path.relative_to(root).as_posix().encode("utf-8"))
+        h.update(path.read_bytes())
+    return h.hexdigest()[:12]
+
+_CODE = _code_version()
+
+def image_digest(image_bytes) -> str:
+    return hashlib.sha256(image_bytes).hexdigest()
+
+def engine_version(engine: str) -> str:
+    parts = [f"schema={_SCHEMA}", f"code={_CODE}", f"opencv={cv2.__version__}", f"engine={engine}", f"ocr={settings.OCR_MODE}/{settings.OCR_BACKEND}",
+             f"lang={os.environ.get('TESS_LANG', 'eng+rus')}", f"detect={settings.DETECT_MAX_SIDE}",
+             f"reduced={settings.DECODE_REDUCED}", f"arrows={settings.ARROW_MATCH_METRIC}"]
+    if engine == "cv":
+        parts.append(f"tiles={settings.TILE_MODE}/{settings.TILE_MIN_SIDE}/{settings.TILE_SIZE}/{settings.TILE_OVERLAP}")
+    if engine == "yolo_bpmn":
+        path = yolo_registry.active_path
+        mtime = os.stat(path).st_mtime if os.path.isfile(path) else 0.0
+        parts.append(f"weights={path}@{mtime}")
+        parts.append(f"backend={settings.YOLO_BACKEND}/{settings.YOLO_IMGSZ}/{settings.YOLO_CONF}/{settings.YOLO_IOU}/"
+                     f"{settings.YOLO_MAX_DET}")
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+def cache_key(image_bytes, engine: str, hard_timeout_s: float) -> str:
+    return f"{image_digest(image_bytes)}:{engine_version(engine)}:{hard_timeout_s}"
+
+# two-tier parse result cache: in-memory LRU bounded by bytes + optional sqlite file
+class ResultCache:
+    def __init__(self, max_bytes: int, path: str = "", disk_max_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self._lock = threading.Lock()
+        self._mem: OrderedDict[str, bytes] = OrderedDict()
+        self._mem_bytes = 0
+        self._stats = {"hits_memory": 0, "hits_disk": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self.path = path
+        self._db = None
+        self._pid = 0
+
+    def get(self, key: str) -> tuple[dict | None, str]:
+        with self._lock:
+            blob = self._mem.get(key)
+            if blob is not None:
+                self._mem.move_to_end(key)
+                self._stats["hits_memory"] += 1
+                return json.loads(blob), "memory"
+            if self._conn() is not None:
+                row = self._db.execute("SELECT value FROM results WHERE key=?", (key,)).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE results SET accessed=? WHERE key=?", (time.time(), key))
+                    self._stats["hits_disk"] += 1
+                    self._remember(key, bytes(row[0]))
+                    return json.loads(row[0]), "disk"
+            self._stats["misses"] += 1
+            return None, "miss"
+
+    def put(self, key: str, value: dict):
+        blob = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        with self._lock:
+            self._stats["stores"] += 1
+            self._remember(key, blob)
+            if self._conn() is not None:
+                self._db.execute("INSERT INTO results(key, value, size, accessed) VALUES (?,?,?,?) "
+                                 "ON CONFLICT(key) DO UPDATE SET value=excluded.value, size=excluded.size, "
+                                 "accessed=excluded.accessed", (key, blob, len(blob), time.time()))
+                self._prune_disk()
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            self._mem_bytes = 0
+            if self._conn() is not None:
+                self._db.execute("DELETE FROM results")
+
+    def stats(self) -> dict:
+        with self._lock:
+            st = dict(self._stats)
+            st.update({"memory_entries": len(self._mem), "memory_bytes": self._mem_bytes,
+                       "max_bytes": self.max_bytes, "disk": bool(self.path)})
+        lookups = st["hits_memory"] + st["hits_disk"] + st["misses"]
+        st["hit_rate"] = round((st["hits_memory"] + st["hits_disk"]) / lookups, 4) if lookups else 0.0
+        return st
+
+    # opened on first use in each process; a pre-forked worker must not inherit its parent's connection
+    def _conn(self):
+        if self.path and self._pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS results ("
+                             "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)")
+            self._init_usage()
+            self._pid = os.getpid()
+        return self._db
+
+    # running total of stored bytes, kept by triggers so every process sharing the file sees every store and
+    # delete; only a file without it (new, or written before) is summed, once
+    def _init_usage(self):
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            self._db.execute("CREATE TABLE IF NOT EXISTS usage (id INTEGER PRIMARY KEY CHECK (id = 1), "
+                             "bytes INTEGER NOT NULL)")
+            self._db.execute("CREATE TRIGGER IF NOT EXISTS results_insert AFTER INSERT ON results "
+                             "BEGIN UPDATE usage SET bytes = bytes + NEW.size; END")
+            self._db.execute("CREATE TRIGGER IF NOT EXISTS results_update AFTER UPDATE OF size ON results "
+                             "BEGIN UPDATE usage SET bytes = bytes + NEW.size - OLD.size; END")
+            self._db.execute("CREATE TRIGGER IF NOT EXISTS results_delete AFTER DELETE ON results "
+                             "BEGIN UPDATE usage SET bytes = bytes - OLD.size; END")
+            if self._db.execute("SELECT 1 FROM usage").fetchone() is None:
+                self._db.execute("INSERT INTO usage(id, bytes) SELECT 1, COALESCE(SUM(size), 0) FROM results")
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+
+    def _remember(self, key: str, blob: bytes):
+        if len(blob) > self.max_bytes:
+            return
+        old = self._mem.pop(key, None)
+        if old is not None:
+            self._mem_bytes -= len(old)
+        self._mem[key] = blob
+        self._mem_bytes += len(blob)
+        while self._mem_bytes > self.max_bytes:
+            _, ev = self._mem.popitem(last=False)
+            self._mem_bytes -= len(ev)
+            self._stats["evictions"] += 1
+
+    def _prune_disk(self):
+        if self.disk_max_bytes <= 0:
+            return
+        total = self._db.execute("SELECT bytes FROM usage").fetchone()[0]
+        if total <= self.disk_max_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM results ORDER BY accessed").fetchall():
+            self._db.execute("DELETE FROM results WHERE key=?", (key,))
+            total -= size
+            if total <= self.disk_max_bytes:
+                break
+
+result_cache = ResultCache(settings.RESULT_CACHE_MAX_BYTES, settings.RESULT_CACHE_PATH,
+                           settings.RESULT_CACHE_DISK_MAX_BYTES)
@@ -7,6 +7,66 @@ class Settings(BaseSettings):
     LLM_API_KEY: str = ""
     LLM_MODEL: str = "gpt-4o-mini"
     LLM_TIMEOUT_S: float = 12.0
+    LLM_MAX_CONCURRENCY: int = 4  # in-flight calls (and pooled keep-alive connections) per process
+    LLM_RETRIES: int = 2
+    LLM_RETRY_BACKOFF_S: float = 0.5
+    LLM_RETRY_BUDGET_S: float = 20.0  # wall-clock cap for one refinement including retries
+    LLM_CACHE_SIZE: int = 256  # responses cached by payload hash; 0 = off
+    LLM_BATCH_MODE: str = "concurrent"  # concurrent | packed (several diagrams per request)
+    LLM_BATCH_SIZE: int = 8  # diagrams per packed request
+
+    YOLO_WEIGHTS: str = "model/best.pt"
+    YOLO_WARMUP: bool = True
+    YOLO_WARMUP_SIZE: int = 640
+    YOLO_BACKEND: str = "torch"  # torch (ultralytics) | onnx (onnxruntime CPU, exported once from the .pt)
+    YOLO_ONNX_DIR: str = ""  # export cache; empty = <weights dir>/onnx
+    YOLO_ONNX_THREADS: int = 0  # onnxruntime intra-op threads; 0 = its default
+    YOLO_IMGSZ: int = 640  # onnx export/input size
+    YOLO_CONF: float = 0.25  # onnx postprocessing, same defaults as ultralytics predict
+    YOLO_IOU: float = 0.7
+    YOLO_MAX_DET: int = 300
+    YOLO_BATCH_SIZE: int = 8  # images per forward pass in parse_many / evaluate; 1 = no batching
+
+    PARSE_EXECUTOR: str = "process"  # process | thread | inline
+    PARSE_WORKERS: int = 0  # 0 = os.cpu_count()
+    PARSE_MP_CONTEXT: str = "spawn"
+    PARSE_MANY_CONCURRENCY: int = 0  # 0 = PARSE_WORKERS
+
+    SERVER_WORKERS: int = 0  # pre-fork mode (gunicorn.conf.py): worker processes; 0 = cpu count
+    SERVER_THREADS: int = 0  # native threads per worker, shared by its parse threads; 0 = cpu count / workers
+    SERVER_LIMIT_CONCURRENCY: int = 0  # requests in flight per worker, beyond that 503; 0 = unlimited
+    SERVER_PRELOAD: bool = True  # load models, OCR data and templates in the master before forking
+
+    JOBS_WORKERS: int = 2  # jobs run at once per process; 0 = /v1/jobs disabled
+    JOBS_PATH: str = ".jobs/jobs.sqlite"  # shared by every process on the host
+    JOBS_TTL_S: int = 3600  # finished jobs and their results are kept this long
+    JOBS_MAX_QUEUED: int = 1000  # queued + running; submissions beyond it get 503
+    JOBS_DRAIN_TIMEOUT_S: float = 60.0  # on shutdown; unfinished jobs go back to the queue
+    JOBS_POLL_S: float = 1.0
+    JOBS_STALE_S: int = 600  # running jobs without a heartbeat (every JOBS_POLL_S) for this long are requeued
+
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    RESULT_CACHE_PATH: str = ""  # sqlite file for the persistent tier; empty = memory only
+    RESULT_CACHE_DISK_MAX_BYTES: int = 1024 * 1024 * 1024
+
+    MAX_UPLOAD_BYTES: int = 40 * 1024 * 1024  # 0 = unlimited
+    MAX_IMAGE_PIXELS: int = 150_000_000  # checked from the file header before decoding; 0 = unlimited
+    DETECT_MAX_SIDE: int = 1800  # geometry runs at most at this size; OCR reads original-resolution crops
+    DECODE_REDUCED: bool = True  # JPEG: decode at 1/2, 1/4 or 1/8 scale when still >= working size
+
+    TILE_MODE: str = "off"  # off | auto (pages with a side >= TILE_MIN_SIDE) | on
+    TILE_MIN_SIDE: int = 6000
+    TILE_SIZE: int = 4096  # px at full resolution
+    TILE_OVERLAP: int = 1024  # should exceed the largest node, so every node is whole in some tile
+    TILE_WORKERS: int = 0  # 0 = min(4, cpu count)
+
+    ARROW_MATCH_METRIC: str = "center"  # center | edge
+
+    OCR_MODE: str = "node"  # node | page | mosaic | api (= node via tesserocr)
+    OCR_BACKEND: str = "auto"  # auto | tesserocr | pytesseract
+    OCR_POOL_SIZE: int = 4  # idle engine handles kept per (backend, lang, psm)
+    OCR_CACHE_SIZE: int = 4096  # crop OCR results kept per process; 0 = off
 
     class Config:
         env_prefix = ""
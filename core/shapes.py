@@ -1,14 +1,14 @@
 from __future__ import annotations
 import cv2
 
-def detect_shapes(img_bgr, bin_img):
+def detect_shapes(img_bgr, bin_img, min_area: float = 700):
     contours, _ = cv2.findContours(bin_img, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     nodes = []
     h, w = bin_img.shape[:2]
 
     for cnt in contours:
         area = cv2.contourArea(cnt)
-        if area < 700:
+        if area < min_area:
             continue
 
         x, y, bw, bh = cv2.boundingRect(cnt)
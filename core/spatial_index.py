@@ -0,0 +1,50 @@
+from __future__ import annotations
+import numpy as np
+
+_CHUNK = 4096
+
+# nearest-box queries for many points at once; metric "center" (distance to box center)
+# or "edge" (distance to the box outline, 0 inside, ties broken by center distance)
+class BoxIndex:
+    def __init__(self, bboxes, centers=None):
+        self.boxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+        if centers is None:
+            centers = np.stack([(self.boxes[:, 0] + self.boxes[:, 2]) / 2.0,
+                                (self.boxes[:, 1] + self.boxes[:, 3]) / 2.0], axis=1)
+        self.centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+
+    def __len__(self) -> int:
+        return len(self.boxes)
+
+    def nearest(self, points, max_dist: float, metric: str = "center") -> np.ndarray:
+        pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        out = np.full(len(pts), -1, dtype=np.int64)
+        if len(self) == 0 or len(pts) == 0:
+            return out
+        if metric not in ("center", "edge"):
+            raise ValueError(f"Unknown metric: {metric}")
+
+        max_d2 = float(max_dist) ** 2
+        for s in range(0, len(pts), _CHUNK):
+            p = pts[s:s + _CHUNK]
+            x = p[:, 0:1]
+            y = p[:, 1:2]
+            d_center = (self.centers[None, :, 0] - x) ** 2 + (self.centers[None, :, 1] - y) ** 2
+            if metric == "center":
+                d = d_center
+                idx = d.argmin(axis=1)
+            else:
+                dx = np.maximum(np.maximum(self.boxes[None, :, 0] - x, x - self.boxes[None, :, 2]), 0.0)
+                dy = np.maximum(np.maximum(self.boxes[None, :, 1] - y, y - self.boxes[None, :, 3]), 0.0)
+                d = dx * dx + dy * dy
+                best = d.min(axis=1, keepdims=True)
+                idx = np.where(d <= best, d_center, np.inf).argmin(axis=1)
+            best_d = d[np.arange(len(p)), idx]
+            out[s:s + len(p)] = np.where(best_d <= max_d2, idx, -1)
+        return out
+
+def match_segments(index: BoxIndex, segs, max_dist: float, metric: str = "center"):
+    # (a, b) box indices for the first and second endpoint of each (x1, y1, x2, y2) segment
+    segs = np.asarray(segs, dtype=np.float64).reshape(-1, 4)
+    found = index.nearest(np.concatenate([segs[:, 0:2], segs[:, 2:4]]), max_dist, metric)
+    return found[:len(segs)], found[len(segs):]
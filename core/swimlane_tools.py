@@ -1,25 +1,34 @@
 from __future__ import annotations
 import cv2
 import numpy as np
-import pytesseract
+from core.ocr_cache import cached_image_to_string
+from core.ocr import text_scale, rescale
+from core.deadline import Deadline, call_timeout
 from core.yolo_blocks import DiagramBlock
+from core.image_context import ImageContext
+
+LANE_TYPES = ("swimline","swimlane","pool","lane")
 
 class Swimlane:
     def __init__(self, id: int, y_top: int, y_bottom: int, x_left: int, x_right: int, name: str=""):
         self.id=id; self.y_top=y_top; self.y_bottom=y_bottom; self.x_left=x_left; self.x_right=x_right; self.name=name
 
-def process_swimlanes(image: np.ndarray, blocks: list[DiagramBlock], vertical_threshold: int = 30, text_search_width: int = 220):
-    swim_blocks = [b for b in blocks if b.type.lower() in ("swimline","swimlane","pool","lane")]
+def process_swimlanes(image: np.ndarray, blocks: list[DiagramBlock], vertical_threshold: int = 30, text_search_width: int = 220,
+                      deadline: Deadline | None = None, ctx: ImageContext | None = None):
+    swim_blocks = [b for b in blocks if b.type.lower() in LANE_TYPES]
     if not swim_blocks:
         return []
 
+    ctx = ctx or ImageContext(image)
     groups = _group_by_height(swim_blocks, vertical_threshold)
     swimlanes=[]
     h,w=image.shape[:2]
     for i, group in enumerate(groups):
         y_top = min(b.bbox[1] for b in group)
         y_bottom = max(b.bbox[3] for b in group)
-        name = extract_swimlane_name(image, group, text_search_width)
+        if deadline is not None:
+            deadline.check("swimlanes")
+        name = extract_swimlane_name(image, group, text_search_width, timeout=call_timeout(deadline), ctx=ctx)
         swimlanes.append(Swimlane(i, y_top, y_bottom, 0, w, name))
 
     swimlanes.sort(key=lambda s: s.y_top)
@@ -49,7 +58,8 @@ def _group_by_height(blocks, threshold):
     groups.append(cur)
     return groups
 
-def extract_swimlane_name(image: np.ndarray, swimline_group: list[DiagramBlock], text_search_width: int = 220) -> str:
+def extract_swimlane_name(image: np.ndarray, swimline_group: list[DiagramBlock], text_search_width: int = 220,
+                          timeout: float = 0, ctx: ImageContext | None = None) -> str:
     if not swimline_group:
         return ""
     y_top = min(b.bbox[1] for b in swimline_group)
@@ -57,18 +67,20 @@ def extract_swimlane_name(image: np.ndarray, swimline_group: list[DiagramBlock],
 
     x1=0
     x2=min(text_search_width, image.shape[1])
-    roi=image[y_top:y_bottom, x1:x2]
-    if roi.size==0:
+    gray=(ctx or ImageContext(image)).source_crop(x1, y_top, x2, y_bottom)
+    if gray.size==0:
         return ""
 
-    gray=cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
     _,thr=cv2.threshold(gray,0,255,cv2.THRESH_BINARY+cv2.THRESH_OTSU)
 
     rot=cv2.rotate(thr, cv2.ROTATE_90_CLOCKWISE)
-    rot=cv2.resize(rot, None, fx=2.0, fy=2.0, interpolation=cv2.INTER_CUBIC)
+    scale=text_scale(cv2.bitwise_not(rot))
+    if not scale:
+        return ""
+    rot=rescale(rot, scale)
 
     try:
-        txt=pytesseract.image_to_string(rot, lang="rus+eng", config="--psm 6")
+        txt=cached_image_to_string(rot, lang="rus+eng", psm=6, timeout=timeout)
     except Exception:
         return ""
     return " ".join((txt or "").replace("\n"," ").split()).strip()
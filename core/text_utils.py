@@ -1,8 +1,10 @@
 from __future__ import annotations
 import re
-from rapidfuzz import fuzz
+import numpy as np
+from rapidfuzz import fuzz, process
 
 _OCR_GARBAGE_RE = re.compile(r"^[\W_]+$")
+_PARALLEL_MIN = 64  # below this cdist's thread start-up costs more than it saves
 
 def normalize_step_text(t: str) -> str:
     t = (t or "").replace("\t", " ").replace("\n", " ").replace("\r", " ")
@@ -30,13 +32,24 @@ def is_good_step_text(t: str) -> bool:
 
     return True
 
+# keeps a text unless it is similar to an already kept one; same result as the pairwise loop,
+# but exact repeats are folded first and the remaining pairs are scored in one cdist call
+# (score_cutoff lets rapidfuzz reject pairs whose length difference already rules them out)
 def dedupe_steps(texts: list[str], threshold: int = 92) -> list[str]:
-    out: list[str] = []
+    if threshold > 100:
+        return [t for t in map(normalize_step_text, texts) if t]
+    uniq: dict[str, str] = {}
     for t in texts:
         t = normalize_step_text(t)
-        if not t:
-            continue
-        if any(fuzz.token_sort_ratio(t.lower(), x.lower()) >= threshold for x in out):
-            continue
-        out.append(t)
-    return out
+        if t:
+            uniq.setdefault(t.lower(), t)
+    if len(uniq) < 2:
+        return list(uniq.values())
+
+    keys = list(uniq)
+    sim = process.cdist(keys, keys, scorer=fuzz.token_sort_ratio, score_cutoff=max(threshold, 0), dtype=np.float64,
+                        workers=-1 if len(keys) >= _PARALLEL_MIN else 1) >= threshold
+    kept = np.zeros(len(keys), dtype=bool)
+    for i in range(len(keys)):
+        kept[i] = not (sim[i, :i] & kept[:i]).any()
+    return [uniq[k] for k, keep in zip(keys, kept) if keep]
@@ -0,0 +1,162 @@
+from __future__ import annotations
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from core.settings import settings
+from core.preprocess import MAX_SIDE
+from core.decode import probe_image
+from core.image_context import ImageContext
+from core.shapes import detect_shapes
+from core.arrows import hough_segments, segments_to_edges
+from core.deadline import Deadline
+
+TILE_MODES = ("off", "auto", "on")
+_SEAM = 2  # px; a box this close to an interior tile border was cut by it
+
+def use_tiles(data) -> bool:
+    mode = (settings.TILE_MODE or "off").lower().strip()
+    if mode not in TILE_MODES:
+        raise ValueError(f"Unknown TILE_MODE: {mode}")
+    if mode != "auto":
+        return mode == "on"
+    probe = probe_image(data)
+    return probe is not None and max(probe[1], probe[2]) >= settings.TILE_MIN_SIDE
+
+# overlapping (x1, y1, x2, y2) windows covering the page; the last row/column is aligned to the edge
+def tile_grid(h: int, w: int, size: int, overlap: int) -> list[tuple[int, int, int, int]]:
+    if not 0 <= overlap < size:
+        raise ValueError("Tile overlap must be smaller than the tile size.")
+    def starts(n):
+        out = list(range(0, max(n - size, 0) + 1, size - overlap))
+        if out[-1] + size < n:
+            out.append(n - size)
+        return out
+    return [(x, y, min(x + size, w), min(y + size, h)) for y in starts(h) for x in starts(w)]
+
+# shape and connector detection at full resolution, one tile at a time; only the tiles in flight hold
+# derived rasters (binary, masks), so those are bounded by workers * tile size. The grayscale page
+# itself (1 byte/px) is still held whole. Pixel thresholds are stretched by the ratio to the usual
+# working size. Returns (nodes, edges, tiles).
+def detect_tiled(gray, deadline: Deadline | None = None):
+    h, w = gray.shape[:2]
+    k = max(1.0, max(h, w) / MAX_SIDE)
+    tiles = tile_grid(h, w, settings.TILE_SIZE, settings.TILE_OVERLAP)
+    workers = settings.TILE_WORKERS or min(4, os.cpu_count() or 1)
+
+    def run(tile):
+        if deadline is not None:
+            deadline.check("detect_tiles")
+        return _detect_tile(gray, tile, k)
+
+    if workers <= 1 or len(tiles) == 1:
+        parts = [run(t) for t in tiles]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(run, tiles))
+
+    nodes = merge_nodes([n for p_nodes, _ in parts for n in p_nodes])
+    segs = merge_segments([s for _, p_segs in parts for s in p_segs], tol=round(3 * k), gap=round(12 * k))
+    return nodes, segments_to_edges(nodes, segs, k), len(tiles)
+
+def _detect_tile(gray, tile, k: float):
+    x0, y0, x1, y1 = tile
+    h, w = gray.shape[:2]
+    ctx = ImageContext(gray[y0:y1, x0:x1], scale=k)
+    nodes = detect_shapes(ctx.bgr, ctx.binary, min_area=700 * k * k)
+    segs = hough_segments(ctx.masked("binary", [n["bbox"] for n in nodes], pad=round(8 * k)), k)
+
+    # sides of the tile that are seams rather than page borders
+    cut = (x0 > 0, y0 > 0, x1 < w, y1 < h)
+    lim = (_SEAM, _SEAM, x1 - x0 - 1 - _SEAM, y1 - y0 - 1 - _SEAM)
+    for n in nodes:
+        bx1, by1, bx2, by2 = n["bbox"]
+        n["cut"] = ((cut[0] and bx1 <= lim[0]) or (cut[1] and by1 <= lim[1])
+                    or (cut[2] and bx2 >= lim[2]) or (cut[3] and by2 >= lim[3]))
+        n["bbox"] = [bx1 + x0, by1 + y0, bx2 + x0, by2 + y0]
+    return nodes, [(sx1 + x0, sy1 + y0, sx2 + x0, sy2 + y0) for sx1, sy1, sx2, sy2 in segs]
+
+# the same shape seen from several tiles: boxes that mostly coincide, or that overlap at all when one of
+# them was cut by a seam, are one node spanning their union; its kind comes from an uncut sighting
+def merge_nodes(found: list[dict]) -> list[dict]:
+    if not found:
+        return []
+    b = np.array([n["bbox"] for n in found], dtype=np.int64)
+    cut = np.array([n["cut"] for n in found])
+    area = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    parent = list(range(len(found)))
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i in range(len(found) - 1):
+        iw = np.minimum(b[i, 2], b[i + 1:, 2]) - np.maximum(b[i, 0], b[i + 1:, 0])
+        ih = np.minimum(b[i, 3], b[i + 1:, 3]) - np.maximum(b[i, 1], b[i + 1:, 1])
+        inter = np.clip(iw, 0, None) * np.clip(ih, 0, None)
+        same = (inter > 0) & ((cut[i] | cut[i + 1:]) | (inter >= 0.5 * np.minimum(area[i], area[i + 1:])))
+        for j in (np.flatnonzero(same) + i + 1).tolist():
+            parent[root(j)] = root(i)
+
+    groups: dict[int, list[int]] = {}
+    for i in range(len(found)):
+        groups.setdefault(root(i), []).append(i)
+
+    nodes = []
+    for members in groups.values():
+        x1, y1 = b[members, 0].min(), b[members, 1].min()
+        x2, y2 = b[members, 2].max(), b[members, 3].max()
+        best = max(members, key=lambda i: (not cut[i], area[i]))
+        nodes.append({
+            "id": "tmp",
+            "kind": found[best]["kind"],
+            "bbox": [int(x1), int(y1), int(x2), int(y2)],
+            "center": [(x1 + x2) / 2.0, (y1 + y2) / 2.0],
+        })
+
+    nodes.sort(key=lambda n: (n["bbox"][1], n["bbox"][0]))
+    for i, n in enumerate(nodes):
+        n["id"] = f"n{i}"
+        n["center"] = [float(c) for c in n["center"]]
+    return nodes
+
+# a connector crossing a seam is found in pieces by each tile; axis-aligned pieces on the same line
+# that overlap or nearly touch are joined back, everything else passes through unchanged
+def merge_segments(segs, tol: int, gap: int) -> list[tuple[int, int, int, int]]:
+    out, lines = [], {"h": [], "v": []}
+    for x1, y1, x2, y2 in segs:
+        if abs(y2 - y1) <= tol < abs(x2 - x1):
+            lines["h"].append(((y1 + y2) / 2.0, min(x1, x2), max(x1, x2)))
+        elif abs(x2 - x1) <= tol < abs(y2 - y1):
+            lines["v"].append(((x1 + x2) / 2.0, min(y1, y2), max(y1, y2)))
+        else:
+            out.append((x1, y1, x2, y2))
+
+    for axis, items in lines.items():
+        items.sort()
+        i = 0
+        while i < len(items):
+            j = i + 1
+            while j < len(items) and items[j][0] - items[j - 1][0] <= tol:
+                j += 1
+            for c, lo, hi in _join(items[i:j], gap):
+                c = round(c)
+                out.append((lo, c, hi, c) if axis == "h" else (c, lo, c, hi))
+            i = j
+    return out
+
+def _join(items, gap: int):
+    items = sorted(items, key=lambda t: t[1])
+    c, lo, hi = items[0]
+    cs = [c]
+    for c2, lo2, hi2 in items[1:]:
+        if lo2 <= hi + gap:
+            hi = max(hi, hi2)
+            cs.append(c2)
+        else:
+            yield sum(cs) / len(cs), lo, hi
+            c, lo, hi, cs = c2, lo2, hi2, [c2]
+    yield sum(cs) / len(cs), lo, hi
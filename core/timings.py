@@ -0,0 +1,45 @@
+from __future__ import annotations
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+class Recorder:
+    def __init__(self):
+        self.timings: dict[str, float] = {}
+        self.counters: dict[str, int] = {}
+
+    def add(self, name: str, seconds: float):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def incr(self, name: str, n: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def timings_ms(self) -> dict[str, float]:
+        return {k: round(v * 1000.0, 2) for k, v in self.timings.items()}
+
+_current: ContextVar[Recorder | None] = ContextVar("timings_recorder", default=None)
+
+# rec continues an existing recorder, e.g. for one image of a batch processed in phases
+@contextmanager
+def recording(rec: Recorder | None = None):
+    rec = rec or Recorder()
+    token = _current.set(rec)
+    try:
+        yield rec
+    finally:
+        _current.reset(token)
+
+@contextmanager
+def stage(name: str):
+    rec = _current.get()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        if rec is not None:
+            rec.add(name, time.perf_counter() - t0)
+
+def incr(name: str, n: int = 1):
+    rec = _current.get()
+    if rec is not None:
+        rec.incr(name, n)
@@ -0,0 +1,160 @@
+from __future__ import annotations
+import ast
+import hashlib
+import os
+import shutil
+import tempfile
+
+import cv2
+import numpy as np
+
+from core.settings import settings
+
+_PAD_VALUE = 114
+_MAX_WH = 7680  # class offset for batched per-class NMS, as in ultralytics
+_MAX_NMS = 30000
+
+class OnnxUnavailable(RuntimeError):
+    pass
+
+# numpy stand-ins for the parts of ultralytics Results the engine reads, so both backends share
+# _to_blocks: r.names, r.boxes.xyxy/.cls/.conf with .cpu().numpy()
+class _Array(np.ndarray):
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.view(np.ndarray)
+
+class OnnxBoxes:
+    def __init__(self, det: np.ndarray):
+        self.xyxy = det[:, :4].view(_Array)
+        self.conf = det[:, 4].view(_Array)
+        self.cls = det[:, 5].view(_Array)
+
+class OnnxResult:
+    def __init__(self, names: dict[int, str], det: np.ndarray, orig_shape: tuple[int, int]):
+        self.names = names
+        self.boxes = OnnxBoxes(det)
+        self.orig_shape = orig_shape
+
+# YOLOv8 detection model exported to ONNX, run by onnxruntime on CPU; accepts a list of images
+# and runs them as one batch when the export has a dynamic batch axis
+class OnnxYOLO:
+    def __init__(self, path: str):
+        try:
+            import onnxruntime as ort
+        except Exception as e:
+            raise OnnxUnavailable("onnxruntime is not installed. Install: pip install onnxruntime") from e
+        opts = ort.SessionOptions()
+        if settings.YOLO_ONNX_THREADS > 0:
+            opts.intra_op_num_threads = settings.YOLO_ONNX_THREADS
+        self.session = ort.InferenceSession(path, sess_options=opts, providers=["CPUExecutionProvider"])
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        self.fixed_batch = inp.shape[0] if isinstance(inp.shape[0], int) else 0
+        meta = self.session.get_modelmeta().custom_metadata_map
+        self.names = {int(k): str(v) for k, v in ast.literal_eval(meta.get("names", "{}")).items()}
+        size = inp.shape[2] if isinstance(inp.shape[2], int) else settings.YOLO_IMGSZ
+        self.imgsz = int(size)
+
+    def predict(self, source, verbose: bool = False) -> list[OnnxResult]:
+        imgs = source if isinstance(source, list) else [source]
+        step = self.fixed_batch or len(imgs) or 1
+        out = []
+        for i in range(0, len(imgs), step):
+            chunk = imgs[i:i + step]
+            batch, metas = zip(*(letterbox(img, self.imgsz) for img in chunk))
+            x = np.stack(batch)
+            if self.fixed_batch and len(chunk) < self.fixed_batch:
+                x = np.concatenate([x, np.zeros((self.fixed_batch - len(chunk), *x.shape[1:]), x.dtype)])
+            preds = self.session.run(None, {self.input_name: x})[0]
+            for img, pred, meta in zip(chunk, preds, metas):
+                det = postprocess(pred, meta, img.shape[:2], settings.YOLO_CONF, settings.YOLO_IOU,
+                                  settings.YOLO_MAX_DET)
+                out.append(OnnxResult(self.names, det, img.shape[:2]))
+        return out
+
+# BGR image -> (3xSxS float32 RGB in [0, 1], (gain, pad_x, pad_y)); ultralytics LetterBox geometry
+def letterbox(img: np.ndarray, size: int):
+    h, w = img.shape[:2]
+    gain = min(size / h, size / w)
+    nw, nh = int(round(w * gain)), int(round(h * gain))
+    dw, dh = (size - nw) / 2, (size - nh) / 2
+    top, left = int(round(dh - 0.1)), int(round(dw - 0.1))
+    if (nw, nh) != (w, h):
+        img = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    if img.ndim == 2:
+        img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    canvas = np.full((size, size, 3), _PAD_VALUE, dtype=np.uint8)
+    canvas[top:top + nh, left:left + nw] = img
+    x = canvas[:, :, ::-1].transpose(2, 0, 1).astype(np.float32) / 255.0
+    return np.ascontiguousarray(x), (gain, left, top)
+
+# raw (4 + classes, anchors) output -> (n, 6) [x1, y1, x2, y2, conf, cls] in image pixels
+def postprocess(pred: np.ndarray, meta, shape_hw, conf: float, iou: float, max_det: int) -> np.ndarray:
+    pred = pred.T
+    scores = pred[:, 4:]
+    cls = scores.argmax(1)
+    best = scores[np.arange(len(cls)), cls]
+    keep = best > conf
+    if not keep.any():
+        return np.zeros((0, 6), dtype=np.float32)
+    xywh, best, cls = pred[keep, :4], best[keep], cls[keep]
+    top = np.argsort(-best, kind="stable")[:_MAX_NMS]
+    xywh, best, cls = xywh[top], best[top], cls[top]
+
+    boxes = np.empty_like(xywh)
+    boxes[:, :2] = xywh[:, :2] - xywh[:, 2:] / 2
+    boxes[:, 2:] = xywh[:, :2] + xywh[:, 2:] / 2
+    idx = nms(boxes + (cls * _MAX_WH)[:, None], best, iou)[:max_det]
+    boxes, best, cls = boxes[idx], best[idx], cls[idx]
+
+    gain, pad_x, pad_y = meta
+    boxes[:, [0, 2]] = ((boxes[:, [0, 2]] - pad_x) / gain).clip(0, shape_hw[1])
+    boxes[:, [1, 3]] = ((boxes[:, [1, 3]] - pad_y) / gain).clip(0, shape_hw[0])
+    return np.column_stack([boxes, best, cls.astype(np.float32)]).astype(np.float32)
+
+# greedy IoU suppression, highest score first; returns kept indices in that order
+def nms(boxes: np.ndarray, scores: np.ndarray, iou: float) -> np.ndarray:
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        iw = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        ih = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = iw * ih
+        order = rest[inter / (areas[i] + areas[rest] - inter + 1e-9) <= iou]
+    return np.array(keep, dtype=np.int64)
+
+# .pt weights -> cached .onnx next to them (YOLO_ONNX_DIR), keyed by the weights' content and input
+# size; the export runs once in a private directory and is moved into place atomically, so
+# concurrent workers never see a partial file. .onnx weights are used as they are.
+def onnx_weights(path: str) -> str:
+    if path.lower().endswith(".onnx"):
+        return path
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    cache_dir = settings.YOLO_ONNX_DIR or os.path.join(os.path.dirname(path), "onnx")
+    stem = os.path.splitext(os.path.basename(path))[0]
+    out = os.path.join(cache_dir, f"{stem}-{h.hexdigest()[:16]}-{settings.YOLO_IMGSZ}.onnx")
+    if os.path.isfile(out):
+        return out
+
+    from ultralytics import YOLO
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix="onnx-export-", dir=cache_dir)
+    try:
+        src = shutil.copy(path, os.path.join(tmp, os.path.basename(path)))
+        exported = YOLO(src).export(format="onnx", imgsz=settings.YOLO_IMGSZ, dynamic=True, verbose=False)
+        os.replace(exported, out)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return out
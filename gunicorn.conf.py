@@ -0,0 +1,33 @@
+from __future__ import annotations
+# Pre-fork mode: gunicorn -c gunicorn.conf.py app.main:app
+# The master imports the app and loads the models once; workers share them copy-on-write.
+# Run from the app directory: gunicorn puts the working directory on sys.path before reading this file.
+import gc
+import os
+
+from core import prefork
+from core.settings import settings
+
+gc.disable()  # until the fork; re-enabled in each worker
+prefork.configure()
+
+chdir = os.path.dirname(os.path.abspath(__file__))
+pythonpath = chdir
+bind = "0.0.0.0:8000"
+workers = prefork.server_workers()
+worker_class = "app.gunicorn_worker.Worker"
+preload_app = settings.SERVER_PRELOAD
+# shutdown drains background jobs first (JOBS_DRAIN_TIMEOUT_S)
+graceful_timeout = int(settings.JOBS_DRAIN_TIMEOUT_S) + 10
+
+
+def when_ready(server):
+    if settings.SERVER_PRELOAD:
+        from app.main import TEMPLATES
+        prefork.preload(TEMPLATES)
+    else:
+        gc.enable()
+
+
+def post_fork(server, worker):
+    prefork.worker_init()
@@ -0,0 +1,24 @@
+from core.algorithm import graph_to_algorithm
+from core.graph_build import build_graph
+
+def test_decision_branches_and_unvisited():
+    nodes = [{"id": "s", "kind": "ellipse", "semantic": "start", "label": "Start"},
+             {"id": "d", "kind": "diamond", "label": "Ok?"},
+             {"id": "a", "kind": "rectangle", "label": "Yes"},
+             {"id": "b", "kind": "rectangle", "label": "No"},
+             {"id": "x", "kind": "rectangle", "label": ""}]
+    edges = [{"source": "s", "target": "d"}, {"source": "d", "target": "a"}, {"source": "d", "target": "b"},
+             {"source": "a", "target": "missing"}]
+    graph = build_graph(nodes, edges)
+    assert [(e["source"], e["target"]) for e in graph["edges"]] == [("s", "d"), ("d", "a"), ("d", "b")]
+    algo = graph_to_algorithm(graph)
+    assert algo["pseudocode"] == "- Start\nIF Ok?:\n  - Yes\nELSE:\n  - No\nEND_IF"
+    assert algo["steps"][1]["next"] == ["a", "b"]
+    assert algo["start"] == "s" and algo["unvisited"] == ["x"]
+
+def test_long_chain_does_not_recurse():
+    n = 5000
+    graph = {"nodes": [{"id": f"n{i}", "label": str(i)} for i in range(n)],
+             "edges": [{"source": f"n{i}", "target": f"n{i + 1}"} for i in range(n - 1)]}
+    algo = graph_to_algorithm(graph)
+    assert len(algo["steps"]) == n and algo["unvisited"] == []
@@ -0,0 +1,17 @@
+import numpy as np
+from bench.synth import make_diagram
+from core.algorithm import graph_to_algorithm
+
+def test_synthetic_diagram_is_deterministic():
+    a = make_diagram(n_nodes=10, width=800, height=600, label_words=3, swimlanes=2, seed=7)
+    b = make_diagram(n_nodes=10, width=800, height=600, label_words=3, swimlanes=2, seed=7)
+    assert np.array_equal(a.image, b.image)
+    assert [n.label for n in a.nodes] == [n.label for n in b.nodes]
+    assert a.nodes[0].label == "Start" and a.nodes[-1].label == "End"
+    assert {n.role for n in a.nodes} == {"Client", "Manager"}
+
+def test_synthetic_graph_traverses_every_node():
+    d = make_diagram(n_nodes=12, seed=1)
+    algo = graph_to_algorithm(d.graph())
+    assert algo["start"] == "n0"
+    assert algo["unvisited"] == []
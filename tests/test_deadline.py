@@ -0,0 +1,76 @@
+import os
+import time
+import cv2
+import numpy as np
+import pytest
+from core import ocr_cache as oc
+from core.deadline import Deadline, DeadlineExceeded
+from core.model_registry import ModelRegistry, _Entry
+from core.ocr import ocr_nodes
+from core.pipeline import parse_image_bytes
+
+def _slow_tesseract(calls, per_call=0.3):
+    # a tesseract that needs per_call seconds and is killed when the timeout it was given runs out
+    def run(img, lang, psm=6, backend=None, timeout=0):
+        calls.append(timeout)
+        if timeout and timeout < per_call:
+            time.sleep(timeout)
+            raise TimeoutError("Tesseract process timeout")
+        time.sleep(per_call)
+        return f"Label {len(calls)}"
+    return run
+
+def test_slow_ocr_returns_partial_result_at_the_deadline(monkeypatch):
+    monkeypatch.setattr(oc, "ocr_cache", oc.OcrCache(0))
+    calls = []
+    monkeypatch.setattr(oc, "image_to_string", _slow_tesseract(calls))
+    img = np.full((700, 1200, 3), 255, np.uint8)
+    for i, x in enumerate((100, 450, 800)):
+        cv2.rectangle(img, (x, 250), (x + 260, 390), (0, 0, 0), 4)
+        cv2.putText(img, f"Step {i}", (x + 40, 335), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 0), 2)
+    png = cv2.imencode(".png", img)[1].tobytes()
+
+    t0 = time.monotonic()
+    raw = parse_image_bytes(png, hard_timeout_s=0.8)
+    assert time.monotonic() - t0 < 1.3
+    assert raw["meta"]["truncated"] is True and raw["meta"]["truncated_stage"] == "ocr_nodes"
+    # every call got what was left of the budget; the labels read in time are kept
+    assert all(0 < t <= 0.8 for t in calls) and calls == sorted(calls, reverse=True)
+    labels = [n["label"] for n in raw["graph"]["nodes"]]
+    assert labels == ["Label 1", "Label 2", ""]
+
+def test_killed_tesseract_maps_to_deadline_and_keeps_earlier_labels(monkeypatch):
+    monkeypatch.setattr(oc, "ocr_cache", oc.OcrCache(0))
+    results = iter(["Yes", TimeoutError("Tesseract process timeout")])
+
+    def run(img, lang, psm=6, backend=None, timeout=0):
+        r = next(results)
+        if isinstance(r, Exception):
+            raise r
+        return r
+
+    monkeypatch.setattr(oc, "image_to_string", run)
+    img = np.full((200, 400, 3), 255, np.uint8)
+    img[40:60, 30:90] = 0
+    img[140:160, 250:310] = 0
+    nodes = [{"id": "n0", "kind": "rectangle", "bbox": [10, 20, 120, 80]},
+             {"id": "n1", "kind": "rectangle", "bbox": [225, 115, 335, 185]}]
+    with pytest.raises(DeadlineExceeded) as e:
+        ocr_nodes(img, nodes, deadline=Deadline(10.0))
+    assert e.value.stage == "ocr_nodes"
+    assert [n["label"] for n in nodes] == ["Yes", ""]
+
+def test_waiting_for_a_busy_model_counts_against_the_deadline(tmp_path):
+    path = str(tmp_path / "best.pt")
+    open(path, "wb").close()
+    reg = ModelRegistry()
+    ent = reg._entries[os.path.abspath(path)] = _Entry(os.path.abspath(path), os.stat(path).st_mtime, object())
+    ent.lock.acquire()  # another request is predicting
+    try:
+        t0 = time.monotonic()
+        with pytest.raises(DeadlineExceeded) as e:
+            reg.predict(np.zeros((8, 8, 3), np.uint8), path=path, deadline=Deadline(0.2))
+        assert e.value.stage == "yolo_predict"
+        assert 0.15 < time.monotonic() - t0 < 1.0
+    finally:
+        ent.lock.release()
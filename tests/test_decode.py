@@ -0,0 +1,29 @@
+import cv2
+import numpy as np
+from fastapi.testclient import TestClient
+from app.main import app
+from core.decode import decode_image, probe_image
+from core.settings import settings
+
+client = TestClient(app)
+
+def _encode(ext, w, h):
+    return cv2.imencode(ext, np.full((h, w, 3), 255, np.uint8))[1].tobytes()
+
+def test_probe_reads_dimensions_from_header():
+    for ext, fmt in ((".png", "png"), (".jpg", "jpeg"), (".webp", "webp")):
+        assert probe_image(_encode(ext, 321, 123)) == (fmt, 321, 123)
+    assert probe_image(b"not an image") is None
+
+def test_large_jpeg_is_decoded_at_reduced_scale():
+    assert decode_image(_encode(".jpg", 7400, 3000)).shape[:2] == (750, 1850)
+
+def test_oversized_upload_is_rejected_with_413(monkeypatch):
+    monkeypatch.setattr(settings, "PARSE_EXECUTOR", "inline")
+    monkeypatch.setattr(settings, "RESULT_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "MAX_IMAGE_PIXELS", 1000)
+    r = client.post("/v1/parse", files={"file": ("a.png", _encode(".png", 100, 100), "image/png")})
+    assert r.status_code == 413
+    monkeypatch.setattr(settings, "MAX_UPLOAD_BYTES", 10)
+    r = client.post("/v1/parse", files={"file": ("a.png", _encode(".png", 10, 10), "image/png")})
+    assert r.status_code == 413
@@ -0,0 +1,23 @@
+from core import eval as eval_mod
+from core.eval import evaluate_predictions
+
+GT = {"a.png": [{"description": "create order", "role": "Client"}, {"description": "create order form", "role": ""}]}
+# the first prediction is a decent match for both steps; greedy spends the better one on it
+PREDS = {"a.png": [{"action": "create order f", "role": "Client"}, {"action": "create order", "role": ""}]}
+
+def test_optimal_matching_is_order_independent():
+    greedy = evaluate_predictions(PREDS, GT)
+    optimal = evaluate_predictions(PREDS, GT, match="optimal")
+    flipped = evaluate_predictions({"a.png": PREDS["a.png"][::-1]}, GT, match="optimal")
+    assert optimal["summary"]["avg_match_score"] > greedy["summary"]["avg_match_score"]
+    for k in ("step_f1@70", "avg_match_score", "role_accuracy@70"):
+        assert optimal["summary"][k] == flipped["summary"][k]
+    assert optimal["summary"]["step_f1@70"] == 1.0
+
+def test_worker_processes_score_like_a_single_process(monkeypatch):
+    monkeypatch.setattr(eval_mod, "_PARALLEL_MIN_PAIRS", 0)
+    preds = {f"{i}.png": PREDS["a.png"][i % 2:] for i in range(6)}
+    gt = {f"{i}.png": GT["a.png"] for i in range(6)}
+    for match in ("greedy", "optimal"):
+        assert evaluate_predictions(preds, gt, match=match, workers=2) == \
+            evaluate_predictions(preds, gt, match=match, workers=1)
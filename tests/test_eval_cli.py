@@ -0,0 +1,43 @@
+from core import eval_cli
+
+def test_eval_cli_reuses_predictions_and_scores(tmp_path, monkeypatch):
+    for name in ("a.png", "b.png"):
+        (tmp_path / name).write_bytes(name.encode())
+    gt = tmp_path / "gt.txt"
+    gt.write_text("### a.png\n1. Create order | Client\n### b.png\n1. Send invoice\n", encoding="utf-8")
+    calls = []
+
+    def fake_predict(path, engine, hard_timeout_s):
+        calls.append(path)
+        return [{"step": 1, "action": "Create order", "role": "Client"}], 1.0, False
+
+    monkeypatch.setattr(eval_cli, "_predict", fake_predict)
+    store = str(tmp_path / "store.sqlite")
+    first = eval_cli.run(str(tmp_path), str(gt), store_path=store, workers=1)
+    assert (first["meta"]["parsed"], first["meta"]["rescored"]) == (2, 2)
+    assert first["summary"]["step_recall"] == 0.5
+
+    gt.write_text("### a.png\n1. Create order | Client\n### b.png\n1. Create order\n", encoding="utf-8")
+    second = eval_cli.run(str(tmp_path), str(gt), store_path=store, workers=1)
+    assert len(calls) == 2
+    assert (second["meta"]["reused"], second["meta"]["rescored"]) == (2, 1)
+    assert second["summary"]["step_recall"] == 1.0
+
+def test_predict_batch_isolates_failures_per_file(tmp_path, monkeypatch):
+    from core import pipeline
+
+    for name in ("a.png", "b.png"):
+        (tmp_path / name).write_bytes(name.encode())
+    graph = {"nodes": [], "edges": []}
+
+    def fake_batch(datas, hard_timeout_s, engine):
+        assert datas == [b"a.png", b"b.png"]
+        return [{"graph": graph, "algorithm": {"steps": []}, "meta": {"timings": {"total": 5.0}}},
+                {"graph": None, "algorithm": None, "meta": {}}]
+
+    monkeypatch.setattr(pipeline, "parse_image_batch", fake_batch)
+    paths = [str(tmp_path / "a.png"), str(tmp_path / "missing.png"), str(tmp_path / "b.png")]
+    rows = eval_cli._predict_batch(paths, "yolo_bpmn", 20.0)
+    assert rows[0][1:] == (5.0, False, "")
+    assert rows[1][0] is None and rows[1][3].startswith("FileNotFoundError")
+    assert rows[2][0] is None and rows[2][3]
@@ -0,0 +1,82 @@
+import asyncio
+import os
+import cv2
+import numpy as np
+import pytest
+from core import executor
+from core.settings import settings
+from core.model_registry import yolo_registry
+
+# blank pages parse without tesseract; the last upload fails to decode in the worker
+DATAS = [cv2.imencode(".png", np.full((h, w, 3), 255, np.uint8))[1].tobytes() for h, w in [(120, 200), (90, 160)]]
+DATAS.append(b"not an image")
+
+def _segments():
+    return {n for n in os.listdir("/dev/shm") if n.startswith("psm_")}
+
+def _strip(raw):
+    if isinstance(raw, Exception):
+        return repr(raw)
+    raw = dict(raw, meta=dict(raw["meta"]))
+    raw["meta"].pop("timings")
+    return raw
+
+async def _parse_all():
+    one = []
+    for data in DATAS:
+        try:
+            one.append(await executor.run_parse(data))
+        except Exception as e:
+            one.append(e)
+    return [_strip(r) for r in one], [_strip(r) for r in await executor.run_parse_many(DATAS)]
+
+@pytest.fixture
+def mode(monkeypatch):
+    monkeypatch.setattr(settings, "RESULT_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "PARSE_WORKERS", 1)
+    monkeypatch.setattr(settings, "PARSE_MP_CONTEXT", "spawn")
+
+    def use(name):
+        executor.shutdown_executor()
+        monkeypatch.setattr(settings, "PARSE_EXECUTOR", name)
+    yield use
+    executor.shutdown_executor()
+
+def test_thread_and_process_pools_match_inline(mode):
+    mode("inline")
+    one, many = asyncio.run(_parse_all())
+    assert one == many
+    assert one[2] == repr(RuntimeError("Could not decode image."))
+
+    before = _segments()
+    for name in ("thread", "process"):
+        mode(name)
+        assert asyncio.run(_parse_all()) == (one, many)
+    # the failed upload raised in the spawned worker; every block is unlinked by the parent
+    assert _segments() <= before
+
+def test_crashed_worker_restarts_pool_and_failed_reload_keeps_it(mode, tmp_path):
+    mode("process")
+    before = _segments()
+
+    async def crash():
+        executor._get_pool().submit(os._exit, 1)
+        await asyncio.sleep(1.0)
+        with pytest.raises(RuntimeError, match="Parse worker crashed"):
+            await executor.run_parse(DATAS[0])
+        return await executor.run_parse(DATAS[0])
+
+    assert asyncio.run(crash())["graph"] == {"nodes": [], "edges": []}
+    assert _segments() <= before
+
+    pool = executor._get_pool()
+    with pytest.raises(FileNotFoundError):
+        executor.reload_models(str(tmp_path / "missing.pt"))
+    weights = tmp_path / "broken.pt"
+    weights.write_bytes(b"not a model")
+    with pytest.raises(Exception):
+        executor.reload_models(str(weights))
+    # the new pool could not load the weights: requests keep going to the old one
+    assert executor._state["pool"] is pool
+    assert yolo_registry.active_path != str(weights)
+    assert asyncio.run(executor.run_parse(DATAS[1]))["graph"]["nodes"] == []
@@ -7,3 +7,14 @@ def test_health():
     r = client.get("/health")
     assert r.status_code == 200
     assert r.json()["status"] == "ok"
+    assert "ready" in r.json()["models"]["yolo"]
+
+def test_reload_rejects_outside_model_dir():
+    r = client.post("/v1/models/reload", params={"weights": "../core/settings.py"})
+    assert r.status_code == 400
+
+def test_metrics_prometheus_text():
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    assert "# TYPE diagram_parse_duration_seconds histogram" in r.text
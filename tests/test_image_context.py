@@ -0,0 +1,41 @@
+import cv2
+import numpy as np
+from core.image_context import ImageContext
+from core.decode import decode_for_detection, detect_max_side
+from core.preprocess import preprocess_context
+from core.settings import settings
+
+def test_masked_matches_rectangle_fill_and_reuses_buffer():
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 256, (120, 160, 3), dtype=np.uint8)
+    ctx = ImageContext(img)
+    boxes = [(10, 10, 40, 30), (150, 100, 159, 119)]
+
+    ref = ctx.otsu_inv.copy()
+    for x1, y1, x2, y2 in boxes:
+        cv2.rectangle(ref, (max(0, x1 - 6), max(0, y1 - 6)), (min(159, x2 + 6), min(119, y2 + 6)), 0, thickness=-1)
+    ref = cv2.morphologyEx(ref, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3)), iterations=2)
+
+    first = ctx.masked("otsu_inv", boxes, pad=6)
+    assert np.array_equal(first, ref)
+    assert ctx.masked("otsu_inv", [], pad=6) is first
+    assert ctx.gray is ctx.gray and np.array_equal(ctx.gray, cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+
+def test_ocr_crops_come_from_lazily_decoded_source(monkeypatch):
+    monkeypatch.setattr(settings, "DETECT_MAX_SIDE", 1024)
+    img = np.full((2000, 4000, 3), 255, np.uint8)
+    cv2.rectangle(img, (1000, 400), (1399, 599), (0, 0, 0), -1)
+    data = cv2.imencode(".jpg", img)[1].tobytes()
+
+    small, source, size = decode_for_detection(data)
+    assert max(small.shape[:2]) < 4000 and size == (4000, 2000)
+    loads = []
+    ctx = preprocess_context(small, detect_max_side(), lambda: loads.append(1) or source(), size)
+    assert ctx.shape == (512, 1024) and ctx.scale == 1024 / 1800
+    assert ctx.coords() == {"space": "detection", "scale": 0.256, "width": 1024, "height": 512}
+    assert not loads
+
+    crop = ctx.source_crop(256, 102, 358, 153)
+    assert loads == [1] and abs(crop.shape[0] - 200) <= 4 and abs(crop.shape[1] - 400) <= 4 and crop.mean() < 10
+    ctx.source_crop(0, 0, 10, 10)
+    assert loads == [1]
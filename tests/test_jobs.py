@@ -0,0 +1,68 @@
+import asyncio
+import time
+from fastapi.testclient import TestClient
+from app.main import app
+from core.settings import settings
+from core.jobs import JobRunner, JobStore
+
+def _wait(c, job_id):
+    for _ in range(100):
+        job = c.get(f"/v1/jobs/{job_id}").json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job still {job['status']}")
+
+def test_parse_job_runs_in_background_and_keeps_result(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "PARSE_EXECUTOR", "inline")
+    monkeypatch.setattr(settings, "RESULT_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "JOBS_PATH", str(tmp_path / "jobs.sqlite"))
+    monkeypatch.setattr(settings, "JOBS_POLL_S", 0.05)
+    files = [("files", ("bad.png", b"not a png", "image/png")),
+             ("files", ("notes.txt", b"hello", "text/plain"))]
+    with TestClient(app) as c:
+        r = c.post("/v1/jobs", params={"kind": "parse"}, files=files)
+        assert r.status_code == 202
+        job = r.json()
+        assert job["status"] in ("queued", "running", "done") and job["progress"]["total"] == 2
+
+        job = _wait(c, job["id"])
+        assert job["status"] == "done" and job["progress"] == {"done": 2, "total": 2}
+        out = c.get(job["result_url"]).json()
+        assert out["meta"]["count"] == 2
+        assert [x["file"] for x in out["results"]] == ["bad.png", "notes.txt"]
+        assert out["results"][1]["error"] == "unsupported_type"
+
+        assert c.get("/v1/jobs/missing").status_code == 404
+        r = c.post("/v1/jobs", params={"kind": "evaluate"}, files=files)
+        assert r.status_code == 400
+
+def test_slow_job_is_not_requeued_while_its_runner_is_alive(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "JOBS_PATH", str(tmp_path / "jobs.sqlite"))
+    monkeypatch.setattr(settings, "JOBS_POLL_S", 0.02)
+    monkeypatch.setattr(settings, "JOBS_STALE_S", 0.2)
+    monkeypatch.setattr(settings, "JOBS_WORKERS", 2)
+
+    async def slow(job, files, progress):
+        for i in range(len(files)):
+            await asyncio.sleep(0.3)
+            other.sweep()  # another process sweeping the shared file
+            progress(i + 1)
+        return {"ok": True}
+
+    async def main():
+        runner = JobRunner({"parse": slow})
+        runner.start()
+        job = await runner.submit("parse", {}, [("a.png", b"x"), ("b.png", b"y")])
+        for _ in range(200):
+            job = runner.store.get(job["id"])
+            if job["status"] == "done":
+                break
+            await asyncio.sleep(0.02)
+        await runner.stop()
+        return job
+
+    other = JobStore(settings.JOBS_PATH)
+    job = asyncio.run(main())
+    other.close()
+    assert job["status"] == "done" and job["attempts"] == 1
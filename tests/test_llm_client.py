@@ -0,0 +1,89 @@
+import asyncio
+import json
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from core.llm_client import LLMClient, LLMError
+from core.settings import settings
+
+RAW = {"graph": {"nodes": [{"id": "n0", "label": "Start"}], "edges": []}, "algorithm": {}, "output": {}}
+
+def _fake_openai(fail_first: int = 0):
+    app = FastAPI()
+    state = {"calls": 0}
+
+    @app.post("/v1/chat/completions")
+    async def chat(req: Request):
+        state["calls"] += 1
+        body = await req.json()
+        assert req.headers["authorization"] == "Bearer test"
+        if state["calls"] <= fail_first:
+            return JSONResponse({"error": "busy"}, status_code=503)
+        content = json.dumps({"steps": [{"action": body["model"]}]})
+        return {"choices": [{"message": {"content": content}}]}
+
+    return app, state
+
+def _configure(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_ENABLED", True)
+    monkeypatch.setattr(settings, "LLM_API_KEY", "test")
+    monkeypatch.setattr(settings, "LLM_BASE_URL", "http://llm.test/v1")
+    monkeypatch.setattr(settings, "LLM_RETRY_BACKOFF_S", 0.01)
+
+def test_llm_client_caches_identical_payloads(monkeypatch):
+    _configure(monkeypatch)
+    app, state = _fake_openai()
+    client = LLMClient(transport=httpx.ASGITransport(app=app))
+
+    async def run():
+        try:
+            return await asyncio.gather(*[client.refine_steps(RAW) for _ in range(3)]), \
+                await client.refine_steps(RAW)
+        finally:
+            await client.aclose()
+
+    first, again = asyncio.run(run())
+    assert again == {"steps": [{"action": settings.LLM_MODEL, "role": ""}], "notes": ""}
+    assert client.stats()["cache_hits"] >= 1
+    assert state["calls"] == 1
+
+def test_llm_client_retries_within_budget(monkeypatch):
+    _configure(monkeypatch)
+    app, state = _fake_openai(fail_first=1)
+    client = LLMClient(transport=httpx.ASGITransport(app=app))
+    assert asyncio.run(client.refine_steps(RAW))["steps"][0]["action"] == settings.LLM_MODEL
+    assert state["calls"] == 2 and client.stats()["retries"] == 1
+
+    monkeypatch.setattr(settings, "LLM_RETRIES", 0)
+    app, state = _fake_openai(fail_first=5)
+    client = LLMClient(transport=httpx.ASGITransport(app=app))
+    try:
+        asyncio.run(client.refine_steps(RAW))
+        assert False, "expected LLMError"
+    except LLMError as e:
+        assert "503" in str(e)
+
+def test_llm_client_packed_batch_isolates_files(monkeypatch):
+    _configure(monkeypatch)
+    monkeypatch.setattr(settings, "LLM_BATCH_MODE", "packed")
+    app = FastAPI()
+    bodies = []
+
+    @app.post("/v1/chat/completions")
+    async def chat(req: Request):
+        body = await req.json()
+        bodies.append(body)
+        user = body["messages"][1]["content"]
+        if "results" not in body["messages"][0]["content"]:
+            return JSONResponse({"error": "down"}, status_code=400)
+        diagrams = json.loads(user[user.index("{"):])
+        # answer only the first diagram; the other one must fail on its own
+        content = json.dumps({"results": {"d0": {"steps": [{"action": diagrams["d0"]["nodes"][0][2]}]}}})
+        return {"choices": [{"message": {"content": content}}]}
+
+    client = LLMClient(transport=httpx.ASGITransport(app=app))
+    other = {"graph": {"nodes": [{"id": "x", "label": "Other", "bbox": [0, 0, 9, 9]}], "edges": []}}
+    ok, failed = asyncio.run(client.refine_many([RAW, other]))
+    assert ok["steps"] == [{"action": "Start", "role": ""}]
+    assert isinstance(failed, LLMError)
+    assert "bbox" not in bodies[0]["messages"][1]["content"]
@@ -0,0 +1,53 @@
+import pytest
+from core import ocr_backend as ob
+
+class _Fake:
+    name = "pytesseract"
+    closed = 0
+
+    def __init__(self, lang, psm):
+        self.lang, self.psm = lang, psm
+
+    def close(self):
+        _Fake.closed += 1
+
+def _no_tesserocr(lang, psm):
+    raise ImportError("No module named 'tesserocr'")
+
+def test_checkout_reuses_handles_up_to_size(monkeypatch):
+    monkeypatch.setattr(ob, "PytesseractEngine", _Fake)
+    monkeypatch.setattr(_Fake, "closed", 0)
+    pool = ob.EnginePool(1)
+    with pool.checkout("eng", 6, "pytesseract") as a:
+        pass
+    with pool.checkout("eng", 6, "pytesseract") as b:
+        assert b is a  # idle handle reused
+        with pool.checkout("eng", 6, "pytesseract") as c:
+            assert c is not a  # busy: a second handle
+    # only `size` handles are kept idle, the extra one is closed on return
+    assert _Fake.closed == 1 and pool.status()["created"] == 2
+    with pool.checkout("eng", 3, "pytesseract") as d:
+        assert d is not a and d.psm == 3  # keyed by (backend, lang, psm)
+    pool.close()
+    assert _Fake.closed == 3 and pool.status()["idle"] == {}
+
+def test_auto_falls_back_but_explicit_tesserocr_fails(monkeypatch):
+    monkeypatch.setattr(ob, "PytesseractEngine", _Fake)
+    monkeypatch.setattr(ob, "TesserocrEngine", _no_tesserocr)
+    monkeypatch.setattr(ob, "_tesserocr_ok", True)  # importable, but the engine cannot start
+    monkeypatch.setattr(ob.settings, "OCR_BACKEND", "auto")
+    pool = ob.EnginePool(2)
+    with pool.checkout("eng", 6) as e:
+        assert isinstance(e, _Fake)
+    assert pool.status()["fallbacks"] == 1
+
+    with pytest.raises(RuntimeError, match="tesserocr backend unavailable"):
+        with pool.checkout("eng", 6, "tesserocr"):
+            pass
+    assert pool.status()["fallbacks"] == 1
+
+    monkeypatch.setattr(ob, "_tesserocr_ok", False)
+    monkeypatch.setattr(ob.settings, "OCR_MODE", "api")
+    assert ob.status()["ready"] is False
+    monkeypatch.setattr(ob.settings, "OCR_MODE", "node")
+    assert ob.status() == {"mode": "node", "backend": "pytesseract", "tesserocr": False, "ready": True}
@@ -0,0 +1,22 @@
+import numpy as np
+from core import ocr_cache as oc
+from core.ocr import ocr_nodes
+from core.timings import recording
+
+def _label_image():
+    img = np.full((200, 400, 3), 255, np.uint8)
+    img[40:60, 30:90] = 0    # same "glyphs" in two boxes at different offsets
+    img[140:160, 250:310] = 0
+    return img
+
+def test_identical_crops_skip_ocr(monkeypatch):
+    calls = []
+    monkeypatch.setattr(oc, "image_to_string", lambda img, lang, **kw: calls.append(img.shape) or "Yes")
+    monkeypatch.setattr(oc, "ocr_cache", oc.OcrCache(16))
+    nodes = [{"id": "n0", "kind": "rectangle", "bbox": [10, 20, 120, 80]},
+             {"id": "n1", "kind": "rectangle", "bbox": [225, 115, 335, 185]}]
+    with recording() as rec:
+        out = ocr_nodes(_label_image(), [dict(n) for n in nodes])
+    assert [n["label"] for n in out] == ["Yes", "Yes"]
+    assert len(calls) == 1
+    assert rec.counters == {"ocr_cache_miss": 1, "ocr_cache_hit": 1}
@@ -0,0 +1,65 @@
+import numpy as np
+from core import ocr
+from core import ocr_cache as oc
+from core.image_context import ImageContext
+
+def _node(i, bbox, kind="rectangle"):
+    return {"id": f"n{i}", "kind": kind, "bbox": bbox}
+
+def test_page_mode_gives_each_word_to_smallest_node_containing_its_centre(monkeypatch):
+    monkeypatch.setattr(ocr.settings, "OCR_MODE", "page")
+    monkeypatch.setattr(ocr, "text_scale", lambda ink: 2.0)
+    seen = []
+
+    def words(img, lang, psm, timeout):
+        seen.append(img.shape)
+        # (left, top, w, h, text) in the 2x page
+        return [(420, 420, 40, 20, "inner"), (120, 120, 60, 20, "outer"), (1500, 1500, 40, 20, "nowhere")]
+
+    monkeypatch.setattr(ocr, "image_to_words", words)
+    img = np.full((1000, 1000, 3), 255, np.uint8)
+    nodes = [_node(0, [20, 20, 600, 600]), _node(1, [180, 180, 280, 280])]
+    out = ocr.ocr_nodes(img, nodes)
+    assert seen == [(2000, 2000)]
+    assert [n["label"] for n in out] == ["outer", "inner"]
+
+    # a page that would grow past the limit is read from crops instead
+    monkeypatch.setattr(ocr, "_PAGE_MAX_PIXELS", 3_000_000)
+    called = []
+    monkeypatch.setattr(ocr, "_ocr_mosaic", lambda ctx, nodes, lang, texts, deadline: called.append(len(nodes)))
+    ocr.ocr_nodes(img, [dict(n) for n in nodes])
+    assert called == [2] and seen == [(2000, 2000)]
+
+def test_mosaic_splits_strips_and_maps_words_back(monkeypatch):
+    monkeypatch.setattr(ocr.settings, "OCR_MODE", "mosaic")
+    monkeypatch.setattr(ocr, "_MOSAIC_MAX_H", 300)
+    monkeypatch.setattr(oc, "ocr_cache", oc.OcrCache(16))
+    monkeypatch.setattr(ocr, "ocr_cache", oc.ocr_cache)
+    # crop i is filled with gray value 10 * (i + 1), so words can be traced back to their crop
+    heights = [100, 120, 90, 60]
+
+    def crop(ctx, bbox):
+        i = bbox[0] // 10
+        return np.full((heights[i], 80), 10 * (i + 1), np.uint8)
+
+    monkeypatch.setattr(ocr, "_prep_crop", crop)
+    cached = ocr.crop_key(np.full((heights[3], 80), 40, np.uint8), ocr.default_lang(), 6)
+    oc.ocr_cache.put(cached, "from cache")
+    strips = []
+
+    def words(canvas, lang, psm, timeout):
+        values = sorted(set(np.unique(canvas).tolist()) - {255})
+        strips.append(values)
+        out = []
+        for v in values:
+            rows = np.flatnonzero((canvas == v).any(axis=1))
+            out.append((50, int(rows[0]) + 10, 30, 20, f"v{v}"))
+        return out
+
+    monkeypatch.setattr(ocr, "image_to_words", words)
+    img = np.full((50, 50, 3), 255, np.uint8)
+    nodes = [_node(i, [10 * i, 0, 10 * i + 5, 5]) for i in range(4)]
+    out = ocr.ocr_nodes(img, nodes, ctx=ImageContext(img))
+    # 100 + 120 + gaps fit under 300, the third crop starts a new strip; the cached fourth is never sent
+    assert strips == [[10, 20], [30]]
+    assert [n["label"] for n in out] == ["v10", "v20", "v30", "from cache"]
@@ -0,0 +1,20 @@
+import cv2
+import numpy as np
+from core.image_context import ImageContext
+from core.ocr import _prep_crop, text_scale
+
+def _text(height_px: int, shape=(300, 900)):
+    img = np.full((*shape, 3), 255, np.uint8)
+    scale = height_px / cv2.getTextSize("H", cv2.FONT_HERSHEY_SIMPLEX, 1.0, 1)[0][1]
+    cv2.putText(img, "Hello World", (20, shape[0] // 2), cv2.FONT_HERSHEY_SIMPLEX, scale, (0, 0, 0), 2)
+    return img
+
+def test_crop_scale_follows_glyph_height():
+    small = ImageContext(_text(10))
+    big = ImageContext(_text(60))
+    box = [0, 0, 900, 300]
+    assert text_scale(cv2.bitwise_not(cv2.threshold(small.gray, 127, 255, cv2.THRESH_BINARY)[1])) > 1.2
+    assert _prep_crop(big, box).shape[1] < 900 < _prep_crop(small, box).shape[1]
+
+def test_blank_crop_skips_ocr():
+    assert _prep_crop(ImageContext(np.full((100, 200, 3), 250, np.uint8)), [0, 0, 200, 100]) is None
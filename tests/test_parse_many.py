@@ -0,0 +1,23 @@
+import json
+from fastapi.testclient import TestClient
+from app.main import app
+from core.settings import settings
+
+client = TestClient(app)
+
+FILES = [("files", ("a.txt", b"x", "text/plain")), ("files", ("b.png", b"garbage", "image/png"))]
+
+def test_parse_many_isolates_errors(monkeypatch):
+    monkeypatch.setattr(settings, "PARSE_EXECUTOR", "inline")
+    r = client.post("/v1/parse_many", files=FILES)
+    assert r.status_code == 200
+    assert [x["error"] for x in r.json()["results"]] == ["unsupported_type", "Could not decode image."]
+
+def test_parse_many_stream_ndjson(monkeypatch):
+    monkeypatch.setattr(settings, "PARSE_EXECUTOR", "inline")
+    r = client.post("/v1/parse_many", params={"stream": "true"}, files=FILES)
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(l) for l in r.text.splitlines()]
+    assert sorted(l["index"] for l in lines[:-1]) == [0, 1]
+    assert lines[-1]["summary"]["count"] == 2
+    assert lines[-1]["summary"]["errors"] == 2
@@ -0,0 +1,38 @@
+import os
+from core import prefork
+from core.settings import settings
+from core.result_cache import ResultCache
+
+def test_thread_budget_splits_cores_between_workers(monkeypatch):
+    env = {k: v for k, v in os.environ.items() if k not in prefork._THREAD_VARS}
+    env["MKL_NUM_THREADS"] = "3"
+    monkeypatch.setattr(os, "environ", env)
+    monkeypatch.setattr(os, "cpu_count", lambda: 16)
+    for name, value in [("SERVER_WORKERS", 4), ("SERVER_THREADS", 0), ("PARSE_EXECUTOR", "process"),
+                        ("PARSE_WORKERS", 2), ("YOLO_ONNX_THREADS", 0), ("TILE_WORKERS", 0)]:
+        monkeypatch.setattr(settings, name, value)
+    fields_set = settings.model_fields_set - {"PARSE_EXECUTOR"}
+    monkeypatch.setattr(settings, "__pydantic_fields_set__", fields_set)
+
+    prefork.configure()
+    assert settings.PARSE_EXECUTOR == "thread"
+    assert (settings.PARSE_WORKERS, settings.YOLO_ONNX_THREADS, settings.TILE_WORKERS) == (2, 2, 2)
+    assert env["OMP_NUM_THREADS"] == "2" and env["MKL_NUM_THREADS"] == "3"
+
+    monkeypatch.setattr(settings, "PARSE_WORKERS", 0)
+    prefork.configure()
+    assert settings.PARSE_WORKERS == 4 and prefork.intra_threads() == 1
+
+    # set in the environment in any case (Settings is case-insensitive) or explicitly: kept
+    monkeypatch.setattr(settings, "PARSE_EXECUTOR", "process")
+    prefork.configure()
+    assert settings.PARSE_EXECUTOR == "process"
+
+def test_result_cache_reconnects_in_forked_worker(monkeypatch, tmp_path):
+    c = ResultCache(max_bytes=1024, path=str(tmp_path / "r.sqlite"))
+    c.put("k", {"a": 1})
+    parent = c._db
+    monkeypatch.setattr(os, "getpid", lambda: -1)
+    c._mem.clear()
+    assert c.get("k") == ({"a": 1}, "disk")
+    assert c._db is not parent
@@ -0,0 +1,42 @@
+from core.settings import settings
+from core.result_cache import ResultCache, engine_version
+
+def test_memory_lru_evicts_by_size():
+    c = ResultCache(max_bytes=60)
+    c.put("a", {"v": "x" * 20})
+    c.put("b", {"v": "y" * 20})
+    assert c.get("a")[1] == "memory"
+    c.put("c", {"v": "z" * 20})
+    assert c.get("b") == (None, "miss")
+    assert c.get("a")[0] == {"v": "x" * 20}
+    assert c.stats()["evictions"] == 1
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    ResultCache(max_bytes=1024, path=path).put("k", {"meta": {}, "graph": {"nodes": []}})
+    c = ResultCache(max_bytes=1024, path=path)
+    assert c.get("k") == ({"meta": {}, "graph": {"nodes": []}}, "disk")
+    assert c.get("k")[1] == "memory"
+    assert c.stats()["hits_disk"] == 1
+
+def test_engine_version_tracks_output_settings(monkeypatch):
+    for engine, name, value in [("cv", "ARROW_MATCH_METRIC", "edge"), ("cv", "DECODE_REDUCED", False),
+                                ("yolo_bpmn", "YOLO_MAX_DET", 10)]:
+        before = engine_version(engine)
+        monkeypatch.setattr(settings, name, value)
+        assert engine_version(engine) != before
+
+def test_disk_size_total_is_shared_and_bounds_the_file(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    a = ResultCache(max_bytes=0, path=path, disk_max_bytes=100)
+    b = ResultCache(max_bytes=0, path=path, disk_max_bytes=100)
+    a.put("x", {"v": "x" * 30})
+    b.put("y", {"v": "y" * 30})
+    b.put("y", {"v": "y" * 10})  # replaced, not counted twice
+    size = lambda: a._conn().execute("SELECT bytes, (SELECT SUM(size) FROM results) FROM usage").fetchone()
+    assert size() == (58, 58)
+    a.put("z", {"v": "z" * 60})  # over the limit: the least recently used entry goes
+    assert a.get("x") == (None, "miss") and b.get("y")[1] == "disk"
+    assert size() == (88, 88)
+    b.clear()
+    assert size() == (0, None)
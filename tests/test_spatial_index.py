@@ -0,0 +1,27 @@
+import numpy as np
+from core.spatial_index import BoxIndex
+
+def _nearest_loop(pt, centers, max_dist):
+    best, best_d = None, 1e18
+    for i, (cx, cy) in enumerate(centers):
+        d = (cx - pt[0]) ** 2 + (cy - pt[1]) ** 2
+        if d < best_d:
+            best_d, best = d, i
+    if best is None or best_d ** 0.5 > max_dist:
+        return -1
+    return best
+
+def test_center_metric_matches_python_loop():
+    rng = np.random.default_rng(0)
+    xy = rng.integers(0, 1500, size=(40, 2))
+    boxes = np.concatenate([xy, xy + rng.integers(20, 200, size=(40, 2))], axis=1)
+    centers = [((x1 + x2) // 2, (y1 + y2) // 2) for x1, y1, x2, y2 in boxes]
+    pts = rng.integers(0, 1700, size=(500, 2))
+    got = BoxIndex(boxes, centers).nearest(pts, max_dist=120)
+    assert got.tolist() == [_nearest_loop(p, centers, 120) for p in pts]
+
+def test_edge_metric_prefers_touched_box():
+    idx = BoxIndex([[0, 0, 1000, 100], [900, 40, 960, 60]])
+    assert idx.nearest([[100, 105]], max_dist=20, metric="center").tolist() == [-1]
+    assert idx.nearest([[100, 105]], max_dist=20, metric="edge").tolist() == [0]
+    assert idx.nearest([[930, 50]], max_dist=20, metric="edge").tolist() == [1]
@@ -0,0 +1,35 @@
+import random
+from rapidfuzz import fuzz
+from core.text_utils import dedupe_steps, normalize_step_text
+
+def _pairwise(texts, threshold=92):
+    # the loop dedupe_steps replaced
+    out = []
+    for t in texts:
+        t = normalize_step_text(t)
+        if not t:
+            continue
+        if any(fuzz.token_sort_ratio(t.lower(), x.lower()) >= threshold for x in out):
+            continue
+        out.append(t)
+    return out
+
+def test_dedupe_matches_pairwise_loop():
+    labels = ["Create order", "create  order", "Create orders", "Order create", "Send invoice",
+              "Send invoices", "Approve request", "", "  ", "Reject request", "Check stock", "Check stocks"]
+    for threshold in (0, 50, 75, 92, 100, 101):
+        assert dedupe_steps(labels, threshold) == _pairwise(labels, threshold)
+    assert dedupe_steps([]) == [] and dedupe_steps(["", " \n"]) == []
+
+    # exactly on the threshold counts as a duplicate
+    assert fuzz.token_sort_ratio("abcd", "abce") == 75.0
+    assert dedupe_steps(["abcd", "abce"], 75) == ["abcd"]
+    assert dedupe_steps(["abcd", "abce"], 76) == ["abcd", "abce"]
+
+    # enough labels for the multi-threaded cdist path
+    rng = random.Random(0)
+    words = ["check", "stock", "order", "send", "invoice", "approve", "client", "pay"]
+    many = [" ".join(rng.choice(words) for _ in range(rng.randint(1, 3))) + rng.choice(["", "s", "!"])
+            for _ in range(150)]
+    for threshold in (80, 92):
+        assert dedupe_steps(many, threshold) == _pairwise(many, threshold)
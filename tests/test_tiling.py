@@ -0,0 +1,47 @@
+import cv2
+import numpy as np
+from core.settings import settings
+from core.tiling import tile_grid, detect_tiled, merge_nodes
+
+def _page():
+    # two rows of boxes joined into one chain by connectors longer than a tile
+    img = np.full((1000, 3500), 255, np.uint8)
+    boxes = [(x, y, x + 260, y + 120) for y in (200, 600) for x in (150, 1100, 2050, 3000)]
+    for x1, y1, x2, y2 in boxes:
+        cv2.rectangle(img, (x1, y1), (x2, y2), 0, 4)
+    for i in (0, 1, 2, 4, 5, 6):
+        y = boxes[i][1] + 60
+        cv2.line(img, (boxes[i][2] + 10, y), (boxes[i + 1][0] - 10, y), 0, 2)
+    cv2.line(img, (3130, 330), (3130, 590), 0, 2)
+    return img, boxes
+
+def test_tile_grid_covers_page_with_overlap():
+    tiles = tile_grid(1000, 2500, 600, 200)
+    cover = np.zeros((1000, 2500), bool)
+    for x1, y1, x2, y2 in tiles:
+        assert x2 - x1 <= 600 and y2 - y1 <= 600
+        cover[y1:y2, x1:x2] = True
+    assert cover.all()
+    assert tile_grid(100, 100, 600, 200) == [(0, 0, 100, 100)]
+
+def test_seam_fragments_merge_into_one_node():
+    found = [{"kind": "rectangle", "bbox": [100, 10, 300, 60], "cut": True},
+             {"kind": "rectangle", "bbox": [250, 10, 420, 60], "cut": True},
+             {"kind": "diamond", "bbox": [500, 10, 560, 60], "cut": False},
+             {"kind": "diamond", "bbox": [501, 11, 560, 60], "cut": False}]
+    nodes = merge_nodes(found)
+    assert [(n["id"], n["kind"], n["bbox"]) for n in nodes] == [
+        ("n0", "rectangle", [100, 10, 420, 60]), ("n1", "diamond", [500, 10, 560, 60])]
+
+def test_tiled_detection_joins_nodes_and_edges_across_seams(monkeypatch):
+    monkeypatch.setattr(settings, "TILE_SIZE", 600)
+    monkeypatch.setattr(settings, "TILE_OVERLAP", 300)
+    monkeypatch.setattr(settings, "ARROW_MATCH_METRIC", "edge")
+    img, boxes = _page()
+    nodes, edges, tiles = detect_tiled(img)
+    assert tiles > 1
+    assert len(nodes) == len(boxes)
+    for n, (x1, y1, x2, y2) in zip(nodes, sorted(boxes, key=lambda b: (b[1], b[0]))):
+        assert all(abs(a - b) <= 4 for a, b in zip(n["bbox"], (x1, y1, x2, y2)))
+    assert sorted((e["source"], e["target"]) for e in edges) == [
+        ("n0", "n1"), ("n1", "n2"), ("n2", "n3"), ("n3", "n7"), ("n4", "n5"), ("n5", "n6"), ("n6", "n7")]
@@ -0,0 +1,52 @@
+import cv2
+import numpy as np
+from fastapi.testclient import TestClient
+from app.main import app
+from core.settings import settings
+from core.model_registry import yolo_registry
+from core.engines.yolo_engine import _to_blocks
+from core.yolo_onnx import OnnxResult, letterbox, postprocess
+
+client = TestClient(app)
+
+def test_postprocess_maps_letterboxed_boxes_back_and_suppresses_overlaps():
+    img = np.zeros((300, 600, 3), np.uint8)
+    x, (gain, pad_x, pad_y) = letterbox(img, 640)
+    assert x.shape == (3, 640, 640) and (pad_x, pad_y) == (0, 160)
+
+    # anchors as (cx, cy, w, h, score class 0, score class 1) in letterboxed pixels
+    anchors = np.array([
+        [100, 240, 80, 40, 0.90, 0.05],
+        [102, 241, 80, 40, 0.80, 0.05],  # same box, lower score: suppressed
+        [102, 241, 80, 40, 0.05, 0.60],  # same box, other class: kept
+        [500, 400, 60, 60, 0.10, 0.20],  # below confidence
+    ], dtype=np.float32)
+    det = postprocess(anchors.T, (gain, pad_x, pad_y), img.shape[:2], conf=0.25, iou=0.7, max_det=300)
+    assert det.shape == (2, 6)
+    assert det[:, 5].tolist() == [0.0, 1.0]
+    assert np.allclose(det[0, :4], np.array([60, 220, 140, 260]) / gain - [0, pad_y / gain, 0, pad_y / gain])
+
+    blocks = _to_blocks([OnnxResult({0: "Task", 1: "Gateway"}, det, img.shape[:2])], img.shape[:2])
+    assert [b.type for b in blocks] == ["Task", "Gateway"]
+    assert blocks[0].bbox == tuple(int(v) for v in det[0, :4])
+
+def test_parse_many_batches_yolo_forward_passes(monkeypatch):
+    monkeypatch.setattr(settings, "PARSE_EXECUTOR", "inline")
+    monkeypatch.setattr(settings, "RESULT_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "YOLO_BATCH_SIZE", 2)
+    batches = []
+
+    def fake_predict(imgs, path=None, deadline=None):
+        imgs = imgs if isinstance(imgs, list) else [imgs]
+        batches.append(len(imgs))
+        det = np.array([[10, 10, 60, 40, 0.9, 0]], np.float32)
+        return [OnnxResult({0: "Task"}, det, img.shape[:2]) for img in imgs]
+
+    monkeypatch.setattr(yolo_registry, "predict", fake_predict)
+    png = cv2.imencode(".png", np.full((100, 200, 3), 255, np.uint8))[1].tobytes()
+    files = [("files", (f"{i}.png", png, "image/png")) for i in range(3)]
+    r = client.post("/v1/parse_many", params={"engine": "yolo_bpmn"}, files=files)
+    results = r.json()["results"]
+    assert sorted(batches) == [1, 2]
+    assert [len(x["graph"]["nodes"]) for x in results] == [1, 1, 1]
+    assert [x["meta"].get("yolo_batch") for x in results] == [2, 2, None]